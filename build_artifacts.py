@@ -0,0 +1,177 @@
+import argparse
+import glob
+import hashlib
+import importlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from enhanced_metadata_cache import file_hash
+from enhanced_schema import load_schema_snapshot
+from create_table_excel_files import list_tables
+
+DB_PATH = os.path.join('db', 'bank_exchange.db')
+FAISS_DB_PATH = 'business.db'  # setup_docs_and_faiss.DB_PATH
+MANIFEST_PATH = os.path.join('cache', 'build_manifest.json')
+
+# Each step is a script's main() (or its 'entry' function). 'schema' steps take the shared snapshot (and are keyed on
+# its fingerprint); 'dbs' are keyed on file size/mtime because their contents are read;
+# 'inputs' are file globs keyed on content hash. Outputs of deps are inputs implicitly.
+STEPS = {
+    'rollups': {
+        'module': 'enhanced_rollups', 'entry': 'build_rollups', 'deps': [], 'schema': False, 'dbs': [DB_PATH], 'inputs': [],
+        'outputs': [],
+        'mutates_db': True,  # Creates the summary tables and triggers the app only refreshes
+    },
+    'role_access': {
+        'module': 'create_role_access', 'deps': ['rollups'], 'schema': True, 'dbs': [], 'inputs': [],
+        'outputs': [os.path.join('data', 'role_access.xlsx')],
+        'mutates_db': True,  # Also writes the role_access table, so the snapshot is retaken after it
+    },
+    'data_dictionary': {
+        'module': 'create_data_dictionary', 'deps': ['role_access'], 'schema': True, 'dbs': [], 'inputs': [],
+        'outputs': [os.path.join('data', 'data_dictionary.xlsx')],
+    },
+    'table_excels': {
+        'module': 'create_table_excel_files', 'deps': ['role_access'], 'schema': True, 'dbs': [DB_PATH], 'inputs': [],
+        'outputs': [],  # One workbook per table, listed from the snapshot
+    },
+    'er_diagram': {
+        'module': 'create_er_diagram', 'deps': ['role_access'], 'schema': True, 'dbs': [], 'inputs': [],
+        'outputs': [os.path.join('data', 'er_diagram.jpeg')],
+    },
+    'schema_pdf': {
+        'module': 'create_schema_pdf', 'deps': ['role_access'], 'schema': True, 'dbs': [], 'inputs': [],
+        'outputs': [os.path.join('data', 'schema.pdf')],
+    },
+    'faiss_index': {
+        'module': 'setup_docs_and_faiss', 'deps': ['data_dictionary', 'table_excels'], 'schema': False,
+        'dbs': [FAISS_DB_PATH], 'inputs': [os.path.join('data', '*.xlsx')],
+        'outputs': [os.path.join('embeddings', 'faiss.index'), os.path.join('embeddings', 'faiss.index.meta.json'),
+                    os.path.join('embeddings', 'faiss.index.params.json')],
+    },
+}
+
+def _db_signature(path):
+    try:
+        stat = os.stat(path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return 'missing'
+
+def step_outputs(name, snapshot):
+    if name == 'table_excels':
+        return [os.path.join('data', f"{table}.xlsx") for table in list_tables(snapshot)]
+    return STEPS[name]['outputs']
+
+def step_fingerprint(name, snapshot):
+    """Hash of everything the step reads: its script, schema, databases, input files and deps' outputs."""
+    step = STEPS[name]
+    digest = hashlib.sha1()
+    digest.update(file_hash(step['module'] + '.py').encode())
+    if step['schema']:
+        digest.update(snapshot['fingerprint'].encode())
+    for db in step['dbs']:
+        digest.update(f"{db}={_db_signature(db)}".encode())
+    inputs = [path for pattern in step['inputs'] for path in sorted(glob.glob(pattern))]
+    inputs += [path for dep in step['deps'] for path in step_outputs(dep, snapshot)]
+    for path in sorted(set(inputs)):
+        digest.update(f"{path}={file_hash(path) if os.path.exists(path) else 'missing'}".encode())
+    return digest.hexdigest()
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+def run_step(name, snapshot):
+    """Worker entry point: import the step's script and run its main(); returns seconds taken."""
+    start = time.perf_counter()
+    module = importlib.import_module(STEPS[name]['module'])
+    entry = getattr(module, STEPS[name].get('entry', 'main'))
+    if STEPS[name]['schema']:
+        entry(snapshot)
+    else:
+        entry()
+    return time.perf_counter() - start
+
+def build(db_path=DB_PATH, workers=None, force=False, manifest_path=MANIFEST_PATH):
+    manifest = load_manifest(manifest_path)
+    snapshot = load_schema_snapshot(db_path)  # Extracted once and shared with every schema step
+    done, failed, timings = set(), set(), {}
+    running = {}
+    start_all = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while len(done) + len(failed) < len(STEPS):
+            for name, step in STEPS.items():
+                if name in done or name in failed or name in running.values():
+                    continue
+                if any(dep in failed for dep in step['deps']):
+                    failed.add(name)
+                    print(f"⛔ {name}: skipped because a dependency failed")
+                    continue
+                if not all(dep in done for dep in step['deps']):
+                    continue
+                fingerprint = step_fingerprint(name, snapshot)
+                outputs = step_outputs(name, snapshot)
+                if (not force and manifest.get(name, {}).get('fingerprint') == fingerprint
+                        and all(os.path.exists(p) for p in outputs)):
+                    done.add(name)
+                    timings[name] = None
+                    print(f"⏭️ {name}: unchanged, skipped")
+                    continue
+                print(f"▶️ {name}: running")
+                running[pool.submit(run_step, name, snapshot)] = name
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    timings[name] = future.result()
+                except Exception as e:
+                    failed.add(name)
+                    print(f"❌ {name}: {e}")
+                    continue
+                if STEPS[name].get('mutates_db'):
+                    snapshot = load_schema_snapshot(db_path)
+                # Recorded against the inputs as they stand after the step, so a step that
+                # changes its own inputs (role_access) is not re-run on the next build
+                manifest[name] = {'fingerprint': step_fingerprint(name, snapshot),
+                                  'seconds': round(timings[name], 3), 'built_at': time.time()}
+                save_manifest(manifest, manifest_path)
+                done.add(name)
+                print(f"✅ {name}: {timings[name]:.2f}s")
+
+    print("\n⏱️ Step timings:")
+    for name in STEPS:
+        if name in failed:
+            status = 'failed'
+        elif timings.get(name) is None:
+            status = 'skipped'
+        else:
+            status = f"{timings[name]:.2f}s"
+        print(f"  {name:<16} {status}")
+    print(f"🎉 Build finished in {time.perf_counter() - start_all:.2f}s")
+    return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild data dictionary, role matrix, docs and FAISS index as needed.')
+    parser.add_argument('--workers', type=int, default=None, help='Step processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Run every step even if its inputs are unchanged')
+    args = parser.parse_args()
+    if not os.path.exists(DB_PATH):
+        print(f"❌ Database {DB_PATH} not found.")
+        return
+    build(DB_PATH, args.workers, args.force)
+
+if __name__ == "__main__":
+    main()
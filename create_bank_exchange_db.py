@@ -1,29 +1,197 @@
+import argparse
+import datetime
+import math
+import multiprocessing as mp
 import sqlite3
+import time
+from queue import Empty
 import pandas as pd
 import os
 
 DB_PATH = "business.db"
 DATA_FOLDER = "data"
+CHUNK_ROWS = 50_000     # Rows per chunk passed from a parser process to the writer
+QUEUE_CHUNKS = 4        # Chunks a parser may run ahead of the writer
+PARSER_POLL = 5         # Seconds between checks that a parser the writer waits on is still alive
+LOADABLE_EXTENSIONS = ('.xlsx', '.csv')
 
-def create_db_from_excels():
+def _clean(value):
+    """Convert a cell to something sqlite3 stores the way to_sql did."""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+def iter_excel_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield (header, raw rows) chunks from the first sheet without loading the workbook into memory."""
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h) for h in header]
+        chunk = []
+        for row in rows:
+            if row is None or all(v is None for v in row):
+                continue
+            chunk.append(tuple(row[:len(header)]))
+            if len(chunk) >= chunk_rows:
+                yield header, chunk
+                chunk = []
+        yield header, chunk
+    finally:
+        wb.close()
+
+def iter_csv_chunks(path, chunk_rows=CHUNK_ROWS):
+    for df in pd.read_csv(path, chunksize=chunk_rows):
+        # object dtype turns numpy scalars into Python values; NaN becomes NULL
+        values = df.astype(object).where(df.notna(), None)
+        yield [str(c) for c in df.columns], list(map(tuple, values.to_numpy().tolist()))
+
+def _parse_file(path, table_name, queue, chunk_rows):
+    """Parser process: stream the table's DDL and then one file's rows into queue, then a None sentinel."""
+    try:
+        is_csv = path.endswith('.csv')
+        chunks = iter_csv_chunks(path, chunk_rows) if is_csv else iter_excel_chunks(path, chunk_rows)
+        for i, (header, rows) in enumerate(chunks):
+            if i == 0:
+                # Types come from the first chunk's raw cells, as to_sql would infer them from the
+                # whole frame, so Excel dates still declare TIMESTAMP
+                queue.put(('schema', header, pd.io.sql.get_schema(pd.DataFrame(rows, columns=header), table_name)))
+            if not is_csv:
+                rows = [tuple(_clean(v) for v in row) for row in rows]
+            queue.put(('rows', header, rows))
+    except Exception as e:
+        queue.put(('error', None, str(e)))
+    queue.put(None)
+
+def _next_item(queue, proc):
+    """Next message from a parser; raises if the parser died (e.g. killed for memory) without finishing."""
+    while True:
+        try:
+            return queue.get(timeout=PARSER_POLL)
+        except Empty:
+            if not proc.is_alive():
+                # A parser that exits normally flushes its queue first, so one last look is enough
+                try:
+                    return queue.get(timeout=1)
+                except Empty:
+                    raise RuntimeError(f"parser process exited unexpectedly (exit code {proc.exitcode})")
+
+def _create_indexes(conn, table_name, header):
+    """Index *_id columns other than the table's own key; done after the load so inserts stay append-only."""
+    for col in header[1:]:
+        if col.lower().endswith('_id'):
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_{col}" ON "{table_name}" ("{col}")')
+
+def _write_table(conn, table_name, queue, proc):
+    """Single writer: drain one parser's queue inside one transaction. Returns (rows, header)."""
+    header, total, insert_sql = None, 0, None
+    conn.execute("BEGIN")
+    item = True
+    try:
+        while True:
+            item = _next_item(queue, proc)
+            if item is None:
+                break
+            kind, chunk_header, payload = item
+            if kind == 'error':
+                raise RuntimeError(payload)
+            if kind == 'schema':
+                header = chunk_header
+                conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+                conn.execute(payload)
+                insert_sql = f'INSERT INTO "{table_name}" VALUES ({", ".join("?" * len(header))})'
+            elif payload:
+                conn.executemany(insert_sql, payload)
+                total += len(payload)
+    except Exception:
+        # ROLLBACK is not supported with journal_mode=OFF, so end the transaction and drop the partial table
+        if conn.in_transaction:
+            conn.execute("COMMIT")
+        conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        try:
+            while item is not None:
+                item = _next_item(queue, proc)  # Unblock the parser so it can exit
+        except RuntimeError:
+            pass
+        raise
+    conn.execute("COMMIT")
+    return total, header
+
+def create_db_from_excels(data_folder=DATA_FOLDER, db_path=DB_PATH, workers=None, chunk_rows=CHUNK_ROWS):
     # Remove old DB if it exists
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
-        print(f"🗑️ Deleted existing database: {DB_PATH}")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+        print(f"🗑️ Deleted existing database: {db_path}")
+
+    files = sorted(f for f in os.listdir(data_folder) if f.endswith(LOADABLE_EXTENSIONS))
+    workers = workers or os.cpu_count() or 1
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    # No rollback journal or fsyncs while loading; a failed load is simply re-run
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-131072")
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    # Each file is parsed in its own process; the writer consumes them in order while
+    # up to `workers` parsers run ahead into bounded queues.
+    jobs = []
+    for file in files:
+        queue = mp.Queue(maxsize=QUEUE_CHUNKS)
+        proc = mp.Process(target=_parse_file, daemon=True,
+                          args=(os.path.join(data_folder, file), os.path.splitext(file)[0], queue, chunk_rows))
+        jobs.append((file, queue, proc))
+    for _, _, proc in jobs[:workers]:
+        proc.start()
 
-    for file in os.listdir(DATA_FOLDER):
-        if file.endswith(".xlsx"):
-            table_name = os.path.splitext(file)[0]
-            df = pd.read_excel(os.path.join(DATA_FOLDER, file))
-            df.to_sql(table_name, conn, if_exists="replace", index=False)
-            print(f"✅ Loaded: {file} → table '{table_name}'")
+    total_rows = 0
+    start_all = time.perf_counter()
+    indexed, failed = [], []
+    for i, (file, queue, proc) in enumerate(jobs):
+        table_name = os.path.splitext(file)[0]
+        start = time.perf_counter()
+        try:
+            rows, header = _write_table(conn, table_name, queue, proc)
+        except Exception as e:
+            print(f"❌ Failed to load {file}: {e}")
+            failed.append(file)
+            rows, header = 0, None
+        proc.join()
+        if i + workers < len(jobs):
+            jobs[i + workers][2].start()
+        if header is None:
+            continue
+        indexed.append((table_name, header))
+        elapsed = time.perf_counter() - start
+        total_rows += rows
+        print(f"✅ Loaded: {file} → table '{table_name}' ({rows:,} rows, {rows / max(elapsed, 1e-9):,.0f} rows/sec)")
 
-    conn.commit()
+    start = time.perf_counter()
+    for table_name, header in indexed:
+        _create_indexes(conn, table_name, header)
+    print(f"📇 Indexes built in {time.perf_counter() - start:.1f}s")
     conn.close()
-    print("🎉 All Excel files loaded into new business.db")
+
+    elapsed = time.perf_counter() - start_all
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(files)} file(s) failed to load into {db_path}: {', '.join(failed)}")
+    print(f"🎉 All Excel/CSV files loaded into new {db_path}: {total_rows:,} rows in {elapsed:.1f}s "
+          f"({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load every .xlsx/.csv file in a folder into a new SQLite database.')
+    parser.add_argument('--data', default=DATA_FOLDER)
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--workers', type=int, default=None, help='Parser processes (default: CPU count)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    create_db_from_excels(args.data, args.db, args.workers, args.chunk_rows)
 
 if __name__ == "__main__":
-    create_db_from_excels()
+    main()
@@ -1,6 +1,7 @@
-import sqlite3
 import pandas as pd
 import os
+from enhanced_schema import load_schema_snapshot
+from enhanced_rollups import ROLLUP_COLUMN_DESCRIPTIONS, ROLLUP_STATE_TABLE, ROLLUP_TABLE_DESCRIPTIONS
 
 # Ensure data directory exists
 os.makedirs('data', exist_ok=True)
@@ -21,6 +22,7 @@ TABLE_DESCRIPTIONS = {
     'amc_mast': 'Asset Management Company master',
     'amc_bank_dtl': 'AMC Bank Details',
     'euin_mast': 'Employee Unique Identification Number master',
+    **ROLLUP_TABLE_DESCRIPTIONS,
 }
 COLUMN_DESCRIPTIONS = {
     'cust_id': 'Customer ID',
@@ -58,27 +60,25 @@ COLUMN_DESCRIPTIONS = {
     'bank_name': 'Bank Name',
     'account_no': 'Bank Account Number',
     'ifsc_code': 'Bank IFSC Code',
+    **ROLLUP_COLUMN_DESCRIPTIONS,
 }
 
-def get_schema():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    tables = cursor.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+def get_schema(snapshot=None):
+    if snapshot is None:
+        snapshot = load_schema_snapshot(DB_PATH)
     schema = []
     
     # Get all foreign key relationships first
     all_fks = {}
-    for (table_name,) in tables:
-        fks = cursor.execute(f'PRAGMA foreign_key_list({table_name})').fetchall()
-        for fk in fks:
+    for table_name, details in snapshot['tables'].items():
+        for fk in details['foreign_keys']:
             # fk[3] is the 'from' column, fk[2] is the 'to' table, fk[4] is the 'to' column
             all_fks[(table_name, fk[3])] = (fk[2], fk[4])
 
-    for (table_name,) in tables:
-        if table_name.startswith('sqlite_'):
+    for table_name, details in snapshot['tables'].items():
+        if table_name == ROLLUP_STATE_TABLE:
             continue
-        columns = cursor.execute(f'PRAGMA table_info({table_name})').fetchall()
-        for col in columns:
+        for col in details['columns']:
             col_name = col[1]
             fk_info = all_fks.get((table_name, col_name))
             
@@ -92,11 +92,10 @@ def get_schema():
                 'Foreign Key Table': fk_info[0] if fk_info else '',
                 'Foreign Key Column': fk_info[1] if fk_info else ''
             })
-    conn.close()
     return schema
 
-def main():
-    schema = get_schema()
+def main(snapshot=None):
+    schema = get_schema(snapshot)
     df = pd.DataFrame(schema)
     df.to_excel(DICT_PATH, index=False)
     print(f"Data dictionary written to {DICT_PATH}")
@@ -1,27 +1,21 @@
-import sqlite3
 import os
 import networkx as nx
 import matplotlib.pyplot as plt
+from enhanced_schema import load_schema_snapshot
 
 os.makedirs('data', exist_ok=True)
 DB_PATH = os.path.join('db', 'bank_exchange.db')
 ER_PATH = os.path.join('data', 'er_diagram.jpeg')
 
-def get_schema_and_fks():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    tables = cursor.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+def get_schema_and_fks(snapshot=None):
+    if snapshot is None:
+        snapshot = load_schema_snapshot(DB_PATH)
     schema = {}
     fks = []
-    for (table_name,) in tables:
-        if table_name.startswith('sqlite_'):
-            continue
-        columns = cursor.execute(f'PRAGMA table_info({table_name})').fetchall()
-        schema[table_name] = [col[1] for col in columns]
-        fk_info = cursor.execute(f'PRAGMA foreign_key_list({table_name})').fetchall()
-        for fk in fk_info:
+    for table_name, details in snapshot['tables'].items():
+        schema[table_name] = [col[1] for col in details['columns']]
+        for fk in details['foreign_keys']:
             fks.append((table_name, fk[3], fk[2], fk[4]))  # (from_table, from_col, to_table, to_col)
-    conn.close()
     return schema, fks
 
 def plot_er_diagram(schema, fks, path):
@@ -51,8 +45,8 @@ def plot_er_diagram(schema, fks, path):
     plt.close()
     print(f'ER diagram written to {path}')
 
-def main():
-    schema, fks = get_schema_and_fks()
+def main(snapshot=None):
+    schema, fks = get_schema_and_fks(snapshot)
     plot_er_diagram(schema, fks, ER_PATH)
 
 if __name__ == '__main__':
@@ -2,6 +2,8 @@ import pandas as pd
 import os
 import sqlite3
 import hashlib
+from enhanced_rollups import ROLLUP_SOURCES, ROLLUP_STATE_TABLE, rollup_grant
+from enhanced_schema import load_schema_snapshot
 
 os.makedirs('data', exist_ok=True)
 DB_PATH = os.path.join('db', 'bank_exchange.db')
@@ -9,17 +11,14 @@ EXCEL_PATH = os.path.join('data', 'role_access.xlsx')
 
 ROLES = ['Teller', 'Manager', 'Auditor', 'IT', 'Customer Service']
 
-def get_tables_and_columns():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    tables = cursor.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+def get_tables_and_columns(snapshot=None):
+    if snapshot is None:
+        snapshot = load_schema_snapshot(DB_PATH)
     table_cols = {}
-    for (table_name,) in tables:
-        if table_name.startswith('sqlite_'):
+    for table_name, details in snapshot['tables'].items():
+        if table_name == ROLLUP_STATE_TABLE:
             continue
-        columns = cursor.execute(f'PRAGMA table_info({table_name})').fetchall()
-        table_cols[table_name] = [col[1] for col in columns]
-    conn.close()
+        table_cols[table_name] = [col[1] for col in details['columns']]
     return table_cols
 
 def build_access_matrix(table_cols):
@@ -55,6 +54,13 @@ def build_access_matrix(table_cols):
             'euin_mast': '',
         },
     }
+    # Rollups summarise source columns, so a role reads one only if it can read all of those
+    for role in ROLES:
+        role_columns = {t: set(table_cols[t]) if grant == 'ALL' else {c.strip() for c in grant.split(',') if c.strip()}
+                        for t, grant in access[role].items() if t in table_cols and t not in ROLLUP_SOURCES}
+        for rollup in ROLLUP_SOURCES:
+            if rollup in table_cols:
+                access[role][rollup] = rollup_grant(rollup, role_columns)
     # Fill missing tables for each role with ''
     for role in ROLES:
         for t in table_cols:
@@ -73,8 +79,8 @@ def save_to_db(df):
     conn.commit()
     conn.close()
 
-def main():
-    table_cols = get_tables_and_columns()
+def main(snapshot=None):
+    table_cols = get_tables_and_columns(snapshot)
     df = build_access_matrix(table_cols)
     df.to_excel(EXCEL_PATH)
     save_to_db(df.copy())
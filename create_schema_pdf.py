@@ -1,27 +1,15 @@
-import sqlite3
 import os
 from fpdf import FPDF
+from enhanced_schema import load_schema_snapshot
 
 os.makedirs('data', exist_ok=True)
 DB_PATH = os.path.join('db', 'bank_exchange.db')
 PDF_PATH = os.path.join('data', 'schema.pdf')
 
-def get_schema_details():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    tables = cursor.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
-    schema = {}
-    for (table_name,) in tables:
-        if table_name.startswith('sqlite_'):
-            continue
-        columns = cursor.execute(f'PRAGMA table_info({table_name})').fetchall()
-        fks = cursor.execute(f'PRAGMA foreign_key_list({table_name})').fetchall()
-        schema[table_name] = {
-            'columns': columns,
-            'foreign_keys': fks
-        }
-    conn.close()
-    return schema
+def get_schema_details(snapshot=None):
+    if snapshot is None:
+        snapshot = load_schema_snapshot(DB_PATH)
+    return snapshot['tables']
 
 def create_pdf(schema):
     pdf = FPDF()
@@ -62,8 +50,8 @@ def create_pdf(schema):
     except Exception as e:
         print(f'Error writing PDF: {e}')
 
-def main():
-    schema = get_schema_details()
+def main(snapshot=None):
+    schema = get_schema_details(snapshot)
     create_pdf(schema)
 
 if __name__ == '__main__':
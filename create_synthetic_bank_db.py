@@ -0,0 +1,249 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+DB_PATH = os.path.join('db', 'bank_exchange_synthetic.db')
+CHUNK_ROWS = 100_000   # Rows generated per worker task and written per executemany call
+DEFAULT_TRANSACTIONS = 100_000
+
+# Same columns, declared types and NOT NULLs as the production schema documented in business.db
+SCHEMA = [
+    '''CREATE TABLE branch_mast (
+        branch_id INTEGER PRIMARY KEY, branch_name TEXT NOT NULL, location TEXT NOT NULL)''',
+    '''CREATE TABLE dept_mast (
+        dept_id INTEGER PRIMARY KEY, dept_name TEXT NOT NULL)''',
+    '''CREATE TABLE cust_mast (
+        cust_id INTEGER PRIMARY KEY, cust_name TEXT NOT NULL, dob DATE, address TEXT, phone TEXT)''',
+    '''CREATE TABLE acct_mast (
+        acct_id INTEGER PRIMARY KEY,
+        cust_id INTEGER REFERENCES cust_mast(cust_id),
+        branch_id INTEGER REFERENCES branch_mast(branch_id),
+        acct_type TEXT, open_date DATE, balance REAL)''',
+    '''CREATE TABLE txn_hist (
+        txn_id INTEGER PRIMARY KEY,
+        acct_id INTEGER REFERENCES acct_mast(acct_id),
+        txn_date DATE, amount REAL, txn_type TEXT, description TEXT)''',
+    '''CREATE TABLE emp_mast (
+        emp_id INTEGER PRIMARY KEY, emp_name TEXT NOT NULL,
+        dept_id INTEGER REFERENCES dept_mast(dept_id),
+        branch_id INTEGER REFERENCES branch_mast(branch_id),
+        euin_no TEXT REFERENCES euin_mast(euin_no))''',
+    '''CREATE TABLE euin_mast (
+        euin_no TEXT PRIMARY KEY,
+        emp_id INTEGER REFERENCES emp_mast(emp_id),
+        issue_date DATE)''',
+    '''CREATE TABLE card_mast (
+        card_id INTEGER PRIMARY KEY,
+        acct_id INTEGER REFERENCES acct_mast(acct_id),
+        card_type TEXT, issue_date DATE, expiry_date DATE, status TEXT)''',
+    '''CREATE TABLE loan_mast (
+        loan_id INTEGER PRIMARY KEY,
+        cust_id INTEGER REFERENCES cust_mast(cust_id),
+        branch_id INTEGER REFERENCES branch_mast(branch_id),
+        amount REAL, issue_date DATE, status TEXT)''',
+    '''CREATE TABLE amc_mast (
+        amc_id INTEGER PRIMARY KEY, amc_name TEXT NOT NULL)''',
+    '''CREATE TABLE amc_bank_dtl (
+        amc_bank_id INTEGER PRIMARY KEY,
+        amc_id INTEGER REFERENCES amc_mast(amc_id),
+        bank_name TEXT, account_no TEXT, ifsc_code TEXT)''',
+    '''CREATE TABLE USERS (
+        id INTEGER PRIMARY KEY, username TEXT NOT NULL, password TEXT NOT NULL, role TEXT NOT NULL)''',
+]
+
+# Built after the load; maintaining them row by row is what makes naive loads slow
+INDEXES = [
+    'CREATE INDEX idx_acct_mast_cust_id ON acct_mast(cust_id)',
+    'CREATE INDEX idx_acct_mast_branch_id ON acct_mast(branch_id)',
+    'CREATE INDEX idx_txn_hist_acct_id ON txn_hist(acct_id)',
+    'CREATE INDEX idx_txn_hist_txn_date ON txn_hist(txn_date)',
+    'CREATE INDEX idx_card_mast_acct_id ON card_mast(acct_id)',
+    'CREATE INDEX idx_loan_mast_cust_id ON loan_mast(cust_id)',
+    'CREATE INDEX idx_emp_mast_branch_id ON emp_mast(branch_id)',
+]
+
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Ananya', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Rohan', 'Saanvi',
+               'Arjun', 'Priya', 'Rahul', 'Sneha', 'Vikram', 'Neha', 'Karan', 'Pooja', 'Amit', 'Riya']
+LAST_NAMES = ['Sharma', 'Verma', 'Iyer', 'Reddy', 'Patel', 'Gupta', 'Nair', 'Singh', 'Rao', 'Mehta',
+              'Joshi', 'Das', 'Kulkarni', 'Menon', 'Chopra', 'Bose']
+CITIES = ['Mumbai', 'Delhi', 'Bengaluru', 'Chennai', 'Hyderabad', 'Pune', 'Kolkata', 'Ahmedabad', 'Jaipur', 'Kochi']
+STREETS = ['MG Road', 'Park Street', 'Station Road', 'Main Road', 'Church Street', 'Ring Road']
+DEPARTMENTS = ['Retail Banking', 'Corporate Banking', 'Loans', 'Operations', 'IT', 'Compliance', 'Treasury', 'HR']
+ACCT_TYPES = ['Savings', 'Current', 'Fixed Deposit', 'Recurring Deposit']
+TXN_TYPES = ['CREDIT', 'DEBIT']
+TXN_DESCRIPTIONS = ['ATM withdrawal', 'UPI transfer', 'Salary credit', 'NEFT transfer', 'Cheque deposit',
+                    'Card purchase', 'Bill payment', 'Interest credit']
+CARD_TYPES = ['Debit', 'Credit']
+CARD_STATUSES = ['Active', 'Blocked', 'Expired']
+LOAN_STATUSES = ['Approved', 'Pending', 'Closed', 'Overdue']
+AMC_NAMES = ['Axis', 'HDFC', 'ICICI Prudential', 'Kotak', 'Nippon India', 'SBI', 'UTI', 'Mirae', 'DSP', 'Tata']
+BANK_NAMES = ['State Bank of India', 'HDFC Bank', 'ICICI Bank', 'Axis Bank', 'Kotak Mahindra Bank']
+ROLES = ['Teller', 'Manager', 'Auditor', 'IT', 'Customer Service']  # create_role_access.ROLES
+
+def table_sizes(transactions):
+    """Row counts per table, derived from the transaction count so ratios stay realistic."""
+    customers = max(100, transactions // 50)
+    accounts = customers * 3 // 2
+    branches = max(10, customers // 2000)
+    employees = branches * 12
+    amcs = max(10, branches // 10)
+    return {
+        'branch_mast': branches,
+        'dept_mast': len(DEPARTMENTS),
+        'cust_mast': customers,
+        'acct_mast': accounts,
+        'txn_hist': transactions,
+        'emp_mast': employees,
+        'euin_mast': employees // 4,
+        'card_mast': accounts * 3 // 5,
+        'loan_mast': customers // 5,
+        'amc_mast': amcs,
+        'amc_bank_dtl': amcs * 2,
+        'USERS': employees,  # One login per employee; listed last so earlier tables keep their seeds
+    }
+
+def _dates(rng, n, start, days):
+    return (np.datetime64(start) + rng.integers(0, days, n).astype('timedelta64[D]')).astype(str)
+
+def _pick(rng, values, n):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+
+def _names(rng, n):
+    return np.char.add(np.char.add(_pick(rng, FIRST_NAMES, n).astype(str), ' '), _pick(rng, LAST_NAMES, n).astype(str))
+
+def _generate(table, rng, ids, sizes):
+    """Column arrays for the given ids; foreign keys are drawn from the parent tables' id ranges."""
+    n = len(ids)
+    if table == 'branch_mast':
+        return [ids, np.char.add('Branch ', ids.astype(str)), _pick(rng, CITIES, n)]
+    if table == 'dept_mast':
+        return [ids, np.asarray(DEPARTMENTS, dtype=object)[ids - 1]]
+    if table == 'cust_mast':
+        address = np.char.add(np.char.add(rng.integers(1, 999, n).astype(str), ' '), _pick(rng, STREETS, n).astype(str))
+        address = np.char.add(np.char.add(address, ', '), _pick(rng, CITIES, n).astype(str))
+        phone = rng.integers(6_000_000_000, 9_999_999_999, n).astype(str)
+        return [ids, _names(rng, n), _dates(rng, n, '1950-01-01', 20_000), address, phone]
+    if table == 'acct_mast':
+        return [ids, rng.integers(1, sizes['cust_mast'] + 1, n), rng.integers(1, sizes['branch_mast'] + 1, n),
+                _pick(rng, ACCT_TYPES, n), _dates(rng, n, '2010-01-01', 5_400),
+                np.round(rng.lognormal(10, 1.2, n), 2)]
+    if table == 'txn_hist':
+        return [ids, rng.integers(1, sizes['acct_mast'] + 1, n), _dates(rng, n, '2020-01-01', 1_826),
+                np.round(rng.lognormal(7, 1.5, n), 2), _pick(rng, TXN_TYPES, n), _pick(rng, TXN_DESCRIPTIONS, n)]
+    if table == 'emp_mast':
+        # Employees 1, 5, 9, ... hold the EUINs generated for euin_mast below
+        holds = ((ids - 1) % 4 == 0) & ((ids - 1) // 4 < sizes['euin_mast'])
+        euin = np.where(holds, np.char.add('E', np.char.zfill(((ids - 1) // 4 + 1).astype(str), 6)), None)
+        return [ids, _names(rng, n), rng.integers(1, sizes['dept_mast'] + 1, n),
+                rng.integers(1, sizes['branch_mast'] + 1, n), euin.astype(object)]
+    if table == 'euin_mast':
+        # Every fourth employee holds an EUIN, so emp_id stays unique and in range
+        return [np.char.add('E', np.char.zfill(ids.astype(str), 6)), (ids - 1) * 4 + 1,
+                _dates(rng, n, '2015-01-01', 3_000)]
+    if table == 'card_mast':
+        issue = np.datetime64('2018-01-01') + rng.integers(0, 2_500, n).astype('timedelta64[D]')
+        return [ids, rng.integers(1, sizes['acct_mast'] + 1, n), _pick(rng, CARD_TYPES, n),
+                issue.astype(str), (issue + np.timedelta64(1826, 'D')).astype(str), _pick(rng, CARD_STATUSES, n)]
+    if table == 'loan_mast':
+        return [ids, rng.integers(1, sizes['cust_mast'] + 1, n), rng.integers(1, sizes['branch_mast'] + 1, n),
+                np.round(rng.lognormal(12, 1, n), 2), _dates(rng, n, '2015-01-01', 3_600), _pick(rng, LOAN_STATUSES, n)]
+    if table == 'amc_mast':
+        return [ids, np.char.add(_pick(rng, AMC_NAMES, n).astype(str), np.char.add(' Mutual Fund ', ids.astype(str)))]
+    if table == 'amc_bank_dtl':
+        ifsc = np.char.add('BANK0', np.char.zfill(rng.integers(0, 999_999, n).astype(str), 6))
+        return [ids, (ids - 1) % sizes['amc_mast'] + 1, _pick(rng, BANK_NAMES, n),
+                rng.integers(10**11, 10**12 - 1, n).astype(str), ifsc]
+    if table == 'USERS':
+        usernames = np.char.add('user', ids.astype(str))
+        # Demo password "<username>123", stored hashed as utils_auth.hash_password does
+        passwords = np.array([hashlib.sha256(f"{u}123".encode()).hexdigest() for u in usernames.tolist()], dtype=object)
+        return [ids, usernames, passwords, _pick(rng, ROLES, n)]
+    raise ValueError(f"Unknown table {table}")
+
+def generate_chunk(args):
+    """Worker entry point: rows [start, start+count) of one table, seeded by (seed, table, start)."""
+    table, start, count, seed, sizes = args
+    # A fixed per-chunk seed makes the output independent of worker count and scheduling
+    rng = np.random.default_rng([seed, list(sizes).index(table), start])
+    ids = np.arange(start, start + count, dtype=np.int64)
+    columns = _generate(table, rng, ids, sizes)
+    return list(zip(*(c.tolist() for c in columns)))
+
+def _chunks(table, rows, seed, sizes, chunk_rows):
+    for start in range(1, rows + 1, chunk_rows):
+        yield (table, start, min(chunk_rows, rows - start + 1), seed, sizes)
+
+def _set_bulk_pragmas(conn):
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")  # 256 MB page cache
+
+def load_table(conn, pool, table, rows, seed, sizes, workers, chunk_rows=CHUNK_ROWS):
+    """Generate a table in worker processes and insert it in one transaction, in id order."""
+    placeholders = ', '.join('?' * len(conn.execute(f'PRAGMA table_info({table})').fetchall()))
+    sql = f'INSERT INTO {table} VALUES ({placeholders})'
+    chunks = _chunks(table, rows, seed, sizes, chunk_rows)
+    pending = deque()
+    conn.execute("BEGIN")
+    # Keep a bounded window of chunks in flight so memory stays flat at 100M rows
+    for spec in chunks:
+        pending.append(pool.submit(generate_chunk, spec))
+        if len(pending) >= workers * 2:
+            conn.executemany(sql, pending.popleft().result())
+    while pending:
+        conn.executemany(sql, pending.popleft().result())
+    conn.execute("COMMIT")
+
+def create_synthetic_db(db_path=DB_PATH, transactions=DEFAULT_TRANSACTIONS, seed=42, workers=None):
+    workers = workers or os.cpu_count() or 1
+    sizes = table_sizes(transactions)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+        print(f"🗑️ Deleted existing database: {db_path}")
+    if os.path.dirname(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    _set_bulk_pragmas(conn)
+    for ddl in SCHEMA:
+        conn.execute(ddl)
+
+    total_rows = 0
+    start_all = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for table, rows in sizes.items():
+            start = time.perf_counter()
+            load_table(conn, pool, table, rows, seed, sizes, workers)
+            elapsed = time.perf_counter() - start
+            total_rows += rows
+            print(f"✅ {table}: {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+
+    start = time.perf_counter()
+    for ddl in INDEXES:
+        conn.execute(ddl)
+    conn.execute("ANALYZE")
+    print(f"📇 Indexes and statistics built in {time.perf_counter() - start:.1f}s")
+    conn.close()
+
+    elapsed = time.perf_counter() - start_all
+    print(f"🎉 {total_rows:,} rows written to {db_path} in {elapsed:.1f}s ({total_rows / elapsed:,.0f} rows/sec)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic banking database for load testing.')
+    parser.add_argument('--transactions', type=int, default=DEFAULT_TRANSACTIONS,
+                        help='txn_hist rows (10k to 100M); other tables scale from this')
+    parser.add_argument('--seed', type=int, default=42, help='Same seed and size give identical data')
+    parser.add_argument('--workers', type=int, default=None, help='Generator processes (default: CPU count)')
+    parser.add_argument('--output', default=DB_PATH)
+    args = parser.parse_args()
+    create_synthetic_db(args.output, args.transactions, args.seed, args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -1,101 +1,145 @@
+import argparse
+import hashlib
+import json
 import sqlite3
-import pandas as pd
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from openpyxl import Workbook
+from enhanced_rollups import ROLLUP_STATE_TABLE
 
 # Ensure data directory exists
 os.makedirs('data', exist_ok=True)
 
 DB_PATH = os.path.join('db', 'bank_exchange.db')
+DATA_FOLDER = 'data'
+MANIFEST_PATH = os.path.join('cache', 'table_excels.json')
+SAMPLE_ROWS = 10
+# role_access is a copy of data/role_access.xlsx; exporting it would overwrite the matrix
+EXCLUDED_TABLES = {ROLLUP_STATE_TABLE, 'role_access'}
 
-def get_table_info(table_name):
-    """Get table structure and sample data"""
-    conn = sqlite3.connect(DB_PATH)
-    
-    # Get table schema
+_conn = None  # One read-only connection per worker process
+
+def _init_worker(db_path):
+    global _conn
+    _conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+
+def list_tables(snapshot=None, db_path=DB_PATH):
+    """Tables to export: from a schema snapshot if given, otherwise sqlite_master."""
+    if snapshot is not None:
+        names = list(snapshot['tables'])
+    else:
+        conn = sqlite3.connect(db_path)
+        names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()]
+        conn.close()
+    return [n for n in names if not n.startswith('sqlite_') and n not in EXCLUDED_TABLES]
+
+def get_table_info(table_name, conn):
+    """Get table structure, sample data and row count"""
     cursor = conn.cursor()
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    columns = cursor.fetchall()
-    
+    columns = cursor.execute(f'PRAGMA table_info("{table_name}")').fetchall()
+
     # Get sample data (first 10 rows)
     try:
-        df = pd.read_sql_query(f"SELECT * FROM {table_name} LIMIT 10", conn)
-    except:
-        df = pd.DataFrame()
-    
-    conn.close()
-    
-    return columns, df
-
-def create_table_excel(table_name, columns, sample_data):
+        cursor.execute(f'SELECT * FROM "{table_name}" LIMIT {SAMPLE_ROWS}')
+        header = [d[0] for d in cursor.description]
+        sample_rows = cursor.fetchall()
+    except sqlite3.Error:
+        header, sample_rows = [], []
+    row_count = cursor.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+    return columns, header, sample_rows, row_count
+
+def table_fingerprint(columns, sample_rows, row_count):
+    """Changes when the table's schema, row count or sample rows change."""
+    return hashlib.sha1(repr((columns, sample_rows, row_count)).encode('utf-8')).hexdigest()
+
+def create_table_excel(table_name, columns, header, sample_rows):
     """Create Excel file for a table"""
-    filename = f"data/{table_name}.xlsx"
-    
-    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-        # Sheet 1: Table Structure
-        structure_data = []
-        for col in columns:
-            cid, name, type_name, not_null, default_val, pk = col
-            structure_data.append({
-                'Column ID': cid,
-                'Column Name': name,
-                'Data Type': type_name,
-                'Not Null': 'Yes' if not_null else 'No',
-                'Default Value': default_val if default_val else 'None',
-                'Primary Key': 'Yes' if pk else 'No'
-            })
-        
-        structure_df = pd.DataFrame(structure_data)
-        structure_df.to_excel(writer, sheet_name='Table Structure', index=False)
-        
-        # Sheet 2: Sample Data
-        if not sample_data.empty:
-            sample_data.to_excel(writer, sheet_name='Sample Data', index=False)
-        else:
-            pd.DataFrame({'Note': ['No data available']}).to_excel(writer, sheet_name='Sample Data', index=False)
-        
-        # Sheet 3: Table Info
-        info_data = {
-            'Property': ['Table Name', 'Total Columns', 'Sample Rows', 'Created Date'],
-            'Value': [table_name, len(columns), len(sample_data), datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
-        }
-        info_df = pd.DataFrame(info_data)
-        info_df.to_excel(writer, sheet_name='Table Info', index=False)
-    
-    print(f"Created {filename}")
-
-def main():
-    # List of all tables
-    tables = [
-        'USERS',
-        'acct_mast',
-        'amc_bank_dtl', 
-        'amc_mast',
-        'branch_mast',
-        'card_mast',
-        'cust_mast',
-        'dept_mast',
-        'emp_mast',
-        'euin_mast',
-        'loan_mast',
-        'txn_hist'
-    ]
-    
+    filename = os.path.join(DATA_FOLDER, f"{table_name}.xlsx")
+    # Write-only workbooks stream rows to disk instead of building a cell tree
+    wb = Workbook(write_only=True)
+
+    # Sheet 1: Table Structure
+    ws = wb.create_sheet('Table Structure')
+    ws.append(['Column ID', 'Column Name', 'Data Type', 'Not Null', 'Default Value', 'Primary Key'])
+    for cid, name, type_name, not_null, default_val, pk in columns:
+        ws.append([cid, name, type_name, 'Yes' if not_null else 'No',
+                   default_val if default_val else 'None', 'Yes' if pk else 'No'])
+
+    # Sheet 2: Sample Data
+    ws = wb.create_sheet('Sample Data')
+    if sample_rows:
+        ws.append(header)
+        for row in sample_rows:
+            ws.append(list(row))
+    else:
+        ws.append(['Note'])
+        ws.append(['No data available'])
+
+    # Sheet 3: Table Info
+    ws = wb.create_sheet('Table Info')
+    ws.append(['Property', 'Value'])
+    ws.append(['Table Name', table_name])
+    ws.append(['Total Columns', len(columns)])
+    ws.append(['Sample Rows', len(sample_rows)])
+    ws.append(['Created Date', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
+
+    wb.save(filename)
+    return filename
+
+def export_table(table_name, previous_fingerprint=None):
+    """Worker task: returns (fingerprint, created) and skips the write when the fingerprint matches."""
+    columns, header, sample_rows, row_count = get_table_info(table_name, _conn)
+    fingerprint = table_fingerprint(columns, sample_rows, row_count)
+    if fingerprint == previous_fingerprint and os.path.exists(os.path.join(DATA_FOLDER, f"{table_name}.xlsx")):
+        return fingerprint, False
+    create_table_excel(table_name, columns, header, sample_rows)
+    return fingerprint, True
+
+def _load_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(manifest, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+def main(snapshot=None, workers=None, force=False, db_path=DB_PATH, manifest_path=MANIFEST_PATH):
+    tables = list_tables(snapshot, db_path)
+    manifest = {} if force else _load_manifest(manifest_path)
+
     print("Creating Excel files for each table...")
-    
-    for table_name in tables:
-        try:
-            columns, sample_data = get_table_info(table_name)
-            create_table_excel(table_name, columns, sample_data)
-        except Exception as e:
-            print(f"Error creating Excel for {table_name}: {e}")
-    
-    print("\nAll table Excel files created in the 'data' folder!")
-    print("\nFiles created:")
+
+    created = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(db_path,)) as pool:
+        futures = [pool.submit(export_table, t, manifest.get(t)) for t in tables]
+        for table_name, future in zip(tables, futures):
+            try:
+                fingerprint, was_created = future.result()
+            except Exception as e:
+                print(f"Error creating Excel for {table_name}: {e}")
+                manifest.pop(table_name, None)
+                continue
+            manifest[table_name] = fingerprint
+            if was_created:
+                created.append(table_name)
+                print(f"Created {os.path.join(DATA_FOLDER, table_name + '.xlsx')}")
+    _save_manifest({t: manifest[t] for t in tables if t in manifest}, manifest_path)
+
+    print(f"\n{len(created)} table Excel file(s) created, {len(tables) - len(created)} unchanged or failed, in the 'data' folder")
+    print("\nFiles:")
     for table_name in tables:
-        filename = f"data/{table_name}.xlsx"
+        filename = os.path.join(DATA_FOLDER, f"{table_name}.xlsx")
         if os.path.exists(filename):
             print(f"✓ {filename}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Write one structure/sample workbook per table.')
+    parser.add_argument('--workers', type=int, default=None, help='Writer processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Rewrite every workbook')
+    args = parser.parse_args()
+    main(workers=args.workers, force=args.force)
@@ -4,8 +4,14 @@ import plotly.express as px
 import sqlite3
 import datetime
 import os
-from enhanced_query_agent import QueryAgent
 from enhanced_db_loader import ensure_db_and_users
+from enhanced_resources import SharedResources
+from enhanced_sample_cache import SAMPLE_QUERIES, sample_questions
+from enhanced_arrow import numeric_columns
+from enhanced_charts import chart_cache
+from enhanced_export import EXPORT_FORMATS, ExportError
+from enhanced_history import HISTORY_PAGE_SIZE, ResultStore, get_results, new_message_id, spill_old_results
+from enhanced_metrics import start_metrics_server, stage_percentiles
 from utils.utils_auth import check_user_role
 
 # --- CONFIG ---
@@ -14,85 +20,32 @@ DATA_DICT_PATH = 'data/data_dictionary.xlsx'
 ROLE_ACCESS_PATH = 'data/role_access.xlsx'
 
 # --- UTILS ---
-def load_data_dictionary():
-    if os.path.exists(DATA_DICT_PATH):
-        return pd.read_excel(DATA_DICT_PATH)
-    return pd.DataFrame()
-
-def load_role_access():
-    if os.path.exists(ROLE_ACCESS_PATH):
-        return pd.read_excel(ROLE_ACCESS_PATH, index_col=0)
-    return pd.DataFrame()
-
-def get_allowed_tables(role, role_access):
-    if role_access is not None and role in role_access.index:
-        allowed = role_access.loc[role]
-        # Get tables with non-empty access
-        return [table for table, access in allowed.items() if str(access).strip()]
-    return []
-
-def get_allowed_columns(role, table, role_access, table_cols):
-    if role_access is not None and role in role_access.index:
-        allowed = role_access.loc[role]
-        val = allowed.get(table, '')
-        if isinstance(val, str):
-            if val.strip().upper() == 'ALL':
-                return table_cols.get(table, [])
-            elif val.strip():
-                return [c.strip() for c in val.split(',') if c.strip()]
-    return []
-
-def get_table_columns():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    tables = cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';").fetchall()
-    table_cols = {}
-    for (table,) in tables:
-        columns = cursor.execute(f'PRAGMA table_info({table})').fetchall()
-        table_cols[table] = [col[1] for col in columns]
-    conn.close()
-    return table_cols
-
-def get_db_status():
+@st.cache_resource(show_spinner="Loading schema and models...")
+def get_shared_resources():
+    # One copy per server process: the 20th session reuses the first session's agent and embeddings
+    ensure_db_and_users(DB_PATH)
+    start_metrics_server()
+    return SharedResources(DB_PATH, DATA_DICT_PATH, ROLE_ACCESS_PATH)
+
+def get_db_status(resources):
     if not os.path.exists(DB_PATH):
-        return False, {}, 0
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
-    tables = [row[0] for row in cursor.fetchall()]
-    table_info = {}
-    total_rows = 0
-    for table in tables:
-        try:
-            cursor.execute(f"SELECT COUNT(*) FROM {table}")
-            count = cursor.fetchone()[0]
-            table_info[table] = count
-            total_rows += count
-        except:
-            table_info[table] = 0
-    conn.close()
-    return True, table_info, total_rows
+        return False, {}, 0, True
+    # Sizes come from sqlite_stat1/rowid estimates until the background COUNT(*) pass finishes
+    table_info, total_rows, exact, _ = resources.table_counts.status()
+    return True, table_info, total_rows, exact
 
 def hash_password(password):
     import hashlib
     return hashlib.sha256(password.encode()).hexdigest()
 
 def authenticate(username, password):
-    # Load valid roles from role_access.xlsx
-    if not os.path.exists(ROLE_ACCESS_PATH):
-        return None
-
-    try:
-        roles_df = pd.read_excel(ROLE_ACCESS_PATH, index_col=0)
-        valid_roles = [r.strip().lower() for r in roles_df.index.tolist()]
-    except Exception as e:
-        print(f"Error loading role access file: {e}")
-        return None
+    # Valid roles come from the compiled role_access.xlsx policy (no Excel read per login)
+    role = resources.policy.canonical_role(username)
 
     # Match case-insensitively
     username_clean = username.strip().lower()
-    if username_clean in valid_roles and password == f"{username_clean}123":
-        return username_clean.title()  # Normalize title case
+    if role and password == f"{username_clean}123":
+        return role  # Role as spelled in the access matrix
     return None
 
 
@@ -103,12 +56,10 @@ def init_session_state():
         "username": None,
         "role": None,
         "history": [],
+        "history_visible": HISTORY_PAGE_SIZE,
+        "session_id": new_message_id(),
         "db_connected": False,
         "system_ready": False,
-        "data_dict": None,
-        "role_access": None,
-        "table_cols": None,
-        "query_agent": None,
         "metrics": {},
         "current_query": ""
     }
@@ -350,14 +301,11 @@ st.markdown(toggle_btn, unsafe_allow_html=True)
 init_session_state()
 
 # --- SYSTEM INIT ---
+resources = get_shared_resources()
+result_store = ResultStore(st.session_state.session_id)
 if not st.session_state.system_ready:
-    ensure_db_and_users(DB_PATH)
-    st.session_state.data_dict = load_data_dictionary()
-    st.session_state.role_access = load_role_access()
-    st.session_state.table_cols = get_table_columns()
-    st.session_state.query_agent = QueryAgent(DB_PATH, st.session_state.data_dict, st.session_state.role_access)
     st.session_state.system_ready = True
-    st.session_state.db_connected, st.session_state.metrics['table_info'], st.session_state.metrics['total_rows'] = get_db_status()
+st.session_state.db_connected, st.session_state.metrics['table_info'], st.session_state.metrics['total_rows'], st.session_state.metrics['counts_exact'] = get_db_status(resources)
 
 # --- LOGIN ---
 if not st.session_state.authenticated:
@@ -390,11 +338,26 @@ with st.sidebar:
     # --- METRICS MOVED TO SIDEBAR ---
     st.subheader("📊 Metrics")
     st.info(f'DB Status: {"Connected" if st.session_state.db_connected else "Disconnected"}')
-    allowed_tables = get_allowed_tables(st.session_state.role, st.session_state.role_access)
+    allowed_tables = resources.policy.allowed_tables(st.session_state.role)
     st.info(f'Allowed Tables: {len(allowed_tables)}')
+    approx = "" if st.session_state.metrics['counts_exact'] else " (approx.)"
+    st.info(f"Total Rows: {st.session_state.metrics['total_rows']:,}{approx}")
     st.info(f'Queries Made: {len(st.session_state.history)}')
+    for name, state in resources.rollups.status().items():
+        if state['pending_rows']:
+            st.caption(f"{name}: {state['pending_rows']:,} new row(s) not yet summarised")
     st.divider()
 
+    # --- PER-STAGE LATENCY (all sessions in this process) ---
+    stage_stats = stage_percentiles()
+    if stage_stats:
+        st.subheader("⏱️ Stage Latency (ms)")
+        st.dataframe(
+            pd.DataFrame.from_dict(stage_stats, orient='index')[['p50', 'p95', 'count']],
+            use_container_width=True
+        )
+        st.divider()
+
     st.subheader("📋 Allowed Tables")
     for table in allowed_tables:
         st.write(f"• {table}")
@@ -402,54 +365,11 @@ with st.sidebar:
 
     st.subheader("💡 Sample Queries")
     
-    # Organize queries by category
-    transaction_queries = {
-        "Transactions": [
-            "Show me total sales for this month",
-            "Show recent transactions",
-            "What is the average transaction amount?",
-            "Show me transactions above $1000",
-            "Show me daily transaction trends"
-        ]
-    }
-    
-    customer_queries = {
-        "Customer Analysis": [
-            "List top 10 customers by revenue",
-            "Count all customers",
-            "Show me customer distribution by region",
-            "Which customers have multiple accounts?"
-        ]
-    }
-    
-    account_queries = {
-        "Account Information": [
-            "Show account balances by type",
-            "List accounts opened in the last month",
-            "Calculate total deposits by account type",
-            "List inactive accounts",
-            "What is the average balance by customer type?"
-        ]
-    }
-    
-    loan_queries = {
-        "Loan Management": [
-            "Show loan status summary",
-            "List all pending loan applications",
-            "Show me overdue loans"
-        ]
-    }
-    
-    branch_queries = {
-        "Branch Performance": [
-            "What are the top performing branches?",
-            "Show branch-wise transaction volume",
-            "List branches by customer count"
-        ]
-    }
+    # SQL for these is generated per role in the background, so clicks run without the LLM
+    st.caption(f"⚡ {resources.sample_sql.ready_count(st.session_state.role)}/{len(sample_questions())} ready")
 
     # Display queries in expandable sections
-    for category, queries in {**transaction_queries, **customer_queries, **account_queries, **loan_queries, **branch_queries}.items():
+    for category, queries in SAMPLE_QUERIES.items():
         with st.expander(f"📋 {category}", expanded=False):
             for query in queries:
                 if st.button(query, key=f"sample_{query}", use_container_width=True):
@@ -462,11 +382,20 @@ with st.sidebar:
     for msg in st.session_state.history[-5:]:
         st.write(f"{msg['role'].title()}: {msg['content'][:40]}{'...' if len(msg['content'])>40 else ''}")
 
+    if st.session_state.role.upper() == 'IT':
+        # Reload hook for schema/permission changes; affects every session in this process
+        if st.button("Reload Schema & Roles"):
+            resources.reload()
+            st.rerun()
+
     if st.button("Clear History"):
+        result_store.clear()
         st.session_state.history = []
+        st.session_state.history_visible = HISTORY_PAGE_SIZE
         st.rerun()
         
     if st.button("Logout"):
+        result_store.clear()
         for key in list(st.session_state.keys()):
             del st.session_state[key]
         st.rerun()
@@ -475,7 +404,16 @@ with st.sidebar:
 st.title("🤖 RAG SQL Chatbot")
 
 # --- CHAT HISTORY ---
-for i, message in enumerate(st.session_state.history):
+# Only the most recent messages are rendered; older result frames live on disk
+history = st.session_state.history
+first_visible = max(0, len(history) - st.session_state.history_visible)
+if first_visible > 0:
+    if st.button(f"⬆️ Load earlier messages ({first_visible} hidden)", key="load_more"):
+        st.session_state.history_visible += HISTORY_PAGE_SIZE
+        st.rerun()
+
+for i in range(first_visible, len(history)):
+    message = history[i]
     is_user = message["role"] == "user"
     avatar_content = st.session_state.username[0].upper() if is_user else "🤖"
     
@@ -498,34 +436,66 @@ for i, message in enumerate(st.session_state.history):
         if "sql_query" in message and message["sql_query"]:
             with st.expander("🔍 View SQL Query"):
                 st.markdown(f'<div class="sql-code">{message["sql_query"]}</div>', unsafe_allow_html=True)
+                if message.get("database"):
+                    st.caption(f"Database: {message['database']}")
         
-        if "results" in message and message["results"] is not None and not message["results"].empty:
+        df = get_results(message, result_store)
+        if df is not None and df.num_rows > 0:
             with st.expander("📊 View Results", expanded=True):
-                df = message["results"]
+                # Arrow tables go to the frontend as-is, without a pandas copy
                 st.dataframe(df, use_container_width=True)
                 
                 # --- Download and Charting options ---
                 col1, col2 = st.columns(2)
                 with col1:
-                    csv = df.to_csv(index=False).encode('utf-8')
-                    st.download_button("Download CSV", csv, f"query_results_{i}.csv", "text/csv", key=f"csv_{i}")
+                    # Exports re-run the SQL and stream it to a file only when the user asks
+                    export_key = f"export_{message['id']}"
+                    report = st.session_state.get(export_key)
+                    if report and os.path.exists(report["path"]):
+                        ext, mime = EXPORT_FORMATS[report["format"]]
+                        with open(report["path"], "rb") as f:
+                            st.download_button(f"Download {report['format']}", f, f"query_results_{i}.{ext}", mime, key=f"download_{i}")
+                        size_note = f"{report['rows']:,} rows, {report['bytes'] / 1024:,.0f} KB"
+                        if report["truncated"]:
+                            size_note += f" (cut at your {report['quota']:,}-row export limit)"
+                        st.caption(size_note)
+                    else:
+                        export_format = st.selectbox("Export format", list(EXPORT_FORMATS), key=f"export_format_{i}")
+                        if st.button("Prepare export", key=f"prepare_export_{i}"):
+                            try:
+                                st.session_state[export_key] = resources.router.export(
+                                    message.get("database"), message["sql_query"], st.session_state.role,
+                                    export_format, result_store.export_dir)
+                            except ExportError as e:
+                                st.error(str(e))
+                            else:
+                                st.rerun()
                 with col2:
-                    if len(df.columns) > 1:
+                    if df.num_columns > 1:
                         try:
                             # Simple chart builder
                             st.write("📈 **Create a quick chart**")
-                            numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-                            all_cols = df.columns.tolist()
+                            numeric_cols = numeric_columns(df)
+                            all_cols = df.column_names
                             if len(numeric_cols) >= 1:
                                 x_axis = st.selectbox("X-Axis", all_cols, key=f"x_axis_{i}")
-                                y_axis = st.selectbox("Y-Axis", numeric_cols, key=f"y_axis_{i}")
-                                chart_type = st.selectbox("Chart Type", ["Bar", "Line"], key=f"chart_type_{i}")
-                                if chart_type == "Bar":
-                                    fig = px.bar(df, x=x_axis, y=y_axis)
-                                    st.plotly_chart(fig, use_container_width=True)
-                                elif chart_type == "Line":
-                                    fig = px.line(df, x=x_axis, y=y_axis)
-                                    st.plotly_chart(fig, use_container_width=True)
+                                # Plotting a column against itself has nothing to aggregate
+                                y_cols = [c for c in numeric_cols if c != x_axis]
+                                if not y_cols:
+                                    st.info("Pick another X-axis column to chart the numeric column against.")
+                                else:
+                                    y_axis = st.selectbox("Y-Axis", y_cols, key=f"y_axis_{i}")
+                                    chart_type = st.selectbox("Chart Type", ["Bar", "Line"], key=f"chart_type_{i}")
+                                    # Aggregate/downsample server-side so the browser only gets what is drawn
+                                    chart_df = chart_cache.get_or_prepare(message["id"], df, x_axis, y_axis, chart_type)
+                                    if chart_type == "Bar":
+                                        fig = px.bar(chart_df, x=x_axis, y=y_axis)
+                                        st.plotly_chart(fig, use_container_width=True)
+                                    elif chart_type == "Line":
+                                        fig = px.line(chart_df, x=x_axis, y=y_axis)
+                                        st.plotly_chart(fig, use_container_width=True)
+                                    if len(chart_df) < df.num_rows:
+                                        st.caption(f"Chart shows {len(chart_df):,} of {df.num_rows:,} points")
                         except Exception as e:
                             st.warning(f"Could not generate chart: {e}")
 
@@ -546,23 +516,28 @@ with st.form(key="chat_form", clear_on_submit=True):
 
     if submitted and query_input:
         st.session_state.current_query = "" # Clear sample query
-        st.session_state.history.append({"role": "user", "content": query_input})
+        st.session_state.history.append({"id": new_message_id(), "role": "user", "content": query_input})
         
         with st.spinner("Processing..."):
             try:
-                allowed_tables = get_allowed_tables(st.session_state.role, st.session_state.role_access)
-                allowed_columns = {t: get_allowed_columns(st.session_state.role, t, st.session_state.role_access, st.session_state.table_cols) for t in allowed_tables}
-                sql_query, response, df = st.session_state.query_agent.answer_query(query_input, allowed_tables, allowed_columns)
+                # The router picks the database and applies that database's role matrix
+                database, sql_query, response, df = resources.router.answer_query(query_input, st.session_state.role)
                 
                 st.session_state.history.append({
+                    "id": new_message_id(),
                     "role": "assistant",
                     "content": response,
                     "sql_query": sql_query,
+                    "database": database,
                     "results": df
                 })
             except Exception as e:
-                st.session_state.history.append({"role": "assistant", "content": f"An error occurred: {e}"})
+                st.session_state.history.append({"id": new_message_id(), "role": "assistant", "content": f"An error occurred: {e}"})
         
+        # Collapse back to the latest page and move older result frames to disk
+        st.session_state.history_visible = HISTORY_PAGE_SIZE
+        spill_old_results(st.session_state.history, result_store, HISTORY_PAGE_SIZE)
+
         st.rerun()
 
 st.markdown('</div>', unsafe_allow_html=True)
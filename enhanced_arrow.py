@@ -0,0 +1,165 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+
+BATCH_ROWS = 65_536          # Rows fetched from the cursor per Arrow batch
+PANDAS_ESTIMATE_ROWS = 2_000  # Rows converted to estimate what the pandas frame would have cost
+
+def arrow_type(declared):
+    """
+    Arrow type for a SQLite declared column type, following SQLite's affinity rules
+    (DATE/TIME names first, since SQLite stores them as TEXT). None means infer from values.
+    """
+    name = (declared or '').upper()
+    if not name or 'BLOB' in name:
+        return None
+    if 'DATE' in name and 'TIME' not in name:
+        return pa.date32()
+    if 'TIME' in name:
+        return pa.timestamp('s')
+    if 'INT' in name:
+        return pa.int64()
+    if 'CHAR' in name or 'CLOB' in name or 'TEXT' in name:
+        return pa.string()
+    if 'REAL' in name or 'FLOA' in name or 'DOUB' in name or 'DEC' in name or 'NUM' in name:
+        return pa.float64()
+    return None
+
+def column_types(conn):
+    """
+    Column name -> declared type from PRAGMA table_info over every table. Names declared
+    differently in two tables are left out so their values decide.
+    """
+    declared, conflicts = {}, set()
+    tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall()
+    for (table,) in tables:
+        for col in conn.execute(f'PRAGMA table_info("{table}")').fetchall():
+            name, type_name = col[1], col[2]
+            if declared.setdefault(name, type_name) != type_name:
+                conflicts.add(name)
+    for name in conflicts:
+        declared.pop(name)
+    return declared
+
+def unique_names(names):
+    """Suffix repeated result column names (SELECT * over a JOIN) so each can be addressed by name."""
+    seen, unique = set(), []
+    for name in names:
+        candidate, n = name, 1
+        while candidate in seen:
+            n += 1
+            candidate = f"{name}_{n}"
+        seen.add(candidate)
+        unique.append(candidate)
+    return unique
+
+def is_numeric_type(arrow_type):
+    return pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type)
+
+def _typed_array(values, target):
+    try:
+        if pa.types.is_date(target) or pa.types.is_timestamp(target):
+            return pc.cast(pa.array(values, pa.string()), target)
+        return pa.array(values, type=target)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
+
+def _inferred_array(values):
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # SQLite lets one column hold several storage classes
+        return pa.array([v if v is None else str(v) for v in values], pa.string())
+
+def _unify(chunks, declared):
+    """One ChunkedArray per column: numbers widen to float64, anything else mixed becomes text."""
+    types = {c.type for c in chunks if not pa.types.is_null(c.type)}
+    if not types:
+        target = declared or pa.null()
+    elif len(types) == 1:
+        target = types.pop()
+    elif all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        target = pa.float64()
+    else:
+        target = pa.string()
+    return pa.chunked_array([c if c.type == target else c.cast(target) for c in chunks], type=target)
+
+def cursor_to_arrow(cursor, declared_types=None, batch_rows=BATCH_ROWS):
+    """
+    Build an Arrow table straight from a cursor, one column array per fetched batch, so no
+    pandas object columns or per-cell boxing are created. Declared types are tried first;
+    values that do not fit them (expressions, loose SQLite typing) decide the type instead.
+    """
+    if cursor.description is None:
+        return pa.table({})
+    declared_types = declared_types or {}
+    names = [d[0] for d in cursor.description]
+    targets = [arrow_type(declared_types.get(name)) for name in names]
+    chunks = [[] for _ in names]
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            break
+        for j, values in enumerate(zip(*rows)):
+            array = _typed_array(values, targets[j]) if targets[j] is not None else None
+            chunks[j].append(array if array is not None else _inferred_array(values))
+    columns = [_unify(chunks[j], targets[j]) if chunks[j] else pa.chunked_array([], type=targets[j] or pa.null())
+               for j in range(len(names))]
+    return pa.Table.from_arrays(columns, names=unique_names(names))
+
+def cursor_batches(cursor, declared_types=None, batch_rows=BATCH_ROWS, max_rows=None):
+    """
+    Yield one Arrow table per fetched batch, for writers that stream to disk. The first
+    batch fixes the schema; a later batch that no longer fits raises pa.ArrowInvalid.
+    """
+    declared_types = declared_types or {}
+    names = [d[0] for d in cursor.description]
+    targets = [arrow_type(declared_types.get(name)) for name in names]
+    fixed = False
+    remaining = max_rows
+    while remaining is None or remaining > 0:
+        rows = cursor.fetchmany(batch_rows if remaining is None else min(batch_rows, remaining))
+        if not rows:
+            return
+        arrays = []
+        for j, values in enumerate(zip(*rows)):
+            array = _typed_array(values, targets[j]) if targets[j] is not None else None
+            if array is None and not fixed:
+                array = _inferred_array(values)
+                if pa.types.is_null(array.type):
+                    array = array.cast(pa.string())
+            elif array is None and pa.types.is_string(targets[j]):
+                array = pa.array([v if v is None else str(v) for v in values], pa.string())
+            elif array is None:
+                raise pa.ArrowInvalid(f"Column {names[j]} changes type after the first {batch_rows:,} rows")
+            arrays.append(array)
+        if not fixed:
+            targets = [a.type for a in arrays]
+            fixed = True
+        if remaining is not None:
+            remaining -= len(rows)
+        yield pa.Table.from_arrays(arrays, names=unique_names(names))
+
+def pandas_bytes_estimate(table, sample_rows=PANDAS_ESTIMATE_ROWS):
+    """What the same result would take as a pandas frame (object text columns included), from a sample."""
+    if table.num_rows == 0:
+        return 0
+    sample = table.slice(0, min(table.num_rows, sample_rows)).to_pandas()
+    per_row = sample.memory_usage(deep=True, index=False).sum() / len(sample)
+    return int(per_row * table.num_rows)
+
+def numeric_columns(table):
+    return [f.name for f in table.schema if is_numeric_type(f.type)]
+
+def to_pandas(table, columns=None):
+    """Convert only the columns a feature needs; dates come back as datetime64."""
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas(date_as_object=False)
+
+def query_to_arrow(conn, sql, declared_types=None):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql)
+        return cursor_to_arrow(cursor, declared_types)
+    finally:
+        cursor.close()
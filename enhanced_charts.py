@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from enhanced_arrow import to_pandas
+
+MAX_BAR_CATEGORIES = 50   # Remaining categories are folded into "Other"
+MAX_LINE_POINTS = 1000    # Point budget for line charts
+CHART_CACHE_SIZE = 128
+
+def aggregate_bars(df, x, y, max_categories=MAX_BAR_CATEGORIES):
+    """Sum y per x value; keep the largest categories and fold the rest into 'Other'."""
+    grouped = df.groupby(x, dropna=False, sort=False)[y].sum().reset_index()
+    if len(grouped) <= max_categories:
+        return grouped.sort_values(x, kind='stable').reset_index(drop=True)
+    grouped = grouped.sort_values(y, ascending=False, kind='stable')
+    top = grouped.iloc[:max_categories - 1]
+    other = pd.DataFrame({x: ['Other'], y: [grouped[y].iloc[max_categories - 1:].sum()]})
+    top = top.astype({x: object})
+    return pd.concat([top, other], ignore_index=True)
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of the points that best preserve the line's shape."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    # Interior points are split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        areas = np.abs((x[a] - avg_x) * (bucket_y - y[a]) - (x[a] - bucket_x) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+def downsample_line(df, x, y, max_points=MAX_LINE_POINTS):
+    """Sort by x, sum duplicate x values, then reduce to max_points with LTTB."""
+    data = df[[x, y]].dropna(subset=[y])
+    if data[x].duplicated().any():
+        data = data.groupby(x, sort=False)[y].sum().reset_index()
+    x_values = data[x]
+    if pd.api.types.is_numeric_dtype(x_values) or pd.api.types.is_datetime64_any_dtype(x_values):
+        data = data.sort_values(x, kind='stable').reset_index(drop=True)
+        positions = data[x].astype('int64') if pd.api.types.is_datetime64_any_dtype(x_values) else data[x]
+    else:
+        # Categorical x: keep the query's row order and use positions for the geometry
+        data = data.reset_index(drop=True)
+        positions = np.arange(len(data))
+    if len(data) <= max_points:
+        return data
+    return data.iloc[lttb_indices(positions, data[y], max_points)].reset_index(drop=True)
+
+def prepare_chart_data(df, x, y, chart_type, max_points=MAX_LINE_POINTS):
+    """Reduce a result frame to what the chart actually needs to draw."""
+    if x == y:
+        raise ValueError("The X and Y axes must be different columns.")
+    if chart_type == "Bar":
+        return aggregate_bars(df, x, y)
+    if chart_type == "Line":
+        return downsample_line(df, x, y, max_points)
+    return df[[x, y]]
+
+class ChartCache:
+    """Small thread-safe LRU of prepared chart frames keyed by (message id, x, y, chart type)."""
+
+    def __init__(self, maxsize=CHART_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_prepare(self, message_id, df, x, y, chart_type):
+        key = (message_id, x, y, chart_type)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        if isinstance(df, pa.Table):
+            # Only the two plotted columns ever become a pandas frame
+            df = to_pandas(df, list(dict.fromkeys([x, y])))
+        prepared = prepare_chart_data(df, x, y, chart_type)
+        with self._lock:
+            self._items[key] = prepared
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return prepared
+
+chart_cache = ChartCache()
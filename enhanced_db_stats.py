@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+import time
+
+EXACT_REFRESH_INTERVAL = 600  # Seconds between background COUNT(*) passes
+ANALYSIS_LIMIT = 1000         # Rows sampled per index when ANALYZE builds sqlite_stat1
+
+def list_tables(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
+    return [row[0] for row in cursor.fetchall()]
+
+def estimate_table_counts(db_path):
+    """
+    Row-count estimates that never scan a table: sqlite_stat1 when ANALYZE has run,
+    otherwise MAX(rowid), which is a single B-tree seek.
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    tables = list_tables(cursor)
+    stat_counts = {}
+    try:
+        for tbl, stat in cursor.execute("SELECT tbl, stat FROM sqlite_stat1").fetchall():
+            # The first number in stat is the (estimated) row count of the table
+            rows = int(str(stat).split()[0])
+            stat_counts[tbl] = max(rows, stat_counts.get(tbl, 0))
+    except (sqlite3.OperationalError, ValueError, IndexError):
+        pass  # No sqlite_stat1 yet
+    counts = {}
+    for table in tables:
+        if table in stat_counts:
+            counts[table] = stat_counts[table]
+            continue
+        try:
+            counts[table] = cursor.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            counts[table] = 0  # WITHOUT ROWID table; exact count arrives from the refresher
+    conn.close()
+    return counts
+
+def exact_table_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    counts = {}
+    for table in list_tables(cursor):
+        try:
+            counts[table] = cursor.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        except sqlite3.Error:
+            counts[table] = 0
+    conn.close()
+    return counts
+
+def refresh_statistics(db_path):
+    """Build sqlite_stat1 cheaply (sampled ANALYZE) if it does not exist yet."""
+    conn = sqlite3.connect(db_path)
+    try:
+        has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone()
+        if not has_stats:
+            conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+            conn.execute("ANALYZE")
+            conn.commit()
+    finally:
+        conn.close()
+
+class TableCountRefresher:
+    """
+    Serves table sizes for the sidebar: estimates immediately, exact COUNT(*)
+    results from a background thread on a fixed schedule.
+    """
+
+    def __init__(self, db_path, interval=EXACT_REFRESH_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.counts = {}
+        self.exact = False
+        self.refreshed_at = None
+        try:
+            self.counts = estimate_table_counts(db_path)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not estimate table counts: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def refresh_now(self):
+        """Ask the background thread for an exact pass without waiting for the schedule."""
+        self._wake.set()
+
+    def _run(self):
+        try:
+            refresh_statistics(self.db_path)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not ANALYZE {self.db_path}: {e}")
+        while True:
+            try:
+                counts = exact_table_counts(self.db_path)
+                with self._lock:
+                    self.counts = counts
+                    self.exact = True
+                    self.refreshed_at = time.time()
+            except sqlite3.Error as e:
+                print(f"Warning: Exact table count refresh failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def status(self):
+        """Return (table_info, total_rows, exact, refreshed_at)."""
+        with self._lock:
+            counts = dict(self.counts)
+            return counts, sum(counts.values()), self.exact, self.refreshed_at
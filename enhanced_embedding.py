@@ -2,6 +2,8 @@ from sentence_transformers import SentenceTransformer, util
 import pandas as pd
 import numpy as np
 import os
+import threading
+from enhanced_metadata_cache import read_workbook
 
 # Try to use local embedding model, fallback to smaller model that can be cached
 def get_embedding_model():
@@ -17,39 +19,72 @@ def get_embedding_model():
 
 EMBED_MODEL = get_embedding_model()
 
+_model_lock = threading.Lock()
+# The shared model's tokenizer is not safe for concurrent use, so every encode takes this lock
+_encode_lock = threading.Lock()
+_shared_model = None
+_shared_model_failed = False
+
+def get_shared_model():
+    """Load the SentenceTransformer once per process; None if it cannot be loaded."""
+    global _shared_model, _shared_model_failed
+    with _model_lock:
+        if _shared_model is None and not _shared_model_failed:
+            try:
+                _shared_model = SentenceTransformer(EMBED_MODEL)
+                print(f"Using embedding model: {EMBED_MODEL}")
+            except Exception as e:
+                print(f"Warning: Could not load embedding model {EMBED_MODEL}: {e}")
+                print("Falling back to basic text matching")
+                _shared_model_failed = True
+        return _shared_model
+
+def encode(model, texts):
+    """Encode texts with the shared model as a tensor, one caller at a time."""
+    with _encode_lock:
+        return model.encode(texts, convert_to_tensor=True)
+
 class SchemaEmbedder:
-    def __init__(self, data_dict_path='data/data_dictionary.xlsx'):
-        try:
-            self.model = SentenceTransformer(EMBED_MODEL)
-            print(f"Using embedding model: {EMBED_MODEL}")
-        except Exception as e:
-            print(f"Warning: Could not load embedding model {EMBED_MODEL}: {e}")
-            print("Falling back to basic text matching")
-            self.model = None
-        
-        self.data_dict = pd.read_excel(data_dict_path) if os.path.exists(data_dict_path) else pd.DataFrame()
+    def __init__(self, data_dict_path='data/data_dictionary.xlsx', data_dict=None):
+        self.model = get_shared_model()
+        # Guards the embedding matrix; encoder calls go through encode()
+        self._lock = threading.RLock()
+        self.data_dict_path = data_dict_path
+        self.data_dict = pd.DataFrame()
         self.embeddings = None
         self.texts = []
-        # Compute embeddings once during initialization
-        if not self.data_dict.empty and self.model is not None:
-            self._embed_schema()
+        self.reload(data_dict)
+
+    def reload(self, data_dict=None):
+        """Re-read the data dictionary (or use the one given) and re-embed it in place."""
+        if data_dict is None:
+            data_dict = read_workbook(self.data_dict_path) if os.path.exists(self.data_dict_path) else pd.DataFrame()
+        texts, embeddings = [], None
+        # Compute embeddings once per reload; searches reuse them
+        if not data_dict.empty and self.model is not None:
+            texts, embeddings = self._embed_schema(data_dict)
+        with self._lock:
+            self.data_dict = data_dict
+            self.texts = texts
+            self.embeddings = embeddings
 
-    def _embed_schema(self):
+    def _embed_schema(self, data_dict):
         """Compute embeddings once and cache them"""
-        if self.model is None:
-            return
-        self.texts = [f"{row['Table']} {row['Column']} {row['Column Description']}" for _, row in self.data_dict.iterrows()]
-        self.embeddings = self.model.encode(self.texts, convert_to_tensor=True)
-        print(f"Embedded {len(self.texts)} schema items (cached for reuse)")
+        texts = [f"{row['Table']} {row['Column']} {row['Column Description']}" for _, row in data_dict.iterrows()]
+        embeddings = encode(self.model, texts)
+        print(f"Embedded {len(texts)} schema items (cached for reuse)")
+        return texts, embeddings
 
-    def search(self, question, top_k=5):
-        """Search using cached embeddings - no recomputation needed"""
-        if self.embeddings is None or self.data_dict.empty:
-            # Fallback to basic text matching if no embeddings
-            return self._basic_search(question, top_k)
-        q_emb = self.model.encode([question], convert_to_tensor=True)
-        hits = util.semantic_search(q_emb, self.embeddings, top_k=top_k)[0]
-        results = [self.data_dict.iloc[hit['corpus_id']] for hit in hits]
+    def search(self, question, top_k=5, query_embedding=None):
+        """Search using cached embeddings; pass query_embedding to reuse an already-encoded question"""
+        with self._lock:
+            data_dict, embeddings = self.data_dict, self.embeddings
+            if embeddings is None or data_dict.empty:
+                # Fallback to basic text matching if no embeddings
+                return self._basic_search(question, top_k)
+        q_emb = query_embedding if query_embedding is not None else encode(self.model, [question])
+        hits = util.semantic_search(q_emb, embeddings, top_k=top_k)[0]
+        results = [data_dict.iloc[hit['corpus_id']] for hit in hits]
         return results
     
     def _basic_search(self, question, top_k=5):
@@ -0,0 +1,260 @@
+import atexit
+import multiprocessing as mp
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+import pyarrow as pa
+from enhanced_arrow import column_types, pandas_bytes_estimate, query_to_arrow
+from enhanced_shadow_db import role_authorizer
+
+try:
+    import resource  # POSIX only; memory limits are skipped elsewhere
+except ImportError:
+    resource = None
+
+EXECUTOR_WORKERS = 2
+QUERY_TIMEOUT = 30        # Seconds a query may run before SQLite interrupts it
+QUERY_MEMORY_MB = 2048    # Address-space limit per worker process
+KILL_GRACE = 5            # Extra seconds before a worker that ignores the interrupt is killed
+PROGRESS_STEPS = 10_000   # SQLite VM instructions between deadline checks
+SHM_DIR = '/dev/shm'      # Where POSIX shared memory blocks appear as files on Linux
+
+class QueryExecutionError(Exception):
+    """A query failed, timed out or took its worker down; the message is shown to the user."""
+
+# --- Worker process ---
+
+def _limit_memory(memory_mb):
+    if resource is None or not memory_mb:
+        return
+    limit = memory_mb * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError) as e:
+        print(f"Warning: Could not limit executor memory: {e}")
+
+def _declared_types(db, cache, hints):
+    """
+    Declared column types for a worker's connection, re-read when the schema changes;
+    hints (the data dictionary's Type column) only fill names PRAGMA table_info does not settle.
+    """
+    version = db.execute("PRAGMA schema_version").fetchone()[0]
+    if cache.get('version') != version:
+        cache['version'] = version
+        cache['types'] = column_types(db)
+    return {**hints, **cache['types']} if hints else cache['types']
+
+def _with_deadline(db, timeout, work):
+    deadline = time.monotonic() + timeout
+    db.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, PROGRESS_STEPS)
+    try:
+        return work()
+    finally:
+        db.set_progress_handler(None, 0)
+
+def _write_ipc(table, buf):
+    # Kept in its own frame so no Arrow view of the block outlives the write
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(pa.py_buffer(buf)), table.schema) as writer:
+        writer.write_table(table)
+
+def _write_shared(table, name):
+    """Write the table as an Arrow IPC stream into a new shared-memory block; returns its size."""
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    size = sink.size()
+    shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+    # The parent maps, reads and unlinks the block, so it owns it from here on
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    try:
+        _write_ipc(table, shm.buf)
+    finally:
+        shm.close()
+    return size
+
+def _worker_main(conn, memory_mb):
+    from enhanced_export import write_export  # Imported here: enhanced_export submits to this pool
+    _limit_memory(memory_mb)
+    databases, type_caches = {}, {}
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        # target is the shared-memory block name for 'query', (format, path, max_rows) for 'export'
+        kind, db_path, sql, timeout, type_hints, allowed_columns, target = task
+        label = 'Export' if kind == 'export' else 'Query'
+        try:
+            db = databases.get(db_path)
+            if db is None:
+                db = databases[db_path] = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            db.set_authorizer(None)
+            declared = _declared_types(db, type_caches.setdefault(db_path, {}), type_hints)
+            if allowed_columns is not None:
+                db.set_authorizer(role_authorizer(allowed_columns))
+            if kind == 'export':
+                fmt, path, max_rows = target
+                rows, truncated = _with_deadline(db, timeout, lambda: write_export(db, sql, fmt, path, max_rows, declared))
+                conn.send(('ok', rows, truncated))
+                continue
+            table = _with_deadline(db, timeout, lambda: query_to_arrow(db, sql, declared))
+            size = _write_shared(table, target)
+            conn.send(('ok', size, table.num_rows, pandas_bytes_estimate(table)))
+        except MemoryError:
+            conn.send(('error', f"{label} exceeded the {memory_mb} MB memory limit."))
+        except Exception as e:
+            message = str(e)
+            if message.endswith('interrupted'):
+                message = f"{label} exceeded the {timeout}s time limit."
+            elif message.endswith('out of memory'):
+                message = f"{label} exceeded the {memory_mb} MB memory limit."
+            conn.send(('error', message))
+
+# --- Parent side ---
+
+def _discard_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _discard_shared(name):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+def _read_shared(name, size):
+    """Arrow table from a worker's block; the block is unlinked before this returns."""
+    path = os.path.join(SHM_DIR, name)
+    if os.path.exists(path):
+        # Arrow maps the block itself and its buffers keep the mapping alive, so the
+        # result is read in place and the name can go right away
+        source = pa.memory_map(path)
+        os.unlink(path)
+        return pa.ipc.open_stream(source).read_all()
+    # No /dev/shm (Windows, macOS): one copy out of the block
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        data = pa.py_buffer(bytes(shm.buf[:size]))
+    finally:
+        shm.close()
+        shm.unlink()
+    return pa.ipc.open_stream(data).read_all()
+
+class QueryExecutor:
+    """
+    Runs SQL in a pool of worker processes so a runaway query cannot take memory or the GIL
+    from the Streamlit process. Each worker has an address-space limit and interrupts queries
+    past their deadline; a worker that crashes or stops answering is killed and replaced.
+    Results come back as Arrow IPC streams in shared memory instead of through the pipe.
+    """
+
+    def __init__(self, workers=EXECUTOR_WORKERS, timeout=QUERY_TIMEOUT, memory_mb=QUERY_MEMORY_MB):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        # spawn: forking a process that already runs Streamlit and llama.cpp threads is unsafe
+        self._ctx = mp.get_context('spawn')
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self.restarts = 0
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        proc = self._ctx.Process(target=_worker_main, args=(child_conn, self.memory_mb), daemon=True)
+        proc.start()
+        child_conn.close()
+        with self._lock:
+            self._workers.append(proc)
+        return proc, parent_conn
+
+    def _replace(self, worker):
+        proc, conn = worker
+        if proc.is_alive():
+            proc.kill()
+        proc.join()
+        conn.close()
+        with self._lock:
+            self._workers.remove(proc)
+            self.restarts += 1
+        return self._spawn()
+
+    def _call(self, task, timeout, discard):
+        """Send a task to an idle worker and return its reply; discard() cleans up after a failure."""
+        worker = self._idle.get()
+        if not worker[0].is_alive():
+            print("Warning: Query worker died while idle; restarting it")
+            worker = self._replace(worker)
+        reply = None
+        try:
+            worker[1].send(task)
+            if not worker[1].poll(timeout + KILL_GRACE):
+                worker = self._replace(worker)
+                raise QueryExecutionError(f"Query exceeded the {timeout}s time limit; its worker was restarted.")
+            reply = worker[1].recv()
+        except (EOFError, OSError):
+            worker = self._replace(worker)
+            raise QueryExecutionError("The query worker crashed (likely out of memory); it was restarted.")
+        finally:
+            self._idle.put(worker)
+            if reply is None or reply[0] == 'error':
+                discard()  # A killed or failing worker may have left its output behind
+        if reply[0] == 'error':
+            raise QueryExecutionError(reply[1])
+        return reply
+
+    def execute(self, db_path, sql, timeout=None, type_hints=None, allowed_columns=None):
+        """
+        Return (Arrow table, stats) with stats {'result_bytes', 'pandas_bytes_estimate'};
+        type_hints are declared types (e.g. the data dictionary's Type column) for columns
+        PRAGMA table_info does not cover. With allowed_columns ({table: [columns]}) the
+        worker's connection refuses reads outside the role's grant. Raises QueryExecutionError.
+        """
+        timeout = timeout or self.timeout
+        shm_name = f"dm_{uuid.uuid4().hex[:20]}"
+        task = ('query', os.path.abspath(db_path), sql, timeout, type_hints, allowed_columns, shm_name)
+        _, size, _rows, pandas_bytes = self._call(task, timeout, lambda: _discard_shared(shm_name))
+        return _read_shared(shm_name, size), {'result_bytes': size, 'pandas_bytes_estimate': pandas_bytes}
+
+    def export(self, db_path, sql, fmt, path, max_rows, timeout, type_hints=None, allowed_columns=None):
+        """
+        Stream a query's rows to `path` in a worker, under the same memory limit and role
+        authorizer as execute(). Returns (rows written, truncated). Raises QueryExecutionError.
+        """
+        task = ('export', os.path.abspath(db_path), sql, timeout, type_hints, allowed_columns,
+                (fmt, os.path.abspath(path), max_rows))
+        _, rows, truncated = self._call(task, timeout, lambda: _discard_file(path))
+        return rows, truncated
+
+    def shutdown(self):
+        with self._lock:
+            workers = list(self._workers)
+        for proc in workers:
+            proc.kill()
+            proc.join()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Process-wide executor pool, started on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = QueryExecutor()
+            atexit.register(_executor.shutdown)
+        return _executor
+
+def execute_query(db_path, sql, timeout=None, type_hints=None, allowed_columns=None):
+    return get_executor().execute(db_path, sql, timeout, type_hints, allowed_columns)
@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+import time
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from enhanced_arrow import cursor_batches
+from enhanced_executor import QueryExecutionError, get_executor
+
+EXPORT_QUOTAS_PATH = os.path.join('data', 'export_quotas.json')
+EXPORT_ROW_QUOTA = 1_000_000   # Rows per export for roles without an entry in export_quotas.json
+EXPORT_TIMEOUT = 300           # Seconds an export query may run
+EXPORT_BATCH_ROWS = 10_000     # Rows fetched and written per chunk
+XLSX_MAX_ROWS = 1_048_575      # Excel's sheet limit, less the header row
+
+# Label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'XLSX': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+class ExportError(Exception):
+    """An export was refused or failed; the message is shown to the user."""
+
+def load_export_quotas(path=EXPORT_QUOTAS_PATH):
+    """Optional per-role row limits, e.g. {"Teller": 10000, "Manager": 2000000}; keys are case-insensitive."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return {str(role).lower(): int(rows) for role, rows in json.load(f).items()}
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        print(f"Warning: Could not read {path}: {e}")
+        return {}
+
+def export_quota(role, path=EXPORT_QUOTAS_PATH):
+    return load_export_quotas(path).get(str(role).lower(), EXPORT_ROW_QUOTA)
+
+class _CSVSink:
+    def __init__(self, path, schema):
+        self.writer = pa_csv.CSVWriter(path, schema)
+
+    def write(self, batch):
+        self.writer.write_table(batch)
+
+    def close(self):
+        self.writer.close()
+
+class _ParquetSink:
+    def __init__(self, path, schema):
+        self.writer = pq.ParquetWriter(path, schema)
+
+    def write(self, batch):
+        self.writer.write_table(batch)
+
+    def close(self):
+        self.writer.close()
+
+class _XLSXSink:
+    def __init__(self, path, schema):
+        from openpyxl import Workbook
+        self.path = path
+        # Write-only mode streams rows to disk instead of keeping cell objects
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet('Results')
+        self.sheet.append(schema.names)
+
+    def write(self, batch):
+        for row in zip(*(column.to_pylist() for column in batch.columns)):
+            self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+SINKS = {'CSV': _CSVSink, 'Parquet': _ParquetSink, 'XLSX': _XLSXSink}
+
+def write_export(conn, sql_query, fmt, path, limit, declared):
+    """
+    Run in an executor worker: stream the query's rows to `path` in `fmt` chunk by chunk,
+    so neither the rows nor the encoded file are held in memory. Returns (rows, truncated);
+    the file is removed on failure.
+    """
+    sink, rows, fetched = None, 0, 0
+    try:
+        cursor = conn.execute(sql_query)
+        if cursor.description is None:
+            raise ExportError("The query returned no columns to export.")
+        # One row past the limit tells a complete export apart from one cut at the quota
+        for batch in cursor_batches(cursor, declared, EXPORT_BATCH_ROWS, limit + 1):
+            fetched += batch.num_rows
+            batch = batch.slice(0, limit - rows)
+            if sink is None:
+                sink = SINKS[fmt](path, batch.schema)
+            if batch.num_rows:
+                sink.write(batch)
+                rows += batch.num_rows
+        if sink is None:
+            # Empty result: the file only carries the header
+            names = [d[0] for d in cursor.description]
+            sink = SINKS[fmt](path, pa.schema([(name, pa.string()) for name in names]))
+        sink.close()
+    except Exception as e:
+        if sink is not None:
+            try:
+                sink.close()
+            except Exception:
+                pass
+        os.remove(path)
+        if isinstance(e, pa.ArrowInvalid):
+            raise ExportError(f"{e}; try a narrower query or another format.")
+        raise
+    return rows, fetched > limit
+
+def export_query(db_path, sql_query, fmt, out_dir, allowed_columns, max_rows=EXPORT_ROW_QUOTA,
+                 type_hints=None, timeout=EXPORT_TIMEOUT):
+    """
+    Re-run validated SQL in a query executor worker, under its memory limit and the role's
+    authorizer, writing the file there. Returns a report dict with path, rows, bytes,
+    truncated and seconds.
+    """
+    if fmt not in SINKS:
+        raise ExportError(f"Unknown export format: {fmt}")
+    limit = min(max_rows, XLSX_MAX_ROWS) if fmt == 'XLSX' else max_rows
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.' + EXPORT_FORMATS[fmt][0], dir=out_dir)
+    os.close(fd)
+    try:
+        rows, truncated = get_executor().export(db_path, sql_query, fmt, path, limit, timeout,
+                                                type_hints, allowed_columns)
+    except QueryExecutionError as e:
+        raise ExportError(str(e))
+    return {'path': path, 'format': fmt, 'rows': rows, 'bytes': os.path.getsize(path),
+            'truncated': truncated, 'quota': limit, 'seconds': time.perf_counter() - start}
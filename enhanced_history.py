@@ -0,0 +1,57 @@
+import os
+import shutil
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+RESULTS_CACHE_DIR = os.path.join('cache', 'results')
+HISTORY_PAGE_SIZE = 10  # Messages rendered per "load more" step
+
+def new_message_id():
+    return uuid.uuid4().hex
+
+class ResultStore:
+    """
+    Disk spill area for one chat session's result tables, keyed by message id.
+    Arrow tables are written as Parquet and read back as Arrow without a pandas round trip.
+    """
+
+    def __init__(self, session_id, cache_dir=RESULTS_CACHE_DIR):
+        self.dir = os.path.join(cache_dir, session_id)
+        self.export_dir = os.path.join(self.dir, 'exports')  # Downloads streamed by enhanced_export
+
+    def _path(self, message_id, ext):
+        return os.path.join(self.dir, f"{message_id}.{ext}")
+
+    def spill(self, message_id, df):
+        os.makedirs(self.dir, exist_ok=True)
+        if isinstance(df, pd.DataFrame):
+            df = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(df, self._path(message_id, 'parquet'))
+
+    def load(self, message_id):
+        parquet_path = self._path(message_id, 'parquet')
+        if os.path.exists(parquet_path):
+            return pq.read_table(parquet_path)
+        return None
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+def spill_old_results(history, store, visible_count):
+    """Move result frames of messages outside the last `visible_count` messages to disk."""
+    for message in history[:max(0, len(history) - visible_count)]:
+        df = message.get("results")
+        if df is not None and "id" in message:
+            store.spill(message["id"], df)
+            message["results"] = None
+            message["results_spilled"] = True
+
+def get_results(message, store):
+    """Return the message's result frame, reading it back from disk if it was spilled."""
+    if message.get("results") is not None:
+        return message["results"]
+    if message.get("results_spilled"):
+        return store.load(message["id"])
+    return None
@@ -0,0 +1,341 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from enhanced_shadow_db import read_only_authorizer
+
+DB_PATH = os.path.join('db', 'bank_exchange.db')
+DATA_DICT_PATH = os.path.join('data', 'data_dictionary.xlsx')
+QUERY_LOG_PATH = os.path.join('logs', 'executed_queries.jsonl')
+MAX_INDEX_COLUMNS = 3
+TIMING_RUNS = 5   # Timed runs per query, after one untimed warm-up run; the median is reported
+
+_log_lock = threading.Lock()
+
+# --- QUERY LOG ---
+def record_query(db_path, sql, duration_ms, rows, log_path=QUERY_LOG_PATH):
+    """Append one executed query to the JSONL log the advisor reads."""
+    entry = {'timestamp': time.time(), 'db_path': db_path, 'sql': sql,
+             'duration_ms': round(duration_ms, 3), 'rows': rows}
+    with _log_lock:
+        try:
+            if os.path.dirname(log_path):
+                os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            with open(log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            print(f"Warning: Could not write query log: {e}")
+
+def load_query_log(db_path, log_path=QUERY_LOG_PATH):
+    """Distinct logged queries for db_path with their best observed duration."""
+    queries = {}
+    if not os.path.exists(log_path):
+        return queries
+    with open(log_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if os.path.abspath(entry.get('db_path', '')) != os.path.abspath(db_path):
+                continue
+            sql = entry['sql'].strip().rstrip(';')
+            seen = queries.setdefault(sql, {'count': 0, 'duration_ms': entry['duration_ms']})
+            seen['count'] += 1
+            seen['duration_ms'] = min(seen['duration_ms'], entry['duration_ms'])
+    return queries
+
+# --- SQL COLUMN EXTRACTION ---
+_KEYWORDS = {'where', 'join', 'inner', 'left', 'right', 'outer', 'cross', 'on', 'group', 'order',
+             'limit', 'having', 'as', 'select', 'from', 'union', 'natural', 'using'}
+_TABLE_REF = re.compile(r'\b(?:from|join)\s+[`"\[]?(\w+)[`"\]]?(?:\s+(?:as\s+)?(\w+))?', re.IGNORECASE)
+_QUALIFIED = re.compile(r'\b(\w+)\.[`"\[]?(\w+)', re.IGNORECASE)
+_IDENT = re.compile(r'\b([A-Za-z_]\w*)\b')
+_STAR = re.compile(r'(?:^|[\s,.])\*')  # SELECT * or t.*, but not COUNT(*)
+
+def _clauses(sql, start_kw, end_kws):
+    pattern = rf'\b{start_kw}\b(.*?)(?=\b(?:{"|".join(end_kws)})\b|$)'
+    return re.findall(pattern, sql, re.IGNORECASE | re.DOTALL)
+
+def _resolve_columns(text, aliases, table_cols, tables_in_query):
+    """Map column references in a clause to (table, column) pairs."""
+    found = set()
+    for qualifier, col in _QUALIFIED.findall(text):
+        table = aliases.get(qualifier.lower())
+        if table and col in table_cols.get(table, []):
+            found.add((table, col))
+    # Unqualified names: resolve when exactly one referenced table has the column
+    stripped = _QUALIFIED.sub(' ', re.sub(r"'[^']*'", ' ', text))
+    for name in _IDENT.findall(stripped):
+        if name.lower() in _KEYWORDS:
+            continue
+        owners = [t for t in tables_in_query if name in table_cols.get(t, [])]
+        if len(owners) == 1:
+            found.add((owners[0], name))
+    return found
+
+def extract_predicate_columns(sql, table_cols):
+    """
+    Return {table: {'where', 'equality', 'join', 'group', 'select', 'order': set of columns,
+    'star': bool}} for one query; 'select' and 'order' are what a covering index must also hold.
+    """
+    aliases = {}
+    tables_in_query = []
+    for table, alias in _TABLE_REF.findall(sql):
+        if table not in table_cols:
+            continue
+        tables_in_query.append(table)
+        aliases[table.lower()] = table
+        if alias and alias.lower() not in _KEYWORDS:
+            aliases[alias.lower()] = table
+    usage = defaultdict(lambda: {'where': set(), 'equality': set(), 'join': set(), 'group': set(),
+                                 'select': set(), 'order': set(), 'star': False})
+    clause_sets = {
+        'select': _clauses(sql, 'select', ['from']),
+        'order': _clauses(sql, r'order\s+by', ['limit', 'union']),
+        'where': _clauses(sql, 'where', ['group', 'order', 'limit', 'having', 'union']),
+        'join': _clauses(sql, 'on', ['join', 'inner', 'left', 'right', 'cross', 'where', 'group', 'order', 'limit', 'union']),
+        'group': _clauses(sql, r'group\s+by', ['having', 'order', 'limit', 'union']),
+    }
+    for kind, texts in clause_sets.items():
+        for text in texts:
+            for table, col in _resolve_columns(text, aliases, table_cols, tables_in_query):
+                usage[table][kind].add(col)
+                if kind == 'where' and re.search(rf'\b{col}[`"\]]?\s*(?:=|in\b|is\b)', text, re.IGNORECASE):
+                    usage[table]['equality'].add(col)
+    if any(_STAR.search(text) for text in clause_sets['select']):
+        for table in tables_in_query:
+            usage[table]['star'] = True  # Every column is needed, so no index can cover the query
+    return dict(usage)
+
+# --- METADATA ---
+def get_table_columns(conn):
+    tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall()
+    return {t: [c[1] for c in conn.execute(f'PRAGMA table_info("{t}")').fetchall()] for (t,) in tables}
+
+def get_foreign_key_columns(conn, data_dict_path=DATA_DICT_PATH):
+    """(table, column) pairs that are foreign keys per the data dictionary or PRAGMA foreign_key_list."""
+    fk_cols = set()
+    if os.path.exists(data_dict_path):
+        try:
+            from enhanced_metadata_cache import read_workbook
+            dd = read_workbook(data_dict_path)
+            fk_rows = dd[dd['Foreign Key Table'].notna() & (dd['Foreign Key Table'].astype(str).str.strip() != '')]
+            fk_cols.update(zip(fk_rows['Table'], fk_rows['Column']))
+        except Exception as e:
+            print(f"Warning: Could not read foreign keys from data dictionary: {e}")
+    for table in get_table_columns(conn):
+        for fk in conn.execute(f'PRAGMA foreign_key_list("{table}")').fetchall():
+            fk_cols.add((table, fk[3]))
+    return fk_cols
+
+def existing_index_prefixes(conn):
+    """{table: [tuple of indexed columns]} including automatic PK/UNIQUE indexes."""
+    prefixes = defaultdict(list)
+    for table in get_table_columns(conn):
+        pk_cols = [c for c in conn.execute(f'PRAGMA table_info("{table}")').fetchall() if c[5]]
+        if len(pk_cols) == 1 and pk_cols[0][2].upper() == 'INTEGER':
+            prefixes[table].append((pk_cols[0][1],))  # INTEGER PRIMARY KEY is the rowid itself
+        for idx in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+            cols = tuple(r[2] for r in conn.execute(f'PRAGMA index_info("{idx[1]}")').fetchall())
+            prefixes[table].append(cols)
+    return prefixes
+
+# --- PROPOSALS ---
+def propose_indexes(queries, table_cols, fk_cols, existing):
+    """
+    Build candidate indexes from observed predicates: equality filters first, then
+    range filters, join keys and GROUP BY columns. When the selected, aggregated and ORDER BY
+    columns still fit within MAX_INDEX_COLUMNS they are appended, so the index covers the
+    query and the table rows are never read.
+    """
+    candidates = Counter()
+    affected = defaultdict(set)
+    for sql, seen in queries.items():
+        for table, use in extract_predicate_columns(sql, table_cols).items():
+            # Equality before range; FK keys first within each so joins can reuse the index
+            ordered = sorted(use['where'], key=lambda c: (c not in use['equality'], (table, c) not in fk_cols, c))
+            ordered += sorted(use['join'] - use['where'], key=lambda c: ((table, c) not in fk_cols, c))
+            ordered += sorted(use['group'] - use['where'] - use['join'])
+            rest = sorted((use['select'] | use['order']) - set(ordered))
+            if not use['star'] and ordered and len(ordered) + len(rest) <= MAX_INDEX_COLUMNS:
+                ordered += rest  # Covering; a partial cover would still read every row
+            cols = tuple(ordered[:MAX_INDEX_COLUMNS])
+            if not cols:
+                continue
+            if any(ix[:len(cols)] == cols for ix in existing.get(table, [])):
+                continue  # Already served by an existing index prefix
+            key = (table, cols)
+            candidates[key] += seen['count']
+            affected[key].add(sql)
+            # Joined FK columns also get a single-column index of their own
+            for col in use['join']:
+                if (table, col) in fk_cols and (col,) != cols and not any(ix[:1] == (col,) for ix in existing.get(table, [])):
+                    candidates[(table, (col,))] += seen['count']
+                    affected[(table, (col,))].add(sql)
+    # An index whose columns prefix a longer candidate on the same table is redundant
+    for table, cols in list(candidates):
+        for other_table, other_cols in list(candidates):
+            if other_table == table and len(other_cols) > len(cols) and other_cols[:len(cols)] == cols:
+                candidates[(table, other_cols)] += candidates.pop((table, cols))
+                affected[(table, other_cols)] |= affected.pop((table, cols))
+                break
+    proposals = []
+    for (table, cols), hits in candidates.most_common():
+        name = f"idx_{table}_{'_'.join(cols)}"
+        quoted = ', '.join(f'"{c}"' for c in cols)
+        ddl = f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({quoted})'
+        proposals.append({'name': name, 'table': table, 'columns': cols, 'ddl': ddl,
+                          'hits': hits, 'queries': sorted(affected[(table, cols)])})
+    return proposals
+
+# --- PLAN-BASED ESTIMATE ---
+def schema_clone(conn):
+    """In-memory database with the same DDL (and planner statistics) but no rows."""
+    clone = sqlite3.connect(':memory:')
+    ddl = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+        "ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 WHEN 'view' THEN 2 ELSE 3 END"
+    ).fetchall()
+    for (sql,) in ddl:
+        clone.execute(sql)
+    try:
+        stats = conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1").fetchall()
+        clone.execute("ANALYZE")
+        clone.executemany("INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES (?, ?, ?)", stats)
+        clone.execute("ANALYZE sqlite_schema")  # Reload statistics into the planner
+    except sqlite3.OperationalError:
+        pass  # No statistics collected yet
+    return clone
+
+def query_plan(conn, sql):
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+def split_plannable(conn, queries):
+    """
+    Split logged queries into those the current schema can plan and {sql: error} for the
+    rest, e.g. queries on tables that have since been dropped or renamed. The log is an
+    editable file, so anything but a read-only query is rejected too.
+    """
+    clone = schema_clone(conn)
+    # EXPLAIN QUERY PLAN would accept DML; the authorizer refuses it while preparing
+    clone.set_authorizer(read_only_authorizer)
+    kept, skipped = {}, {}
+    for sql, seen in queries.items():
+        try:
+            query_plan(clone, sql)
+            kept[sql] = seen
+        except sqlite3.Error as e:
+            skipped[sql] = "not a read-only query" if 'not authorized' in str(e) else str(e)
+    clone.close()
+    return kept, skipped
+
+def _full_scans(plan):
+    return sum(1 for step in plan if step.startswith('SCAN') and 'USING' not in step)
+
+def estimate_benefit(conn, proposal):
+    """Compare EXPLAIN QUERY PLAN on a schema-only clone before and after adding the index."""
+    clone = schema_clone(conn)
+    before = {sql: query_plan(clone, sql) for sql in proposal['queries']}
+    clone.execute(proposal['ddl'])
+    after = {sql: query_plan(clone, sql) for sql in proposal['queries']}
+    clone.close()
+    improved = [sql for sql in proposal['queries']
+                if _full_scans(after[sql]) < _full_scans(before[sql]) or
+                any(proposal['name'] in step for step in after[sql])]
+    return {'improved_queries': improved, 'before': before, 'after': after}
+
+# --- APPLY ---
+def time_query(conn, sql, runs=TIMING_RUNS):
+    """Median milliseconds over `runs` executions after a warm-up, so before and after both see a warm cache."""
+    conn.execute(sql).fetchall()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def apply_indexes(db_path, proposals, queries):
+    """
+    Create the approved indexes, refresh statistics and re-time the affected queries. Logged
+    SQL only ever runs on a separate read-only connection that refuses anything but reads.
+    """
+    reader = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    reader.set_authorizer(read_only_authorizer)
+    conn = sqlite3.connect(db_path)
+    affected = sorted({sql for p in proposals for sql in p['queries']})
+    baseline = {sql: time_query(reader, sql) for sql in affected}
+    for p in proposals:
+        start = time.perf_counter()
+        conn.execute(p['ddl'])
+        print(f"✅ Created {p['name']} in {time.perf_counter() - start:.2f}s")
+    conn.execute("PRAGMA analysis_limit=1000")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    report = []
+    for sql in affected:
+        after = time_query(reader, sql)
+        logged = queries.get(sql, {}).get('duration_ms')
+        report.append({'sql': sql, 'logged_ms': logged, 'before_ms': baseline[sql], 'after_ms': after,
+                       'speedup': baseline[sql] / after if after > 0 else float('inf')})
+    reader.close()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Suggest and apply SQLite indexes from the executed-query log.")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--log', default=QUERY_LOG_PATH)
+    parser.add_argument('--apply', default='', help="Comma-separated index names to create, or 'all'")
+    args = parser.parse_args()
+
+    queries = load_query_log(args.db, args.log)
+    if not queries:
+        print(f"🔴 No logged queries for {args.db} in {args.log}. Use the chatbot first.")
+        return
+    conn = sqlite3.connect(args.db)
+    queries, skipped = split_plannable(conn, queries)
+    if skipped:
+        print(f"⚠️ Skipped {len(skipped)} logged queries that are not read-only or that the current schema cannot run:")
+        for sql, error in skipped.items():
+            print(f"    {error}: {sql[:100]}")
+    if not queries:
+        conn.close()
+        print("🔴 No logged queries left to analyse.")
+        return
+    table_cols = get_table_columns(conn)
+    proposals = propose_indexes(queries, table_cols, get_foreign_key_columns(conn), existing_index_prefixes(conn))
+    print(f"🔍 Analysed {len(queries)} distinct queries; {len(proposals)} candidate index(es)")
+    useful = []
+    for p in proposals:
+        benefit = estimate_benefit(conn, p)
+        p['improved_queries'] = benefit['improved_queries']
+        marker = '⭐' if p['improved_queries'] else '·'
+        print(f"{marker} {p['name']}: {len(p['improved_queries'])}/{len(p['queries'])} queries get a better plan ({p['hits']} executions)")
+        print(f"    {p['ddl']}")
+        if p['improved_queries']:
+            useful.append(p)
+    conn.close()
+
+    if not args.apply:
+        print("\nRe-run with --apply all (or --apply idx_a,idx_b) to create indexes.")
+        return
+    wanted = {n.strip() for n in args.apply.split(',') if n.strip()}
+    approved = [p for p in useful if 'all' in wanted or p['name'] in wanted]
+    if not approved:
+        print("No approved indexes improve any plan; nothing applied.")
+        return
+    report = apply_indexes(args.db, approved, queries)
+    print("\n📊 Observed queries after indexing:")
+    for r in sorted(report, key=lambda r: -r['speedup']):
+        status = 'faster' if r['speedup'] > 1.1 else 'slower' if r['speedup'] < 0.9 else 'unchanged'
+        print(f"  {r['before_ms']:.1f}ms -> {r['after_ms']:.1f}ms ({r['speedup']:.1f}x, {status}): {r['sql'][:100]}")
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,16 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+from enhanced_metrics import QueryTrace
 
-def generate_sql_llm(question, allowed_tables, allowed_columns, data_dict, rag_context=None):
-    """
-    Generate a SQL query from a user question using SQLCoder.
-    """
-    try:
-        from llama_cpp import Llama
-        
-        # Find SQLCoder model
-        sqlcoder_path = None
-        for f in os.listdir('models'):
-            if f.lower().find('sqlcoder') != -1 and f.endswith('.gguf'):
-                sqlcoder_path = os.path.join('models', f)
-                break
-        
-        if not sqlcoder_path:
-            # Fallback to any .gguf model
-            for f in os.listdir('models'):
-                if f.endswith('.gguf'):
-                    sqlcoder_path = os.path.join('models', f)
-                    break
-        
-        if not sqlcoder_path:
-            raise Exception('No .gguf model found in models folder.')
-        
-        print(f"Using model: {os.path.basename(sqlcoder_path)}")
-        
-        llm = Llama(model_path=sqlcoder_path, n_ctx=4096, n_gpu_layers=-1, n_threads=4, verbose=False)
-        
-        # Create clear schema context with foreign keys
-        schema_lines = []
-        for table in allowed_tables:
-            columns = allowed_columns.get(table, [])
-            schema_lines.append(f"Table `{table}` has columns: `{', '.join(columns)}`.")
-            
-            # Add foreign key info from data dictionary if available
-            if data_dict is not None and not data_dict.empty:
-                fk_info = data_dict[(data_dict['Table'] == table) & (data_dict['Foreign Key Table'].notna())]
-                if not fk_info.empty:
-                    fks = []
-                    for _, row in fk_info.iterrows():
-                        fks.append(f"`{row['Column']}` -> `{row['Foreign Key Table']}`.`{row['Foreign Key Column']}`")
-                    schema_lines.append(f"  - Foreign Keys: {'; '.join(fks)}")
-                
-                # Add table description if available
-                table_desc = data_dict[data_dict['Table'] == table]['Table Description'].iloc[0] if not data_dict[data_dict['Table'] == table].empty else ""
-                if table_desc:
-                    schema_lines.append(f"  - Description: {table_desc}")
-            
-            schema_lines.append("")
-
-        schema_context = '\n'.join(schema_lines)
-        
-        # Enhanced prompt with more explicit instructions
-        prompt = f"""You are an expert SQL query generator for SQLite. Your task is to write a valid SQLite query based on the user's question and the provided database schema.
+# KV cache sizes the model can be loaded with; the smallest that fits the prompt is used
+N_CTX_BUCKETS = (1024, 2048, 4096)
+MAX_TOKENS = 512        # Reserved for the generated SQL
+TOKEN_MARGIN = 16       # Fragment counts only steer trimming; joined text may tokenize slightly differently
+TOKEN_CACHE_SIZE = 20000
+
+PROMPT_INSTRUCTIONS = """You are an expert SQL query generator for SQLite. Your task is to write a valid SQLite query based on the user's question and the provided database schema.
 
 ### INSTRUCTIONS
 1.  **Use ONLY the provided schema**: Do not guess or assume any table or column names that are not listed.
@@ -64,19 +21,262 @@ def generate_sql_llm(question, allowed_tables, allowed_columns, data_dict, rag_c
 6.  **Understand the domain**: Analyze the table and column names to understand what type of data this database contains.
 
 ### DATABASE SCHEMA
-{schema_context}
+"""
+
+_fragment_lock = threading.Lock()
+_fragment_cache = {'data_dict': None, 'fragments': {}}
+
+def table_fragment(table, columns, data_dict):
+    """Schema lines for one table, cached until a different data dictionary is passed in."""
+    key = (table, tuple(columns))
+    with _fragment_lock:
+        if _fragment_cache['data_dict'] is not data_dict:
+            _fragment_cache['data_dict'] = data_dict
+            _fragment_cache['fragments'] = {}
+        fragment = _fragment_cache['fragments'].get(key)
+    if fragment is None:
+        fragment = _build_table_fragment(table, columns, data_dict)
+        with _fragment_lock:
+            if _fragment_cache['data_dict'] is data_dict:
+                _fragment_cache['fragments'][key] = fragment
+    return fragment
+
+def _build_table_fragment(table, columns, data_dict):
+    """Schema lines for one table: columns, foreign keys and description."""
+    lines = [f"Table `{table}` has columns: `{', '.join(columns)}`."]
+
+    # Add foreign key info from data dictionary if available
+    if data_dict is not None and not data_dict.empty:
+        table_rows = data_dict[data_dict['Table'] == table]
+        fk_info = table_rows[table_rows['Foreign Key Table'].notna() & (table_rows['Foreign Key Table'] != '')]
+        if not fk_info.empty:
+            fks = []
+            for _, row in fk_info.iterrows():
+                fks.append(f"`{row['Column']}` -> `{row['Foreign Key Table']}`.`{row['Foreign Key Column']}`")
+            lines.append(f"  - Foreign Keys: {'; '.join(fks)}")
+
+        # Add table description if available
+        table_desc = table_rows['Table Description'].iloc[0] if not table_rows.empty else ""
+        if isinstance(table_desc, str) and table_desc:
+            lines.append(f"  - Description: {table_desc}")
+    return '\n'.join(lines)
+
+def _render_prompt(question, fragments, rag_lines):
+    schema_context = '\n\n'.join(fragments) + '\n' if fragments else ''
+    rag_context = '\n'.join(rag_lines) if rag_lines else "No additional context."
+    return f"""{PROMPT_INSTRUCTIONS}{schema_context}
 
 ### RAG CONTEXT (Additional relevant context)
-{rag_context if rag_context else "No additional context."}
+{rag_context}
 
 ### USER QUESTION
 {question}
 
 ### SQL QUERY
 """
-        
-        output = llm(prompt, max_tokens=512, stop=[";", "\n\n"], echo=False)
-        sql = output['choices'][0]['text'].strip()
+
+def assemble_prompt(question, tables, columns, data_dict, rag_context=None, linked_tables=None,
+                    budget=None, count_tokens=None):
+    """
+    Build the SQLCoder prompt within `budget` tokens. Parts are admitted in priority order:
+    instructions and question, FK-linked tables, RAG context lines, then the remaining tables;
+    anything that does not fit is left out. The layout of the prompt itself does not change.
+    Returns (prompt, usage) where usage holds the token count of each part.
+    """
+    count_tokens = count_tokens or (lambda text: len(text) // 4)
+    linked = set(tables if linked_tables is None else linked_tables)
+    fragments = {table: table_fragment(table, columns.get(table, []), data_dict) for table in tables}
+    rag_lines = [line for line in (rag_context or '').split('\n') if line.strip()]
+
+    used = count_tokens(_render_prompt(question, [], [])) + 1  # +1 for BOS
+    usage = {'instruction_tokens': used, 'schema_tokens': 0, 'rag_tokens': 0}
+    kept_tables, kept_rag = set(), set()
+
+    def admit(cost, kind):
+        nonlocal used
+        if budget is not None and used + cost > budget:
+            return False
+        used += cost
+        usage[kind] += cost
+        return True
+
+    for table in tables:
+        if table in linked and admit(count_tokens(fragments[table] + '\n\n'), 'schema_tokens'):
+            kept_tables.add(table)
+    for i, line in enumerate(rag_lines):
+        if admit(count_tokens(line + '\n'), 'rag_tokens'):
+            kept_rag.add(i)
+    for table in tables:
+        if table not in linked and admit(count_tokens(fragments[table] + '\n\n'), 'schema_tokens'):
+            kept_tables.add(table)
+
+    prompt = _render_prompt(question, [fragments[t] for t in tables if t in kept_tables],
+                            [line for i, line in enumerate(rag_lines) if i in kept_rag])
+    usage.update(total_tokens=used, tables_dropped=len(tables) - len(kept_tables),
+                 rag_lines_dropped=len(rag_lines) - len(kept_rag))
+    if budget is not None:
+        usage['token_budget'] = budget
+    return prompt, usage
+
+def build_sql_prompt(question, allowed_tables, allowed_columns, data_dict, rag_context=None):
+    """Build the SQLCoder prompt from the allowed schema and RAG context, without a token budget."""
+    return assemble_prompt(question, allowed_tables, allowed_columns, data_dict, rag_context)[0]
+
+def choose_n_ctx(tokens_needed):
+    """Smallest context bucket that holds the prompt plus the generation reserve."""
+    for n_ctx in N_CTX_BUCKETS:
+        if tokens_needed <= n_ctx:
+            return n_ctx
+    return N_CTX_BUCKETS[-1]
+
+def find_model_path(models_dir='models'):
+    """Locate the SQLCoder .gguf model, falling back to any .gguf file."""
+    # Find SQLCoder model
+    for f in os.listdir(models_dir):
+        if f.lower().find('sqlcoder') != -1 and f.endswith('.gguf'):
+            return os.path.join(models_dir, f)
+
+    # Fallback to any .gguf model
+    for f in os.listdir(models_dir):
+        if f.endswith('.gguf'):
+            return os.path.join(models_dir, f)
+
+    raise Exception('No .gguf model found in models folder.')
+
+# One model per process shared by every session. llama.cpp contexts are not
+# thread-safe, so callers hold _llm_lock for loading, tokenizing and generation.
+_llm_lock = threading.RLock()
+_llm = None
+_llm_path = None
+_llm_n_ctx = 0
+_token_counts = {}  # Fragment text -> token count for the loaded model
+
+# Interactive generations waiting for or holding the model. Background work (sample-query
+# warmup) waits for this to reach zero before queueing, so users wait at most for the one
+# background generation already running.
+_interactive = 0
+_interactive_cond = threading.Condition()
+_priority = threading.local()
+
+@contextmanager
+def background_priority():
+    """Mark the calling thread's generations as background work that yields to users."""
+    _priority.background = True
+    try:
+        yield
+    finally:
+        _priority.background = False
+
+def _enter(background):
+    global _interactive
+    with _interactive_cond:
+        if background:
+            _interactive_cond.wait_for(lambda: _interactive == 0)
+        else:
+            _interactive += 1
+
+def _leave(background):
+    global _interactive
+    if background:
+        return
+    with _interactive_cond:
+        _interactive -= 1
+        _interactive_cond.notify_all()
+
+def _get_llm(n_ctx=N_CTX_BUCKETS[0]):
+    """
+    Return the shared Llama instance with a context of at least n_ctx tokens (caller holds
+    _llm_lock). The context only grows: the first prompt that needs a bigger bucket reloads the
+    model once, so small prompts never pay for a 4096-token KV cache they do not use.
+    """
+    global _llm, _llm_path, _llm_n_ctx
+    if _llm is None or _llm_n_ctx < n_ctx:
+        from llama_cpp import Llama
+        path = find_model_path()
+        if _llm is None:
+            print(f"Using model: {os.path.basename(path)} (n_ctx={n_ctx})")
+        else:
+            print(f"Growing model context from {_llm_n_ctx} to {n_ctx} tokens")
+        _llm = None  # Free the old KV cache before allocating the new one
+        _llm = Llama(model_path=path, n_ctx=n_ctx, n_gpu_layers=-1, n_threads=4, verbose=False)
+        if path != _llm_path:
+            _token_counts.clear()
+        _llm_path = path
+        _llm_n_ctx = n_ctx
+    return _llm
+
+def reload_llm():
+    """Drop the shared model so the next request loads it again (e.g. after swapping the .gguf)."""
+    global _llm, _llm_path, _llm_n_ctx
+    with _llm_lock:
+        _llm = None
+        _llm_path = None
+        _llm_n_ctx = 0
+        _token_counts.clear()
+
+def count_tokens(llm, text):
+    """Token count of a prompt fragment with the model's tokenizer, cached per fragment (caller holds _llm_lock)."""
+    count = _token_counts.get(text)
+    if count is None:
+        if len(_token_counts) >= TOKEN_CACHE_SIZE:
+            _token_counts.clear()
+        count = _token_counts[text] = len(llm.tokenize(text.encode('utf-8'), add_bos=False))
+    return count
+
+def generate_sql_llm(question, allowed_tables, allowed_columns, data_dict, rag_context=None, trace=None,
+                     linked_tables=None):
+    """
+    Generate a SQL query from a user question using SQLCoder.
+    linked_tables (default: all) are the FK-linked tables that get prompt space before RAG context.
+    Timing spans and token usage are added to `trace` when one is given.
+    """
+    trace = trace if trace is not None else QueryTrace(question)
+    variant = 'rag' if rag_context else 'full'
+    background = getattr(_priority, 'background', False)
+    # model_load covers waiting for other generations (and, in the background, for users) and a cold load
+    wait_start = time.perf_counter()
+    _enter(background)
+    try:
+        with _llm_lock:
+            waited = time.perf_counter() - wait_start
+            llm = _get_llm(_llm_n_ctx or N_CTX_BUCKETS[0])
+            trace.add('model_load', time.perf_counter() - wait_start, variant=variant,
+                      wait_ms=round(waited * 1000, 3), model=os.path.basename(_llm_path))
+
+            with trace.span('prompt_build', variant=variant, tables=len(allowed_tables)) as span:
+                budget = N_CTX_BUCKETS[-1] - MAX_TOKENS - TOKEN_MARGIN
+                prompt, usage = assemble_prompt(question, allowed_tables, allowed_columns, data_dict, rag_context,
+                                                linked_tables, budget, lambda text: count_tokens(llm, text))
+                estimated_tokens = usage.pop('total_tokens')
+                # The context is sized on the rendered prompt as the model will see it, BOS included
+                prompt_tokens = len(llm.tokenize(prompt.encode('utf-8')))
+                n_ctx = choose_n_ctx(prompt_tokens + MAX_TOKENS)
+                span.update(usage, prompt_chars=len(prompt), estimated_tokens=estimated_tokens, n_ctx=n_ctx)
+                if usage['tables_dropped'] or usage['rag_lines_dropped']:
+                    print(f"Warning: Prompt over {budget} tokens; left out {usage['tables_dropped']} table(s) "
+                          f"and {usage['rag_lines_dropped']} RAG line(s)")
+
+            if n_ctx > _llm_n_ctx:
+                load_start = time.perf_counter()
+                llm = _get_llm(n_ctx)
+                trace.add('model_load', time.perf_counter() - load_start, variant=variant,
+                          model=os.path.basename(_llm_path), n_ctx=n_ctx)
+
+            # Stream the completion so prompt evaluation (time to first token)
+            # can be told apart from token generation
+            start = time.perf_counter()
+            first_token_at = None
+            pieces = []
+            for chunk in llm(prompt, max_tokens=MAX_TOKENS, stop=[";", "\n\n"], echo=False, stream=True):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                pieces.append(chunk['choices'][0]['text'])
+            end = time.perf_counter()
+        first_token_at = first_token_at or end
+        trace.add('prompt_eval', first_token_at - start, variant=variant, prompt_tokens=prompt_tokens, n_ctx=n_ctx)
+        trace.add('generation', end - first_token_at, variant=variant, completion_tokens=len(pieces))
+
+        sql = ''.join(pieces).strip()
         if not sql.endswith(';'):
             sql += ';'
         return sql
@@ -87,4 +287,6 @@ def generate_sql_llm(question, allowed_tables, allowed_columns, data_dict, rag_c
             cols = allowed_columns.get(table, [])
             col_str = ', '.join(cols[:5]) if cols else '*'
             return f"SELECT {col_str} FROM {table} LIMIT 10;"
-        return None 
+        return None
+    finally:
+        _leave(background)
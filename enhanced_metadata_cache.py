@@ -0,0 +1,82 @@
+import glob
+import hashlib
+import os
+import pickle
+import threading
+import pandas as pd
+
+METADATA_CACHE_DIR = os.path.join('cache', 'metadata')
+
+_lock = threading.Lock()
+_hashes = {}   # (path, mtime_ns, size) -> sha1, avoids re-hashing unchanged files
+_frames = {}   # (path, sha1, index_col) -> {sheet: DataFrame}
+
+def file_hash(path):
+    """SHA-1 of a file's contents, memoised on (mtime, size)."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        if key in _hashes:
+            return _hashes[key]
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    with _lock:
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
+
+def _cache_path(path, source_hash, index_col, cache_dir):
+    name = os.path.basename(path)
+    suffix = '' if index_col is None else f'-idx{index_col}'
+    return os.path.join(cache_dir, f"{name}{suffix}-{source_hash[:16]}.pkl")
+
+def _load_all_sheets(path, index_col, cache_dir):
+    source_hash = file_hash(path)
+    memo_key = (os.path.abspath(path), source_hash, index_col)
+    with _lock:
+        if memo_key in _frames:
+            return _frames[memo_key]
+    cache_path = _cache_path(path, source_hash, index_col, cache_dir)
+    sheets = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                sheets = pickle.load(f)
+            if not isinstance(sheets, dict):
+                raise TypeError(f"expected a dict of sheets, got {type(sheets).__name__}")
+        except Exception as e:
+            # Truncated, foreign or written by another pandas version: rebuild it from the workbook
+            print(f"Warning: Ignoring unreadable metadata cache {cache_path}: {e}")
+            sheets = None
+    if sheets is None:
+        # Parse every sheet in one pass; openpyxl is the slow part we are caching
+        sheets = pd.read_excel(path, sheet_name=None, index_col=index_col)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            stale = glob.glob(cache_path.rsplit('-', 1)[0] + '-' + '?' * 16 + '.pkl')
+            with open(cache_path, 'wb') as f:
+                pickle.dump(sheets, f, protocol=pickle.HIGHEST_PROTOCOL)
+            for old in stale:
+                if old != cache_path:
+                    os.remove(old)
+        except OSError as e:
+            print(f"Warning: Could not write metadata cache for {path}: {e}")
+    with _lock:
+        for key in [k for k in _frames if k[0] == memo_key[0] and k[2] == index_col]:
+            del _frames[key]  # Superseded version of the same workbook
+        _frames[memo_key] = sheets
+    return sheets
+
+def read_workbook(path, sheet_name=0, index_col=None, cache_dir=METADATA_CACHE_DIR):
+    """
+    Drop-in for pd.read_excel backed by a pickle cache keyed by the workbook's hash.
+    sheet_name may be a sheet index, a sheet name, or None for {sheet: DataFrame}.
+    Callers get copies, so mutating a result never touches the cache.
+    """
+    sheets = _load_all_sheets(path, index_col, cache_dir)
+    if sheet_name is None:
+        return {name: df.copy() for name, df in sheets.items()}
+    if isinstance(sheet_name, int):
+        sheet_name = list(sheets)[sheet_name]
+    return sheets[sheet_name].copy()
@@ -0,0 +1,182 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_LOG_PATH = os.path.join('logs', 'query_metrics.jsonl')
+METRICS_PORT = 9108
+WINDOW_SIZE = 1000  # Recent spans kept per stage for percentiles
+
+# Order used when displaying stages
+STAGES = [
+    'retrieval',
+    'schema_pruning',
+    'value_grounding',
+    'prompt_build',
+    'model_load',
+    'prompt_eval',
+    'generation',
+    'shadow_check',
+    'validation',
+    'execution',
+    'response',
+]
+
+_lock = threading.Lock()
+_durations = defaultdict(lambda: deque(maxlen=WINDOW_SIZE))
+_totals = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'tokens': 0, 'rows': 0})
+_query_count = 0
+_server = None
+
+
+class QueryTrace:
+    """Collects timing spans for a single answer_query call."""
+
+    def __init__(self, question=''):
+        self.question = question
+        self.started_at = time.time()
+        self.spans = []
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        """Time a block of code; attributes can be added to the yielded dict."""
+        record = {'stage': stage, **attrs}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            self.spans.append(record)
+
+    def add(self, stage, duration_s, **attrs):
+        """Record a span that was measured outside a with-block."""
+        self.spans.append({'stage': stage, **attrs, 'duration_ms': round(duration_s * 1000, 3)})
+
+    def finish(self, **attrs):
+        """Push the spans into the process-wide registry and the JSONL log."""
+        entry = {
+            'timestamp': self.started_at,
+            'question': self.question,
+            'total_ms': round((time.time() - self.started_at) * 1000, 3),
+            'spans': self.spans,
+            **attrs,
+        }
+        record_trace(entry)
+        return entry
+
+
+def _span_tokens(span):
+    return int(span.get('prompt_tokens', 0) or 0) + int(span.get('completion_tokens', 0) or 0)
+
+
+def record_trace(entry):
+    global _query_count
+    with _lock:
+        # Background warmup goes to the log only, so the sidebar and /metrics reflect users
+        user_query = entry.get('source') != 'warmup'
+        if user_query:
+            _query_count += 1
+        for span in (entry['spans'] if user_query else []):
+            stage = span['stage']
+            seconds = span['duration_ms'] / 1000
+            _durations[stage].append(seconds)
+            totals = _totals[stage]
+            totals['count'] += 1
+            totals['seconds'] += seconds
+            totals['tokens'] += _span_tokens(span)
+            totals['rows'] += int(span.get('rows', 0) or 0)
+        try:
+            os.makedirs(os.path.dirname(METRICS_LOG_PATH), exist_ok=True)
+            with open(METRICS_LOG_PATH, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, default=str) + '\n')
+        except Exception as e:
+            print(f"Warning: Could not write metrics log: {e}")
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+def stage_percentiles():
+    """Return {stage: {'p50': ms, 'p95': ms, 'count': n}} over the recent window."""
+    with _lock:
+        snapshot = {stage: sorted(values) for stage, values in _durations.items()}
+    stats = {}
+    ordered = [s for s in STAGES if s in snapshot] + sorted(s for s in snapshot if s not in STAGES)
+    for stage in ordered:
+        values = snapshot[stage]
+        stats[stage] = {
+            'p50': round(_percentile(values, 0.50) * 1000, 1),
+            'p95': round(_percentile(values, 0.95) * 1000, 1),
+            'count': len(values),
+        }
+    return stats
+
+
+def prometheus_text():
+    """Render the registry in the Prometheus text exposition format."""
+    with _lock:
+        snapshot = {stage: sorted(values) for stage, values in _durations.items()}
+        totals = {stage: dict(t) for stage, t in _totals.items()}
+        query_count = _query_count
+    lines = [
+        '# HELP datamuse_queries_total Number of answer_query calls.',
+        '# TYPE datamuse_queries_total counter',
+        f'datamuse_queries_total {query_count}',
+        '# HELP datamuse_stage_duration_seconds Duration of answer_query stages.',
+        '# TYPE datamuse_stage_duration_seconds summary',
+    ]
+    for stage, values in snapshot.items():
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f'datamuse_stage_duration_seconds{{stage="{stage}",quantile="{q}"}} {_percentile(values, q):.6f}')
+        lines.append(f'datamuse_stage_duration_seconds_sum{{stage="{stage}"}} {totals[stage]["seconds"]:.6f}')
+        lines.append(f'datamuse_stage_duration_seconds_count{{stage="{stage}"}} {totals[stage]["count"]}')
+    lines.append('# HELP datamuse_stage_tokens_total Tokens processed per stage.')
+    lines.append('# TYPE datamuse_stage_tokens_total counter')
+    for stage, t in totals.items():
+        lines.append(f'datamuse_stage_tokens_total{{stage="{stage}"}} {t["tokens"]}')
+    lines.append('# HELP datamuse_stage_rows_total Result rows handled per stage.')
+    lines.append('# TYPE datamuse_stage_rows_total counter')
+    for stage, t in totals.items():
+        lines.append(f'datamuse_stage_rows_total{{stage="{stage}"}} {t["rows"]}')
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('', '/metrics'):
+            self.send_error(404)
+            return
+        body = prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the Streamlit console
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve /metrics on a daemon thread. Safe to call more than once."""
+    global _server
+    with _lock:
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer(('0.0.0.0', port), _MetricsHandler)
+        except OSError as e:
+            print(f"Warning: Could not start metrics endpoint on port {port}: {e}")
+            return None
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        print(f"Metrics endpoint: http://localhost:{port}/metrics")
+        return _server
@@ -0,0 +1,129 @@
+import os
+import threading
+import pandas as pd
+
+ALL_COLUMNS = 'ALL'
+
+def _parse_grant(value):
+    """Turn one role_access.xlsx cell into ALL_COLUMNS, a tuple of columns, or None (no access)."""
+    if not isinstance(value, str) or not value.strip():
+        return None  # Empty cells come back from Excel as NaN
+    if value.strip().upper() == ALL_COLUMNS:
+        return ALL_COLUMNS
+    columns = tuple(c.strip() for c in value.split(',') if c.strip())
+    return columns or None
+
+def compile_role_matrix(role_access):
+    """Compile the role x table matrix into {role: {table: ALL_COLUMNS | tuple}}."""
+    grants = {}
+    for role, row in role_access.iterrows():
+        role_grants = {}
+        for table, value in row.items():
+            grant = _parse_grant(value)
+            if grant is not None:
+                role_grants[str(table)] = grant
+        grants[str(role).strip()] = role_grants
+    return grants
+
+class RolePolicyStore:
+    """
+    In-memory role access policy compiled from role_access.xlsx.
+
+    The grants are recompiled only when the workbook's mtime/size change, so Excel is
+    parsed once per edit rather than once per login or question. The workbook is read
+    directly, never through a pickled cache, and compiled grants are never written to
+    disk. Lookups are plain dictionary reads.
+    """
+
+    def __init__(self, excel_path, table_cols=None):
+        self.excel_path = excel_path
+        self._lock = threading.RLock()
+        self._source_sig = None
+        self._grants = {}
+        self._roles_by_key = {}
+        self._resolved = {}
+        self.table_cols = table_cols or {}
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.excel_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self, sig):
+        if sig is None:
+            return {}
+        return compile_role_matrix(pd.read_excel(self.excel_path, index_col=0))
+
+    def _ensure_fresh(self):
+        sig = self._signature()
+        if sig == self._source_sig:
+            return
+        with self._lock:
+            if sig == self._source_sig:
+                return
+            try:
+                grants = self._load(sig)
+            except Exception as e:
+                print(f"Error loading role access file: {e}")
+                grants = {}
+            self._grants = grants
+            self._roles_by_key = {role.lower(): role for role in grants}
+            self._resolved = {}
+            self._source_sig = sig
+
+    def set_table_columns(self, table_cols):
+        """Provide the database's table -> columns map used to expand ALL grants."""
+        with self._lock:
+            self.table_cols = table_cols
+            self._resolved = {}
+
+    def roles(self):
+        self._ensure_fresh()
+        return list(self._grants)
+
+    def canonical_role(self, name):
+        """Case-insensitive role lookup; returns the role as spelled in the matrix, or None."""
+        if not name:
+            return None
+        self._ensure_fresh()
+        return self._roles_by_key.get(name.strip().lower())
+
+    def _resolve(self, role):
+        self._ensure_fresh()
+        resolved = self._resolved.get(role)
+        if resolved is not None:
+            return resolved
+        with self._lock:
+            columns = {}
+            for table, grant in self._grants.get(role, {}).items():
+                columns[table] = tuple(self.table_cols.get(table, ())) if grant == ALL_COLUMNS else grant
+            resolved = (columns, {table: frozenset(cols) for table, cols in columns.items()})
+            self._resolved[role] = resolved
+        return resolved
+
+    def allowed_tables(self, role):
+        return list(self._resolve(role)[0])
+
+    def allowed_columns(self, role):
+        """Return {table: [columns]} for every table the role can read."""
+        return {table: list(cols) for table, cols in self._resolve(role)[0].items()}
+
+    def column_set(self, role, table):
+        """frozenset of readable columns for role/table (empty when not granted)."""
+        return self._resolve(role)[1].get(table, frozenset())
+
+    def can_read(self, role, table, column):
+        return column in self.column_set(role, table)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_policy_store(excel_path='data/role_access.xlsx'):
+    """Process-wide store per workbook path."""
+    with _stores_lock:
+        store = _stores.get(excel_path)
+        if store is None:
+            store = _stores[excel_path] = RolePolicyStore(excel_path)
+        return store
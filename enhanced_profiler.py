@@ -0,0 +1,147 @@
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from enhanced_arrow import is_numeric_type, to_pandas
+
+PROFILE_SAMPLE_ROWS = 100_000  # Category/date figures come from a sample beyond this size
+TOP_CATEGORIES = 3
+MAX_SUMMARY_COLUMNS = 6        # Keep the answer readable for wide results
+
+def _is_identifier(col):
+    name = re.sub(r'_\d+$', '', str(col).lower())  # cust_id_2 from a de-duplicated JOIN result
+    return name == 'id' or name.endswith('_id') or name.endswith('_no') or name in ('phone', 'ifsc_code')
+
+def _is_text(series):
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+def _looks_like_date(col, series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    name = str(col).lower()
+    return _is_text(series) and ('date' in name or name in ('dob', 'timestamp'))
+
+def build_column_descriptions(data_dict):
+    """Column -> description map (first definition wins), built once per dictionary."""
+    if data_dict is None or data_dict.empty:
+        return {}
+    first = data_dict.drop_duplicates('Column')
+    return dict(zip(first['Column'], first['Column Description']))
+
+def build_column_types(data_dict):
+    """Column -> declared type from the data dictionary's Type column (first definition wins)."""
+    if data_dict is None or data_dict.empty or 'Type' not in data_dict:
+        return {}
+    first = data_dict.drop_duplicates('Column')
+    return {col: t for col, t in zip(first['Column'], first['Type']) if isinstance(t, str) and t}
+
+def profile_result(df, sample_rows=PROFILE_SAMPLE_ROWS):
+    """
+    One-pass summary of a result frame: totals/min/max/mean for numeric columns
+    (exact, vectorised), top categories and date ranges (from a sample on large frames).
+    Arrow tables are summarised with pyarrow.compute; only the sample of their
+    non-numeric columns is converted to pandas.
+    """
+    if isinstance(df, pa.Table):
+        return _profile_arrow(df, sample_rows)
+    profile = {'rows': len(df), 'columns': len(df.columns), 'sampled': False,
+               'numeric': {}, 'categorical': {}, 'dates': {}}
+    if df.empty:
+        return profile
+    sample = df
+    if len(df) > sample_rows:
+        sample = df.sample(n=sample_rows, random_state=0)
+        profile['sampled'] = True
+
+    # Columns are taken by position: a SELECT * over a JOIN repeats labels
+    others = []
+    for i, col in enumerate(df.columns):
+        if _is_identifier(col) or col in profile['numeric']:
+            continue
+        if pd.api.types.is_numeric_dtype(df.dtypes.iloc[i]) and not pd.api.types.is_bool_dtype(df.dtypes.iloc[i]):
+            series = df.iloc[:, i]
+            profile['numeric'][col] = {'sum': series.sum(), 'min': series.min(),
+                                       'max': series.max(), 'mean': series.mean()}
+        else:
+            others.append((col, sample.iloc[:, i]))
+    _profile_other_columns(profile, others)
+    return profile
+
+def _profile_arrow(table, sample_rows):
+    profile = {'rows': table.num_rows, 'columns': table.num_columns, 'sampled': False,
+               'numeric': {}, 'categorical': {}, 'dates': {}}
+    if table.num_rows == 0:
+        return profile
+    others = []
+    for i, field in enumerate(table.schema):
+        if _is_identifier(field.name) or field.name in profile['numeric']:
+            continue
+        if is_numeric_type(field.type):
+            values = table.column(i)
+            profile['numeric'][field.name] = {'sum': pc.sum(values).as_py(), 'min': pc.min(values).as_py(),
+                                              'max': pc.max(values).as_py(), 'mean': pc.mean(values).as_py()}
+        else:
+            others.append(i)
+    if not others:
+        return profile
+    sample = table.select(others)
+    if table.num_rows > sample_rows:
+        rng = np.random.default_rng(0)
+        sample = sample.take(np.sort(rng.choice(table.num_rows, size=sample_rows, replace=False)))
+        profile['sampled'] = True
+    frame = to_pandas(sample)
+    _profile_other_columns(profile, [(table.schema.field(i).name, frame.iloc[:, k]) for k, i in enumerate(others)])
+    return profile
+
+def _profile_other_columns(profile, columns):
+    """Top categories and date ranges for (name, sampled pandas Series) pairs of non-numeric columns."""
+    for col, series in columns:
+        if col in profile['dates'] or col in profile['categorical']:
+            continue
+        if _looks_like_date(col, series):
+            parsed = pd.to_datetime(series, errors='coerce')
+            if parsed.notna().any():
+                profile['dates'][col] = (parsed.min(), parsed.max())
+                continue
+        if _is_text(series) or isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(series):
+            counts = series.value_counts(dropna=True)
+            if counts.empty:
+                continue
+            shares = (counts.iloc[:TOP_CATEGORIES] / counts.sum()).round(3)
+            profile['categorical'][col] = {
+                'distinct': int(len(counts)),
+                'top': list(zip(counts.index[:TOP_CATEGORIES], shares.values)),
+            }
+
+def _fmt_number(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return 'n/a'
+    if float(value).is_integer():
+        return f"{int(value):,}"
+    return f"{value:,.2f}"
+
+def format_profile(profile, df=None):
+    """Render a profile as short sentences for the chat answer."""
+    parts = []
+    if profile['rows'] == 1 and df is not None:
+        # Single-row answers (counts, totals) read best as the values themselves
+        if isinstance(df, pa.Table):
+            row = zip(df.column_names, (column[0].as_py() for column in df.columns))
+        else:
+            row = zip(df.columns, df.iloc[0].values)
+        values = [f"{col} = {_fmt_number(v) if isinstance(v, (int, float, np.number)) else v}" for col, v in row]
+        return "Result: " + ", ".join(values[:MAX_SUMMARY_COLUMNS]) + "."
+    for col, s in list(profile['numeric'].items())[:MAX_SUMMARY_COLUMNS]:
+        parts.append(f"{col} totals {_fmt_number(s['sum'])} (min {_fmt_number(s['min'])}, max {_fmt_number(s['max'])}, avg {_fmt_number(s['mean'])})")
+    for col, c in list(profile['categorical'].items())[:MAX_SUMMARY_COLUMNS]:
+        top = ", ".join(f"{value} ({share:.0%})" for value, share in c['top'])
+        parts.append(f"{col} has {c['distinct']} distinct value(s), mostly {top}")
+    for col, (start, end) in list(profile['dates'].items())[:MAX_SUMMARY_COLUMNS]:
+        parts.append(f"{col} ranges from {start:%Y-%m-%d} to {end:%Y-%m-%d}")
+    if not parts:
+        return ""
+    summary = "Summary: " + "; ".join(parts) + "."
+    if profile['sampled']:
+        summary += " (Category and date figures are estimated from a sample.)"
+    return summary
@@ -1,7 +1,17 @@
-import sqlite3
 import pandas as pd
 from enhanced_llm_interface import generate_sql_llm
 from enhanced_embedding import SchemaEmbedder
+from enhanced_executor import execute_query
+from enhanced_index_advisor import record_query
+from enhanced_metrics import QueryTrace
+from enhanced_profiler import build_column_descriptions, build_column_types, format_profile, profile_result
+from enhanced_schema import expand_tables, foreign_key_graph, load_schema_snapshot
+from enhanced_shadow_db import ShadowSchema
+from enhanced_value_index import ValueIndex
+
+SCHEMA_HOPS = 1        # FK hops added around the tables retrieval hit
+CHARS_PER_TOKEN = 4    # Rough SQLCoder tokenizer ratio for schema text
+MAX_REGENERATIONS = 1  # Retries told why the previous candidate failed the shadow check
 
 def filter_sql_to_allowed(sql_query, allowed_tables, allowed_columns):
     # Basic check: only allow queries on allowed tables/columns
@@ -44,6 +54,37 @@ def format_context_rows(context_rows):
             lines.append(str(row))
     return '\n'.join(lines)
 
+def load_fk_graph(data_dict, db_path):
+    """FK graph from the data dictionary, or from PRAGMA foreign_key_list when it has none."""
+    graph = foreign_key_graph(data_dict=data_dict)
+    if not graph:
+        try:
+            graph = foreign_key_graph(snapshot=load_schema_snapshot(db_path))
+        except Exception as e:
+            print(f"Warning: Could not read foreign keys from {db_path}: {e}")
+    return graph
+
+def prune_schema(context_rows, allowed_tables, allowed_columns, fk_graph, hops=SCHEMA_HOPS):
+    """
+    Keep the allowed tables retrieval hit plus their neighbours up to `hops` FK edges away.
+    Returns (tables, columns, linked): the full allowed schema with nothing linked when
+    retrieval hit no allowed table.
+    """
+    seeds = {row['Table'] for row in context_rows if isinstance(row, pd.Series)}
+    tables = expand_tables(seeds, fk_graph, hops, allowed_tables)
+    if not tables:
+        return list(allowed_tables), allowed_columns, []
+    return tables, {table: allowed_columns.get(table, []) for table in tables}, tables
+
+def _schema_chars(tables, columns):
+    """Approximate size of the schema section build_sql_prompt writes for these tables."""
+    return sum(len(t) + 30 + sum(len(c) + 2 for c in columns.get(t, [])) for t in tables)
+
+def with_error_hint(question, failed_sql, error):
+    """Question text for a regeneration that tells the model why its last query failed."""
+    return (f"{question}\n\nThe query `{failed_sql.strip()}` failed with: {error}. "
+            "Write a corrected query that uses only the listed tables and columns.")
+
 def validate_sql(sql_query, allowed_tables, allowed_columns):
     """Validate SQL query before execution - dynamic schema validation"""
     sql_lower = sql_query.lower()
@@ -94,58 +135,169 @@ def validate_sql(sql_query, allowed_tables, allowed_columns):
     return True, "SQL validation passed."
 
 class QueryAgent:
-    def __init__(self, db_path, data_dict, role_access):
+    def __init__(self, db_path, data_dict, role_access, embedder=None, name=None, schema_hops=SCHEMA_HOPS,
+                 value_index=None):
         self.db_path = db_path
+        self.name = name  # Database label used by the router and in traces
+        self.data_dict = data_dict
+        self.role_access = role_access
+        # Pass a shared embedder to avoid re-reading and re-embedding the dictionary
+        self.embedder = embedder if embedder is not None else SchemaEmbedder('data/data_dictionary.xlsx', data_dict=data_dict)
+        self.column_descriptions = build_column_descriptions(data_dict)
+        self.column_types = build_column_types(data_dict)
+        self.schema_hops = schema_hops
+        self.fk_graph = load_fk_graph(data_dict, db_path)
+        # DDL-only in-memory copy of the database used to EXPLAIN candidates before running them
+        self.shadow = ShadowSchema(db_path)
+        # Distinct values of low-cardinality text columns, so literals match the stored spelling
+        self.value_index = value_index if value_index is not None else ValueIndex(db_path)
+
+    def reload(self, data_dict, role_access):
+        """Swap in a new data dictionary and role matrix and re-embed the schema."""
+        self.embedder.reload(data_dict)
+        self.column_descriptions = build_column_descriptions(data_dict)
+        self.column_types = build_column_types(data_dict)
+        self.fk_graph = load_fk_graph(data_dict, self.db_path)
         self.data_dict = data_dict
         self.role_access = role_access
-        self.embedder = SchemaEmbedder('data/data_dictionary.xlsx')
 
-    def answer_query(self, question, allowed_tables, allowed_columns):
+    def answer_query(self, question, allowed_tables, allowed_columns, query_embedding=None, sql_query=None):
+        """
+        Answer a question for a role's allowed schema. A precomputed sql_query (the sample-query
+        cache) skips retrieval and generation as long as it still passes the shadow check.
+        """
+        trace = QueryTrace(question)
+        status = 'error'
+        try:
+            sql_query, response, df = self._answer_query(question, allowed_tables, allowed_columns, trace,
+                                                         query_embedding, sql_query)
+            status = 'ok' if df is not None else 'rejected'
+            return sql_query, response, df
+        finally:
+            trace.finish(status=status, database=self.name)
+
+    def plan_sql(self, question, allowed_tables, allowed_columns, trace=None, query_embedding=None):
+        """
+        Retrieve, generate and validate SQL without running it.
+        Returns (sql_query, error); error is the user-facing message when no usable SQL came out.
+        """
+        trace = trace if trace is not None else QueryTrace(question)
         # RAG: Retrieve top-k relevant schema/context
-        rag_context_rows = self.embedder.search(question, top_k=5)
-        rag_context = format_context_rows(rag_context_rows)
-        # Use LLM to generate SQL with both full schema and RAG context
-        sql_query_rag = generate_sql_llm(question, allowed_tables, allowed_columns, self.data_dict, rag_context=rag_context)
-        sql_query_full = generate_sql_llm(question, allowed_tables, allowed_columns, self.data_dict)
-        # Prefer RAG SQL if it uses relevant tables/columns
-        sql_query = None
-        if sql_query_rag and filter_sql_to_allowed(sql_query_rag, allowed_tables, allowed_columns):
-            sql_query = sql_query_rag
-        elif sql_query_full and filter_sql_to_allowed(sql_query_full, allowed_tables, allowed_columns):
-            sql_query = sql_query_full
-        if not sql_query:
-            return None, "You are not allowed to access the requested data or the query could not be generated.", None
-        
-        # Validate SQL before execution
-        is_valid, validation_msg = validate_sql(sql_query, allowed_tables, allowed_columns)
-        if not is_valid:
-            return sql_query, f"SQL validation failed: {validation_msg}", None
-        
+        with trace.span('retrieval') as span:
+            rag_context_rows = self.embedder.search(question, top_k=5, query_embedding=query_embedding)
+            rag_context = format_context_rows(rag_context_rows)
+            span['rows'] = len(rag_context_rows)
+        # Only the FK-connected neighbourhood of the retrieved tables goes into the prompt;
+        # access checks below still use the role's full allowed set
+        with trace.span('schema_pruning', hops=self.schema_hops) as span:
+            prompt_tables, prompt_columns, linked_tables = prune_schema(
+                rag_context_rows, allowed_tables, allowed_columns, self.fk_graph, self.schema_hops)
+            saved_chars = _schema_chars(allowed_tables, allowed_columns) - _schema_chars(prompt_tables, prompt_columns)
+            span.update(tables_before=len(allowed_tables), tables_after=len(prompt_tables),
+                        columns_before=sum(len(c) for c in allowed_columns.values()),
+                        columns_after=sum(len(c) for c in prompt_columns.values()),
+                        prompt_tokens_saved=saved_chars // CHARS_PER_TOKEN)
+        # Stored spellings of the values the question mentions go in with the RAG context,
+        # limited to columns the role can read
+        with trace.span('value_grounding') as span:
+            retrieved = [(row['Table'], row['Column']) for row in rag_context_rows if isinstance(row, pd.Series)]
+            value_lines = self.value_index.match(question, allowed_columns, retrieved)
+            if value_lines:
+                rag_context = '\n'.join([rag_context] + value_lines) if rag_context else '\n'.join(value_lines)
+            span['lines'] = len(value_lines)
+        # Candidates are EXPLAINed against the schema-only shadow before the real database is touched
+        sql_query, failed_sql, shadow_error = self._generate_sql(
+            question, rag_context, prompt_tables, prompt_columns, linked_tables, allowed_tables, allowed_columns, trace)
+        with trace.span('validation'):
+            if not sql_query:
+                if shadow_error:
+                    return failed_sql, f"SQL validation failed: {shadow_error}"
+                return None, "You are not allowed to access the requested data or the query could not be generated."
+            
+            # Validate SQL before execution
+            is_valid, validation_msg = validate_sql(sql_query, allowed_tables, allowed_columns)
+            if not is_valid:
+                return sql_query, f"SQL validation failed: {validation_msg}"
+        return sql_query, None
+
+    def _answer_query(self, question, allowed_tables, allowed_columns, trace, query_embedding=None, sql_query=None):
+        if sql_query is not None:
+            # Precomputed SQL is rechecked: the schema may have moved since it was cached
+            with trace.span('shadow_check', variant='cached') as span:
+                ok, error = self.shadow.check(sql_query)
+                ok = ok and filter_sql_to_allowed(sql_query, allowed_tables, allowed_columns) \
+                    and validate_sql(sql_query, allowed_tables, allowed_columns)[0]
+                span['ok'] = ok
+            if not ok:
+                sql_query = None
+        if sql_query is None:
+            sql_query, error = self.plan_sql(question, allowed_tables, allowed_columns, trace, query_embedding)
+            if error:
+                return sql_query, error, None
+
         # Run SQL
         try:
-            conn = sqlite3.connect(self.db_path)
-            df = pd.read_sql_query(sql_query, conn)
-            conn.close()
+            with trace.span('execution') as span:
+                # Runs in a separate, memory- and time-limited worker process and comes back
+                # as a typed Arrow table; it stays Arrow through display and export
+                df, stats = execute_query(self.db_path, sql_query, type_hints=self.column_types,
+                                          allowed_columns=allowed_columns)
+                span.update(stats, rows=df.num_rows)
         except Exception as e:
             return sql_query, f"Error executing SQL: {e}", None
+        # Feed the index advisor with what users actually run
+        record_query(self.db_path, sql_query, span['duration_ms'], len(df))
         # Build response
-        response = self.generate_natural_response(question, df, sql_query)
+        with trace.span('response', rows=len(df)):
+            response = self.generate_natural_response(question, df, sql_query)
         return sql_query, response, df
 
+    def _generate_sql(self, question, rag_context, prompt_tables, prompt_columns, linked_tables,
+                      allowed_tables, allowed_columns, trace):
+        """
+        Try candidates until one passes: with RAG context, without it, then up to MAX_REGENERATIONS
+        retries carrying the last shadow error. Later candidates are only generated when needed.
+        Returns (sql_query, last_failed_sql, last_shadow_error).
+        """
+        attempts = [('rag', rag_context), ('full', None)] + [('retry', rag_context)] * MAX_REGENERATIONS
+        failed_sql, shadow_error = None, None
+        for variant, context in attempts:
+            if variant == 'retry' and not shadow_error:
+                break  # Candidates were refused by the access filter; there is no error to feed back
+            prompt_question = with_error_hint(question, failed_sql, shadow_error) if variant == 'retry' else question
+            candidate = generate_sql_llm(prompt_question, prompt_tables, prompt_columns, self.data_dict,
+                                         rag_context=context, trace=trace, linked_tables=linked_tables)
+            if candidate and filter_sql_to_allowed(candidate, allowed_tables, allowed_columns):
+                with trace.span('shadow_check', variant=variant) as span:
+                    ok, error = self.shadow.check(candidate)
+                    span['ok'] = ok
+                    if error:
+                        span['error'] = error
+                if ok:
+                    return candidate, failed_sql, shadow_error
+                failed_sql, shadow_error = candidate, error
+        return None, failed_sql, shadow_error
+
     def generate_natural_response(self, question, df, sql_query):
-        if df is None or df.empty:
+        if df is None or df.num_rows == 0:
             return "I couldn't find any data matching your query."
-        row_count = len(df)
-        col_count = len(df.columns)
+        row_count = df.num_rows
+        col_count = df.num_columns
         response = f"I found {row_count} record(s) with {col_count} field(s) based on your query. "
         # Use data dictionary for column explanations
-        if self.data_dict is not None and not self.data_dict.empty:
+        if self.column_descriptions:
             col_desc = []
-            for col in df.columns:
-                desc = self.data_dict.loc[self.data_dict['Column'] == col, 'Column Description']
-                if not desc.empty:
-                    col_desc.append(f"{col} ({desc.values[0]})")
-                else:
-                    col_desc.append(col)
+            for col in df.column_names:
+                desc = self.column_descriptions.get(col)
+                col_desc.append(f"{col} ({desc})" if desc else col)
             response += "\nColumns: " + ", ".join(col_desc)
-        return response 
\ No newline at end of file
+        # Totals, ranges and top categories computed locally - no second LLM call
+        try:
+            summary = format_profile(profile_result(df), df)
+        except Exception as e:
+            # The rows are already fetched; a summary problem must not lose them
+            print(f"Warning: Could not profile result: {e}")
+            summary = ""
+        if summary:
+            response += "\n" + summary
+        return response
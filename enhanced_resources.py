@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+from enhanced_db_stats import TableCountRefresher
+from enhanced_embedding import SchemaEmbedder
+from enhanced_executor import get_executor
+from enhanced_metadata_cache import read_workbook
+from enhanced_policy import RolePolicyStore, get_policy_store
+from enhanced_query_agent import QueryAgent
+from enhanced_rollups import RollupRefresher
+from enhanced_router import DatabaseRoute, DatabaseRouter, load_database_config
+from enhanced_sample_cache import SampleQueryWarmer
+
+PRIMARY_DATABASE = 'banking'
+
+def load_data_dictionary(data_dict_path):
+    if os.path.exists(data_dict_path):
+        return read_workbook(data_dict_path)
+    return pd.DataFrame()
+
+def get_table_columns(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    tables = cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';").fetchall()
+    table_cols = {}
+    for (table,) in tables:
+        columns = cursor.execute(f'PRAGMA table_info({table})').fetchall()
+        table_cols[table] = [col[1] for col in columns]
+    conn.close()
+    return table_cols
+
+class SharedResources:
+    """
+    Process-wide schema metadata and QueryAgent shared by every Streamlit session.
+    The objects are treated as read-only; reload() builds replacements and swaps them in.
+    """
+
+    def __init__(self, db_path, data_dict_path, role_access_path):
+        self.db_path = db_path
+        self.data_dict_path = data_dict_path
+        self.role_access_path = role_access_path
+        self._lock = threading.RLock()
+        self.data_dict = pd.DataFrame()
+        self.table_cols = {}
+        # Compiled role -> table -> columns policy; follows role_access.xlsx edits by itself
+        self.policy = get_policy_store(role_access_path)
+        self.agent = None
+        # Table sizes for the sidebar: estimates now, exact counts from a background thread
+        self.table_counts = TableCountRefresher(db_path).start()
+        # Summary tables for the dashboard questions, kept current from new txn_ids
+        self.rollups = RollupRefresher(db_path).start()
+        # Query worker processes are started now so the first question does not wait for them
+        self.executor = get_executor()
+        # Every database shares the embedding model and LLM; the router picks one per question
+        self.router = DatabaseRouter()
+        self.sample_sql = None
+        self.reload()
+        self._add_extra_databases()
+        # SQL for the sidebar sample questions, generated per role in the background
+        self.sample_sql = SampleQueryWarmer(self.router).start()
+        self.router.sample_sql = self.sample_sql
+
+    def reload(self):
+        """Re-read the data dictionary and table map; the embedding model stays loaded."""
+        data_dict = load_data_dictionary(self.data_dict_path)
+        table_cols = get_table_columns(self.db_path)
+        first_load = self.agent is None
+        with self._lock:
+            self.policy.set_table_columns(table_cols)
+            if self.agent is None:
+                embedder = SchemaEmbedder(self.data_dict_path, data_dict=data_dict)
+                self.agent = QueryAgent(self.db_path, data_dict, self.policy, embedder=embedder,
+                                        name=PRIMARY_DATABASE)
+            else:
+                self.agent.reload(data_dict, self.policy)
+            self.data_dict = data_dict
+            self.table_cols = table_cols
+        if PRIMARY_DATABASE in self.router.routes:
+            self.router.refresh(PRIMARY_DATABASE, data_dict)
+        else:
+            self.router.add(DatabaseRoute(PRIMARY_DATABASE, self.agent, self.policy, data_dict))
+        # Distinct-value index for literal grounding. Passes normally read only new rows, but
+        # a reloaded database may have rewritten values under the same DDL, so rescan in full
+        self.agent.value_index.start().refresh_now(full=not first_load)
+        if not first_load:
+            for name, route in self.router.routes.items():
+                if name != PRIMARY_DATABASE:
+                    route.agent.value_index.refresh_now(full=True)
+        self.table_counts.refresh_now()
+        self.rollups.refresh_now()
+        if self.sample_sql is not None:
+            self.sample_sql.refresh_now()
+
+    def _add_extra_databases(self):
+        """Register the marts listed in data/databases.json next to the primary database."""
+        for entry in load_database_config():
+            name = entry['name']
+            if name in self.router.routes:
+                print(f"Warning: Duplicate database name '{name}', skipping")
+                continue
+            try:
+                data_dict = load_data_dictionary(entry.get('data_dict_path', ''))
+                # Own store per mart: the path-keyed shared store would swap the primary's table map
+                policy = RolePolicyStore(entry['role_access_path'])
+                policy.set_table_columns(get_table_columns(entry['db_path']))
+                embedder = SchemaEmbedder(entry.get('data_dict_path', ''), data_dict=data_dict)
+                agent = QueryAgent(entry['db_path'], data_dict, policy, embedder=embedder, name=name)
+                agent.value_index.start()
+                self.router.add(DatabaseRoute(name, agent, policy, data_dict, entry.get('description', '')))
+                print(f"Registered database '{name}' ({entry['db_path']})")
+            except Exception as e:
+                print(f"Warning: Could not register database '{name}': {e}")
+
+    def snapshot(self):
+        """Return a consistent (data_dict, table_cols) pair."""
+        with self._lock:
+            return self.data_dict, self.table_cols
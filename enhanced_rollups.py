@@ -0,0 +1,279 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+DB_PATH = os.path.join('db', 'bank_exchange.db')
+ROLLUP_STATE_TABLE = 'rollup_state'
+MIN_TXN_ID = -(2 ** 63)  # High-water mark before the first refresh
+ROLLUP_REFRESH_INTERVAL = 60  # Seconds between background incremental refreshes
+NO_BRANCH = -1                # branch_id stored for transactions whose account has no branch
+NO_TXN_TYPE = 'UNKNOWN'       # txn_type (and acct_type) stored for source rows without one
+ROLLUP_TRIGGERS = ['trg_rollup_acct_type_ins', 'trg_rollup_acct_type_del', 'trg_rollup_acct_type_upd']
+
+# Summary tables the dashboard questions can be answered from, plus their descriptions
+# for the data dictionary so the SQL model picks them over the raw tables.
+ROLLUP_TABLE_DESCRIPTIONS = {
+    'rollup_txn_daily': 'Daily transaction totals per branch and transaction type (pre-aggregated from txn_hist; '
+                        'use for branch-wise, daily or monthly transaction volume and sales totals; '
+                        f"branch_id {NO_BRANCH} and txn_type '{NO_TXN_TYPE}' stand for missing values)",
+    'rollup_acct_type': 'Account count and total balance per account type (pre-aggregated from acct_mast; '
+                        'use for deposits or balances by account type)',
+}
+ROLLUP_COLUMN_DESCRIPTIONS = {
+    'txn_count': 'Number of transactions',
+    'total_amount': 'Sum of transaction amounts',
+    'acct_count': 'Number of accounts',
+    'total_balance': 'Sum of account balances',
+}
+
+ROLLUP_DDL = [
+    f'''CREATE TABLE IF NOT EXISTS {ROLLUP_STATE_TABLE} (
+        rollup_name TEXT PRIMARY KEY,
+        high_water_mark INTEGER,
+        refreshed_at REAL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS rollup_txn_daily (
+        txn_date TEXT NOT NULL,
+        branch_id INTEGER NOT NULL REFERENCES branch_mast(branch_id),
+        txn_type TEXT NOT NULL,
+        txn_count INTEGER NOT NULL,
+        total_amount REAL NOT NULL,
+        PRIMARY KEY (txn_date, branch_id, txn_type)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS rollup_acct_type (
+        acct_type TEXT NOT NULL PRIMARY KEY,
+        acct_count INTEGER NOT NULL,
+        total_balance REAL NOT NULL
+    )''',
+    # acct_mast rows are updated in place (balances), so its rollup is kept exact by triggers;
+    # txn_hist is append-only and bulk loaded, so it uses a txn_id high-water mark instead.
+    f'''CREATE TRIGGER IF NOT EXISTS trg_rollup_acct_type_ins AFTER INSERT ON acct_mast BEGIN
+        INSERT INTO rollup_acct_type (acct_type, acct_count, total_balance)
+        VALUES (COALESCE(NEW.acct_type, '{NO_TXN_TYPE}'), 1, COALESCE(NEW.balance, 0))
+        ON CONFLICT(acct_type) DO UPDATE SET acct_count = acct_count + 1,
+            total_balance = total_balance + COALESCE(NEW.balance, 0);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_rollup_acct_type_del AFTER DELETE ON acct_mast BEGIN
+        UPDATE rollup_acct_type SET acct_count = acct_count - 1,
+            total_balance = total_balance - COALESCE(OLD.balance, 0)
+        WHERE acct_type = COALESCE(OLD.acct_type, '{NO_TXN_TYPE}');
+        DELETE FROM rollup_acct_type WHERE acct_type = COALESCE(OLD.acct_type, '{NO_TXN_TYPE}') AND acct_count <= 0;
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_rollup_acct_type_upd AFTER UPDATE OF acct_type, balance ON acct_mast BEGIN
+        UPDATE rollup_acct_type SET acct_count = acct_count - 1,
+            total_balance = total_balance - COALESCE(OLD.balance, 0)
+        WHERE acct_type = COALESCE(OLD.acct_type, '{NO_TXN_TYPE}');
+        DELETE FROM rollup_acct_type WHERE acct_type = COALESCE(OLD.acct_type, '{NO_TXN_TYPE}') AND acct_count <= 0;
+        INSERT INTO rollup_acct_type (acct_type, acct_count, total_balance)
+        VALUES (COALESCE(NEW.acct_type, '{NO_TXN_TYPE}'), 1, COALESCE(NEW.balance, 0))
+        ON CONFLICT(acct_type) DO UPDATE SET acct_count = acct_count + 1,
+            total_balance = total_balance + COALESCE(NEW.balance, 0);
+    END''',
+]
+
+SOURCE_COLUMNS = {
+    'txn_hist': {'txn_id', 'acct_id', 'txn_date', 'amount', 'txn_type'},
+    'acct_mast': {'acct_id', 'branch_id', 'acct_type', 'balance'},
+}
+
+# Source columns each rollup summarises; a role may only read a rollup if it can read all of them
+ROLLUP_SOURCES = {
+    'rollup_txn_daily': {'txn_hist': {'acct_id', 'txn_date', 'amount', 'txn_type'},
+                         'acct_mast': {'acct_id', 'branch_id'}},
+    'rollup_acct_type': {'acct_mast': {'acct_type', 'balance'}},
+}
+
+def rollup_grant(rollup, role_columns):
+    """'ALL' if role_columns ({table: set of readable columns}) covers the rollup's sources, else ''."""
+    for table, needed in ROLLUP_SOURCES[rollup].items():
+        if not needed <= role_columns.get(table, set()):
+            return ''
+    return 'ALL'
+
+def _has_source_tables(conn):
+    for table, needed in SOURCE_COLUMNS.items():
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if not needed <= columns:
+            return False
+    return True
+
+def _set_state(conn, name, high_water_mark):
+    conn.execute(f'''INSERT INTO {ROLLUP_STATE_TABLE} (rollup_name, high_water_mark, refreshed_at)
+                     VALUES (?, ?, ?)
+                     ON CONFLICT(rollup_name) DO UPDATE SET high_water_mark = excluded.high_water_mark,
+                         refreshed_at = excluded.refreshed_at''', (name, high_water_mark, time.time()))
+
+def _state(conn, name):
+    return conn.execute(f"SELECT high_water_mark, refreshed_at FROM {ROLLUP_STATE_TABLE} WHERE rollup_name = ?",
+                        (name,)).fetchone()
+
+def _rollups_current(conn):
+    """True when the rollup tables exist with the current (NOT NULL key) layout."""
+    daily = {row[1]: row[3] for row in conn.execute('PRAGMA table_info(rollup_txn_daily)')}
+    by_type = {row[1]: row[3] for row in conn.execute('PRAGMA table_info(rollup_acct_type)')}
+    state = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (ROLLUP_STATE_TABLE,)).fetchone()
+    return (bool(state) and daily.get('branch_id') == 1 and daily.get('txn_type') == 1
+            and by_type.get('acct_type') == 1)
+
+def create_rollups(conn):
+    """Create rollup tables/triggers; seed rollup_acct_type the first time."""
+    has_tables = conn.execute("SELECT 1 FROM sqlite_master WHERE name IN ('rollup_txn_daily', 'rollup_acct_type')").fetchone()
+    if has_tables and not _rollups_current(conn):
+        # Older layout with nullable keys: NULL groups never hit ON CONFLICT and duplicated on every refresh
+        for trigger in ROLLUP_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DROP TABLE IF EXISTS rollup_txn_daily")
+        conn.execute("DROP TABLE IF EXISTS rollup_acct_type")
+        conn.execute(f"DROP TABLE IF EXISTS {ROLLUP_STATE_TABLE}")
+    for ddl in ROLLUP_DDL:
+        conn.execute(ddl)
+    txn_id = [row for row in conn.execute('PRAGMA table_info(txn_hist)') if row[1] == 'txn_id'][0]
+    if not (txn_id[5] and str(txn_id[2]).upper() == 'INTEGER'):
+        # Refreshes and the staleness count range-scan txn_id; databases built with to_sql
+        # do not make it the rowid
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_txn_hist_txn_id ON txn_hist(txn_id)')
+    if _state(conn, 'rollup_acct_type') is None:
+        rebuild_acct_type(conn)
+
+def rebuild_acct_type(conn):
+    conn.execute("DELETE FROM rollup_acct_type")
+    conn.execute('''INSERT INTO rollup_acct_type (acct_type, acct_count, total_balance)
+                    SELECT COALESCE(acct_type, ?), COUNT(*), COALESCE(SUM(balance), 0)
+                    FROM acct_mast GROUP BY 1''', (NO_TXN_TYPE,))
+    _set_state(conn, 'rollup_acct_type', None)
+
+def refresh_txn_daily(conn):
+    """Fold transactions above the high-water mark into rollup_txn_daily; returns rows folded."""
+    state = _state(conn, 'rollup_txn_daily')
+    hwm = state[0] if state and state[0] is not None else MIN_TXN_ID
+    new_max, new_rows = conn.execute(
+        "SELECT MAX(txn_id), COUNT(*) FROM txn_hist WHERE txn_id > ?", (hwm,)).fetchone()
+    if not new_rows:
+        _set_state(conn, 'rollup_txn_daily', state[0] if state else None)
+        return 0
+    # Bound the batch by new_max so rows inserted mid-refresh wait for the next pass
+    conn.execute('''INSERT INTO rollup_txn_daily (txn_date, branch_id, txn_type, txn_count, total_amount)
+                    SELECT t.txn_date, COALESCE(a.branch_id, ?), COALESCE(t.txn_type, ?),
+                           COUNT(*), COALESCE(SUM(t.amount), 0)
+                    FROM txn_hist t LEFT JOIN acct_mast a ON t.acct_id = a.acct_id
+                    WHERE t.txn_id > ? AND t.txn_id <= ? AND t.txn_date IS NOT NULL
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT(txn_date, branch_id, txn_type) DO UPDATE SET
+                        txn_count = txn_count + excluded.txn_count,
+                        total_amount = total_amount + excluded.total_amount''',
+                 (NO_BRANCH, NO_TXN_TYPE, hwm, new_max))
+    _set_state(conn, 'rollup_txn_daily', new_max)
+    return new_rows
+
+def refresh_rollups(db_path=DB_PATH, rebuild=False, create=True):
+    """
+    Bring every rollup up to date. rebuild=True recomputes from scratch, which is
+    needed after transactions are edited or deleted (the high-water mark only sees appends).
+    create=False (the app's refresher) only folds into rollups the build step already created.
+    Returns {rollup: rows folded in}, or {} if the database lacks the banking tables or rollups.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        if not _has_source_tables(conn):
+            return {}
+        if not create and not _rollups_current(conn):
+            return {}
+        with conn:
+            conn.execute("BEGIN")  # sqlite3 would otherwise autocommit the DDL outside the transaction
+            if create:
+                create_rollups(conn)
+            if rebuild:
+                conn.execute("DELETE FROM rollup_txn_daily")
+                conn.execute(f"DELETE FROM {ROLLUP_STATE_TABLE} WHERE rollup_name = 'rollup_txn_daily'")
+                rebuild_acct_type(conn)
+            return {'rollup_txn_daily': refresh_txn_daily(conn)}
+    finally:
+        conn.close()
+
+def rollup_staleness(db_path=DB_PATH):
+    """{rollup: {'pending_rows', 'refreshed_at', 'age_s'}}; pending rows are source rows not yet folded in."""
+    conn = sqlite3.connect(db_path)
+    status = {}
+    try:
+        rows = conn.execute(f"SELECT rollup_name, high_water_mark, refreshed_at FROM {ROLLUP_STATE_TABLE}").fetchall()
+        for name, hwm, refreshed_at in rows:
+            pending = 0
+            if name == 'rollup_txn_daily':
+                hwm = MIN_TXN_ID if hwm is None else hwm
+                # txn_id is the rowid or indexed (idx_txn_hist_txn_id), so this is a range count
+                pending = conn.execute("SELECT COUNT(*) FROM txn_hist WHERE txn_id > ?", (hwm,)).fetchone()[0]
+            status[name] = {
+                'pending_rows': pending,
+                'refreshed_at': refreshed_at,
+                'age_s': time.time() - refreshed_at if refreshed_at else None,
+            }
+    except sqlite3.OperationalError:
+        pass  # Rollups not created yet
+    finally:
+        conn.close()
+    return status
+
+class RollupRefresher:
+    """Folds new transactions into the rollups from a background thread on a fixed schedule."""
+
+    def __init__(self, db_path, interval=ROLLUP_REFRESH_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._warned = False
+        self.staleness = {}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def refresh_now(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                if not refresh_rollups(self.db_path, create=False) and not self._warned:
+                    print("Warning: Rollup tables missing or outdated; run build_artifacts.py to create them")
+                    self._warned = True
+                staleness = rollup_staleness(self.db_path)
+                with self._lock:
+                    self.staleness = staleness
+            except sqlite3.Error as e:
+                print(f"Warning: Rollup refresh failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def status(self):
+        """Return {rollup: staleness} as of the last refresh."""
+        with self._lock:
+            return dict(self.staleness)
+
+def build_rollups(db_path=DB_PATH):
+    """build_artifacts step: create or migrate the rollup tables and bring them up to date."""
+    return refresh_rollups(db_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Create and refresh the summary (rollup) tables.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--rebuild', action='store_true', help='Recompute rollups from scratch')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    folded = refresh_rollups(args.db, rebuild=args.rebuild)
+    if not folded:
+        print(f"⚠️ {args.db} lacks the txn_hist/acct_mast columns; nothing to roll up")
+        return
+    for name, rows in folded.items():
+        print(f"✅ {name}: folded in {rows} new row(s)")
+    for name, s in rollup_staleness(args.db).items():
+        print(f"📊 {name}: {s['pending_rows']} pending row(s)")
+    print(f"🎉 Rollups refreshed in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import numpy as np
+from sentence_transformers import util
+from enhanced_embedding import encode, get_shared_model
+from enhanced_export import ExportError, export_query, export_quota
+from enhanced_query_agent import filter_sql_to_allowed, validate_sql
+
+DATABASES_CONFIG_PATH = os.path.join('data', 'databases.json')
+
+def load_database_config(path=DATABASES_CONFIG_PATH):
+    """
+    Extra marts served next to the primary database, e.g.
+    [{"name": "amc", "db_path": "db/amc.db", "data_dict_path": "data/amc_data_dictionary.xlsx",
+      "role_access_path": "data/amc_role_access.xlsx", "description": "Mutual fund schemes and NAVs"}]
+    """
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read {path}: {e}")
+        return []
+    valid = []
+    for entry in entries:
+        if not entry.get('name') or not entry.get('db_path') or not entry.get('role_access_path'):
+            print(f"Warning: Skipping database entry without name/db_path/role_access_path: {entry}")
+        elif not os.path.exists(entry['db_path']):
+            print(f"Warning: Database {entry['db_path']} for '{entry['name']}' not found, skipping")
+        elif not os.path.exists(entry['role_access_path']):
+            print(f"Warning: Role access file {entry['role_access_path']} for '{entry['name']}' not found, skipping")
+        else:
+            valid.append(entry)
+    return valid
+
+def table_summaries(data_dict, description=''):
+    """One routing text per table: its name, description and column names."""
+    if data_dict.empty:
+        return {}
+    summaries = {}
+    for table, rows in data_dict.groupby('Table', sort=False):
+        table_desc = ''
+        if 'Table Description' in rows:
+            table_desc = next((str(d) for d in rows['Table Description'] if isinstance(d, str) and d), '')
+        columns = ', '.join(str(c) for c in rows['Column'])
+        summaries[table] = f"{description} {table}: {table_desc} Columns: {columns}".strip()
+    return summaries
+
+class DatabaseRoute:
+    """One database behind the router: its agent, access policy and routing texts."""
+
+    def __init__(self, name, agent, policy, data_dict, description=''):
+        self.name = name
+        self.agent = agent
+        self.policy = policy
+        self.description = description
+        self.summaries = table_summaries(data_dict, description)
+
+class DatabaseRouter:
+    """
+    Picks the database for a question from a small table-level index covering every mart,
+    then hands the question to that database's QueryAgent. All agents share the process-wide
+    embedding model and LLM, and the routing embedding is reused for schema retrieval.
+    """
+
+    def __init__(self):
+        self.model = get_shared_model()
+        self._lock = threading.RLock()
+        self.routes = {}
+        self._owners = []        # Route name for each row of _embeddings
+        self._owner_tables = []
+        self._embeddings = None
+        self.sample_sql = None   # Optional SampleQueryWarmer with precomputed sample-question SQL
+
+    def add(self, route):
+        with self._lock:
+            self.routes[route.name] = route
+        self._rebuild_index()
+        return route
+
+    def refresh(self, name, data_dict):
+        """Re-read one database's routing texts after its data dictionary changed."""
+        with self._lock:
+            route = self.routes[name]
+            route.summaries = table_summaries(data_dict, route.description)
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        with self._lock:
+            owners, tables, texts = [], [], []
+            for name, route in self.routes.items():
+                for table, text in route.summaries.items():
+                    owners.append(name)
+                    tables.append(table)
+                    texts.append(text)
+            embeddings = None
+            # One database needs no routing, so skip the encode entirely
+            if self.model is not None and texts and len(self.routes) > 1:
+                embeddings = encode(self.model, texts)
+            self._owners, self._owner_tables, self._embeddings = owners, tables, embeddings
+
+    def _role_routes(self, role):
+        """Databases where the role can read at least one table, as {name: canonical role}."""
+        candidates = {}
+        for name, route in self.routes.items():
+            local_role = route.policy.canonical_role(role) or role
+            if route.policy.allowed_tables(local_role):
+                candidates[name] = local_role
+        return candidates
+
+    def route(self, question, role):
+        """Return (database name, question embedding or None, candidate roles)."""
+        with self._lock:
+            candidates = self._role_routes(role)
+            if not candidates:
+                return None, None, candidates
+            if len(candidates) == 1:
+                return next(iter(candidates)), None, candidates
+            if self._embeddings is None:
+                return self._keyword_route(question, candidates), None, candidates
+            q_emb = encode(self.model, [question])
+            scores = util.cos_sim(q_emb, self._embeddings)[0].cpu().numpy()
+            owners, owner_tables = self._owners, self._owner_tables
+        readable = self._readable_tables(candidates)
+        best = {}
+        for owner, table, score in zip(owners, owner_tables, scores):
+            # Only tables the role can read on that database count towards it
+            if table in readable.get(owner, ()) and score > best.get(owner, -np.inf):
+                best[owner] = score
+        name = max(best, key=best.get) if best else next(iter(candidates))
+        return name, q_emb, candidates
+
+    def _readable_tables(self, candidates):
+        return {name: set(self.routes[name].policy.allowed_tables(local_role))
+                for name, local_role in candidates.items()}
+
+    def _keyword_route(self, question, candidates):
+        words = question.lower().split()
+        best_name, best_score = next(iter(candidates)), 0
+        readable = self._readable_tables(candidates)
+        for name in candidates:
+            summaries = self.routes[name].summaries
+            text = ' '.join(summaries[t] for t in summaries if t in readable[name]).lower()
+            score = sum(1 for word in words if word in text)
+            if score > best_score:
+                best_name, best_score = name, score
+        return best_name
+
+    def answer_query(self, question, role):
+        """Return (database name, sql_query, response, df) answered from the best-matching database."""
+        cached = self.sample_sql.lookup(question, role) if self.sample_sql is not None else None
+        if cached:
+            # Warmed sample question: the database and SQL are already known
+            name, cached_sql = cached
+            q_emb = None
+            local_role = self.routes[name].policy.canonical_role(role) or role
+        else:
+            name, q_emb, candidates = self.route(question, role)
+            if name is None:
+                return None, None, "Your role does not have access to any database.", None
+            cached_sql = None
+            local_role = candidates[name]
+        route = self.routes[name]
+        sql_query, response, df = route.agent.answer_query(
+            question, route.policy.allowed_tables(local_role), route.policy.allowed_columns(local_role),
+            query_embedding=q_emb, sql_query=cached_sql)
+        if len(self.routes) > 1:
+            response = f"Answered from the **{name}** database.\n\n{response}"
+        return name, sql_query, response, df
+
+    def export(self, name, sql_query, role, fmt, out_dir):
+        """
+        Re-run an answered query into a CSV/Parquet/XLSX file under the role's current grants
+        and export quota; returns the export report. Raises ExportError.
+        """
+        route = self.routes.get(name) if name else next(iter(self.routes.values()), None)
+        if route is None:
+            raise ExportError(f"The {name} database is no longer available.")
+        local_role = route.policy.canonical_role(role) or role
+        allowed_tables = route.policy.allowed_tables(local_role)
+        allowed_columns = route.policy.allowed_columns(local_role)
+        if not (filter_sql_to_allowed(sql_query, allowed_tables, allowed_columns)
+                and validate_sql(sql_query, allowed_tables, allowed_columns)[0]):
+            raise ExportError("This query is no longer allowed for your role.")
+        return export_query(route.agent.db_path, sql_query, fmt, out_dir, allowed_columns,
+                            max_rows=export_quota(local_role), type_hints=route.agent.column_types)
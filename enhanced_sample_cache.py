@@ -0,0 +1,205 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from enhanced_llm_interface import background_priority
+from enhanced_metrics import QueryTrace
+from enhanced_schema import schema_fingerprint
+
+SAMPLE_CACHE_PATH = os.path.join('cache', 'sample_sql.db')
+WARMUP_INTERVAL = 300  # Seconds between passes looking for schema or role-matrix changes
+
+# Sidebar sample questions, by category
+SAMPLE_QUERIES = {
+    "Transactions": [
+        "Show me total sales for this month",
+        "Show recent transactions",
+        "What is the average transaction amount?",
+        "Show me transactions above $1000",
+        "Show me daily transaction trends"
+    ],
+    "Customer Analysis": [
+        "List top 10 customers by revenue",
+        "Count all customers",
+        "Show me customer distribution by region",
+        "Which customers have multiple accounts?"
+    ],
+    "Account Information": [
+        "Show account balances by type",
+        "List accounts opened in the last month",
+        "Calculate total deposits by account type",
+        "List inactive accounts",
+        "What is the average balance by customer type?"
+    ],
+    "Loan Management": [
+        "Show loan status summary",
+        "List all pending loan applications",
+        "Show me overdue loans"
+    ],
+    "Branch Performance": [
+        "What are the top performing branches?",
+        "Show branch-wise transaction volume",
+        "List branches by customer count"
+    ],
+}
+
+def sample_questions():
+    return [q for queries in SAMPLE_QUERIES.values() for q in queries]
+
+def _db_schema_fingerprint(db_path):
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        return schema_fingerprint(conn)
+    finally:
+        conn.close()
+
+def access_fingerprint(schema_fp, allowed_columns, databases):
+    """Changes when the schema, the role's readable columns or the set of routable databases change."""
+    key = repr((schema_fp, sorted((t, sorted(c)) for t, c in allowed_columns.items()), sorted(databases)))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+class SampleSQLCache:
+    """Persistent (role, question) -> (database, SQL) store, valid while its fingerprint matches."""
+
+    def __init__(self, path=SAMPLE_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("""CREATE TABLE IF NOT EXISTS sample_sql (
+                role TEXT, question TEXT, database TEXT, fingerprint TEXT,
+                sql TEXT, error TEXT, built_at REAL, PRIMARY KEY (role, question))""")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, role, question):
+        """Return (database, fingerprint, sql) or None; sql is None when generation failed."""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT database, fingerprint, sql FROM sample_sql WHERE role=? AND question=?",
+                                (role, question)).fetchone()
+        finally:
+            conn.close()
+
+    def put(self, role, question, database, fingerprint, sql, error=None):
+        conn = self._connect()
+        try:
+            conn.execute("INSERT INTO sample_sql VALUES (?, ?, ?, ?, ?, ?, ?) "
+                         "ON CONFLICT(role, question) DO UPDATE SET database=excluded.database, "
+                         "fingerprint=excluded.fingerprint, sql=excluded.sql, error=excluded.error, "
+                         "built_at=excluded.built_at",
+                         (role, question, database, fingerprint, sql, error, time.time()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def ready_count(self, role):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM sample_sql WHERE role=? AND sql IS NOT NULL",
+                                (role,)).fetchone()[0]
+        finally:
+            conn.close()
+
+class SampleQueryWarmer:
+    """
+    Generates and validates SQL for every sample question for every role from a background
+    thread, so sample clicks skip retrieval and generation. A pass only regenerates entries whose
+    fingerprint moved, and roles with identical access share one generation.
+    """
+
+    def __init__(self, router, cache_path=SAMPLE_CACHE_PATH, interval=WARMUP_INTERVAL):
+        self.router = router
+        self.cache = SampleSQLCache(cache_path)
+        self.interval = interval
+        self._questions = set(sample_questions())
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def refresh_now(self):
+        """Run a warmup pass now, e.g. after the data dictionary or role matrix was reloaded."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.warm()
+            except Exception as e:
+                print(f"Warning: Sample query warmup failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _roles(self):
+        roles = []
+        for route in list(self.router.routes.values()):
+            roles += [r for r in route.policy.roles() if r not in roles]
+        return roles
+
+    def _fingerprint(self, name, local_role, schema_fps):
+        route = self.router.routes[name]
+        if name not in schema_fps:
+            schema_fps[name] = _db_schema_fingerprint(route.agent.db_path)
+        return access_fingerprint(schema_fps[name], route.policy.allowed_columns(local_role), self.router.routes)
+
+    def warm(self):
+        """One pass over roles x sample questions; returns the number of entries generated."""
+        start = time.perf_counter()
+        schema_fps, generated, shared = {}, 0, {}
+        for role in self._roles():
+            for question in sample_questions():
+                name, q_emb, candidates = self.router.route(question, role)
+                if name is None:
+                    continue
+                local_role = candidates[name]
+                fingerprint = self._fingerprint(name, local_role, schema_fps)
+                cached = self.cache.get(role, question)
+                if cached and cached[0] == name and cached[1] == fingerprint:
+                    continue
+                if (name, question, fingerprint) not in shared:
+                    route = self.router.routes[name]
+                    trace = QueryTrace(question)
+                    error = 'warmup failed'
+                    try:
+                        # Generations wait while any user question is queued for the model
+                        with background_priority():
+                            sql, error = route.agent.plan_sql(question, route.policy.allowed_tables(local_role),
+                                                              route.policy.allowed_columns(local_role),
+                                                              trace=trace, query_embedding=q_emb)
+                    finally:
+                        trace.finish(status='error' if error else 'ok', database=name, source='warmup')
+                    shared[(name, question, fingerprint)] = (None, error) if error else (sql, None)
+                    generated += 1
+                sql, error = shared[(name, question, fingerprint)]
+                self.cache.put(role, question, name, fingerprint, sql, error)
+        if generated:
+            print(f"Sample query warmup: generated {generated} SQL statement(s) in {time.perf_counter() - start:.1f}s")
+        return generated
+
+    def lookup(self, question, role):
+        """Return (database, sql) for a sample question if its cached SQL is still current, else None."""
+        if question not in self._questions:
+            return None
+        cached = self.cache.get(role, question)
+        if not cached or cached[2] is None or cached[0] not in self.router.routes:
+            return None
+        name, fingerprint, sql = cached
+        local_role = self.router.routes[name].policy.canonical_role(role) or role
+        try:
+            if self._fingerprint(name, local_role, {}) != fingerprint:
+                return None
+        except sqlite3.Error:
+            return None
+        return name, sql
+
+    def ready_count(self, role):
+        return self.cache.ready_count(role)
@@ -0,0 +1,68 @@
+import hashlib
+import os
+import sqlite3
+
+def schema_fingerprint(conn):
+    """Content hash of sqlite_master; unlike PRAGMA schema_version it ignores DROP/CREATE of identical DDL."""
+    rows = conn.execute("SELECT type, name, tbl_name, sql FROM sqlite_master "
+                        "WHERE name NOT LIKE 'sqlite_%' ORDER BY type, name").fetchall()
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(repr(row).encode('utf-8'))
+    return digest.hexdigest()
+
+def load_schema_snapshot(db_path):
+    """
+    Read every table's PRAGMA table_info/foreign_key_list once, in sqlite_master order.
+    The result is plain tuples and dicts so it can be handed to worker processes.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = {}
+        for (table_name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall():
+            if table_name.startswith('sqlite_'):
+                continue
+            tables[table_name] = {
+                'columns': [tuple(c) for c in conn.execute(f'PRAGMA table_info("{table_name}")').fetchall()],
+                'foreign_keys': [tuple(f) for f in conn.execute(f'PRAGMA foreign_key_list("{table_name}")').fetchall()],
+            }
+        fingerprint = schema_fingerprint(conn)
+    finally:
+        conn.close()
+    return {'db_path': os.path.abspath(db_path), 'fingerprint': fingerprint, 'tables': tables}
+
+def foreign_key_graph(data_dict=None, snapshot=None):
+    """
+    Undirected table adjacency {table: set(neighbours)} built from the data dictionary's
+    'Foreign Key Table' column, or from a snapshot's PRAGMA foreign_key_list rows.
+    """
+    graph = {}
+
+    def link(a, b):
+        graph.setdefault(a, set()).add(b)
+        graph.setdefault(b, set()).add(a)
+
+    if data_dict is not None and not data_dict.empty and 'Foreign Key Table' in data_dict:
+        for table, fk_table in data_dict[['Table', 'Foreign Key Table']].itertuples(index=False):
+            if isinstance(fk_table, str) and fk_table.strip():
+                link(table, fk_table.strip())
+    elif snapshot is not None:
+        for table, details in snapshot['tables'].items():
+            for fk in details['foreign_keys']:
+                link(table, fk[2])  # fk[2] is the referenced table
+    return graph
+
+def expand_tables(seeds, graph, hops, allowed_tables):
+    """
+    Tables within `hops` FK edges of the seeds, walking only through allowed tables.
+    Returned in allowed_tables order so the prompt layout is stable between questions.
+    """
+    allowed = set(allowed_tables)
+    reached = {t for t in seeds if t in allowed}
+    frontier = set(reached)
+    for _ in range(hops):
+        frontier = {n for t in frontier for n in graph.get(t, ()) if n in allowed and n not in reached}
+        if not frontier:
+            break
+        reached |= frontier
+    return [t for t in allowed_tables if t in reached]
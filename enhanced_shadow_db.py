@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+
+# Statements a candidate query may compile to; anything else (writes, DDL, ATTACH) is refused
+READ_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+DDL_ORDER = {'table': 0, 'view': 1, 'index': 2, 'trigger': 3}
+
+# Schema introspection pragmas validate_sql already lets through
+READ_PRAGMAS = {'table_info', 'table_xinfo', 'foreign_key_list', 'index_list', 'index_info'}
+
+def read_only_authorizer(action, arg1, arg2, db_name, trigger):
+    if action in READ_ACTIONS:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_PRAGMA and str(arg1).lower() in READ_PRAGMAS:
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+def role_authorizer(allowed_columns):
+    """
+    Read-only authorizer that also refuses column reads outside {table: [columns]}, so a
+    query can only touch what the role is granted however the SQL was written.
+    """
+    readable = {str(t).lower(): {str(c).lower() for c in cols} for t, cols in allowed_columns.items()}
+
+    def authorize(action, arg1, arg2, db_name, trigger):
+        if action == sqlite3.SQLITE_READ:
+            columns = readable.get(str(arg1).lower())
+            # COUNT(*) reads the table with an empty column name
+            if columns is not None and (not arg2 or arg2.lower() in columns):
+                return sqlite3.SQLITE_OK
+            return sqlite3.SQLITE_DENY
+        return read_only_authorizer(action, arg1, arg2, db_name, trigger)
+    return authorize
+
+class ShadowSchema:
+    """
+    In-memory SQLite holding only the DDL of a database. Candidate SQL is EXPLAINed here, which
+    prepares it (tables, columns, functions, syntax) without reading a page of the real file.
+    The copy is rebuilt whenever the source's PRAGMA schema_version moves.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._source = None
+        self._shadow = None
+        self._version = None
+
+    def _sync(self):
+        """Rebuild the shadow if the source schema changed (caller holds _lock)."""
+        if self._source is None:
+            self._source = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True,
+                                           check_same_thread=False)
+        version = self._source.execute("PRAGMA schema_version").fetchone()[0]
+        if version == self._version:
+            return
+        rows = self._source.execute("SELECT type, name, sql FROM sqlite_master "
+                                    "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'").fetchall()
+        shadow = sqlite3.connect(':memory:', check_same_thread=False)
+        for kind, name, sql in sorted(rows, key=lambda r: DDL_ORDER.get(r[0], 4)):
+            try:
+                shadow.execute(sql)
+            except sqlite3.Error as e:
+                print(f"Warning: Shadow schema could not create {kind} {name}: {e}")
+        shadow.set_authorizer(read_only_authorizer)
+        if self._shadow is not None:
+            self._shadow.close()
+        self._shadow, self._version = shadow, version
+
+    def check(self, sql_query):
+        """
+        Return (ok, error). Errors are SQLite's own messages, e.g. 'no such column: x'.
+        If the source cannot be opened the query is let through to the usual execution path.
+        """
+        with self._lock:
+            try:
+                self._sync()
+            except sqlite3.Error as e:
+                print(f"Warning: Shadow schema unavailable for {self.db_path}: {e}")
+                return True, None
+            try:
+                self._shadow.execute(f"EXPLAIN {sql_query}").fetchall()
+            except (sqlite3.DatabaseError, sqlite3.Warning) as e:
+                # More than one statement is a ProgrammingError from Python 3.11, a Warning before
+                if 'not authorized' in str(e):
+                    return False, "Only read-only SELECT queries are allowed."
+                return False, str(e)
+        return True, None
+
+    def close(self):
+        with self._lock:
+            for conn in (self._source, self._shadow):
+                if conn is not None:
+                    conn.close()
+            self._source = self._shadow = None
+            self._version = None
@@ -0,0 +1,213 @@
+import difflib
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from enhanced_schema import schema_fingerprint
+
+VALUE_INDEX_DIR = os.path.join('cache', 'value_index')
+VALUE_REFRESH_INTERVAL = 600   # Seconds between incremental passes over newly inserted rows
+FULL_REBUILD_INTERVAL = 86400  # Seconds between full rescans, which also catch updates and deletes
+MAX_DISTINCT = 50              # Text columns with more distinct values are not indexed
+MAX_VALUE_LENGTH = 40          # Longer strings (addresses, free text) are not literals people type
+FUZZY_CUTOFF = 0.8             # difflib ratio a question phrase needs to match a value
+MAX_LISTED_VALUES = 12         # Retrieved columns list every value up to this many
+MAX_VALUE_LINES = 8            # Value lines added to the prompt per question
+
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}')
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+def normalize(value):
+    return ' '.join(WORD_PATTERN.findall(str(value).lower()))
+
+def _is_text(declared):
+    name = (declared or '').upper()
+    return not name or 'CHAR' in name or 'CLOB' in name or 'TEXT' in name
+
+def _collect(rows, columns, values):
+    """Fold rows into values {column: set or None}; None marks a column that stopped qualifying."""
+    for row in rows:
+        for col, value in zip(columns, row):
+            seen = values[col]
+            if seen is None or value is None:
+                continue
+            if not isinstance(value, str) or len(value) > MAX_VALUE_LENGTH or DATE_PATTERN.match(value):
+                values[col] = None
+                continue
+            seen.add(value)
+            if len(seen) > MAX_DISTINCT:
+                values[col] = None
+
+def scan_table(conn, table, after_rowid=None, known=None):
+    """
+    One pass over a table's text columns, or only its rows past after_rowid, merged into
+    `known`. Returns ({column: frozenset or None}, last rowid or None for WITHOUT ROWID tables).
+    """
+    columns = [c[1] for c in conn.execute(f'PRAGMA table_info("{table}")').fetchall() if _is_text(c[2])]
+    known = known or {}
+    values = {}
+    for col in columns:
+        if col not in known:
+            values[col] = set()
+        else:
+            values[col] = set(known[col]) if known[col] is not None else None
+    if not any(v is not None for v in values.values()):
+        return {col: None for col in columns}, after_rowid
+    selected = ', '.join(f'"{c}"' for c in columns)
+    try:
+        cursor = conn.execute(f'SELECT rowid, {selected} FROM "{table}" WHERE rowid > ? ORDER BY rowid',
+                              (after_rowid or 0,))
+        last_rowid = after_rowid
+        while True:
+            rows = cursor.fetchmany(10_000)
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            _collect((row[1:] for row in rows), columns, values)
+    except sqlite3.OperationalError:
+        # WITHOUT ROWID: no cheap way to find new rows, so it is only rescanned in full
+        values = {col: set() for col in columns}
+        _collect(conn.execute(f'SELECT {selected} FROM "{table}"'), columns, values)
+        last_rowid = None
+    return {col: (frozenset(v) if v is not None else None) for col, v in values.items()}, last_rowid
+
+class ValueIndex:
+    """
+    Distinct values of a database's low-cardinality text columns (statuses, types, branch
+    names), so literals in generated SQL can be grounded in what the data actually says.
+    A pass only reads rows inserted since the last one; a schema change or FULL_REBUILD_INTERVAL
+    triggers a full rescan. The index is pickled under cache/ between runs.
+    """
+
+    def __init__(self, db_path, cache_dir=VALUE_INDEX_DIR, interval=VALUE_REFRESH_INTERVAL):
+        self.db_path = db_path
+        key = hashlib.sha1(os.path.abspath(db_path).encode('utf-8')).hexdigest()[:12]
+        self.cache_path = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(db_path))[0]}_{key}.pkl")
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._full_requested = False
+        self._thread = None
+        self._state = {'fingerprint': None, 'built_at': 0, 'tables': {}}
+        self._entries = []
+        try:
+            with open(self.cache_path, 'rb') as f:
+                self._set_state(pickle.load(f))
+        except FileNotFoundError:
+            pass  # Built by the first refresh
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable value index {self.cache_path}: {e}")
+
+    def _set_state(self, state):
+        # (normalized value, table, column, value) rows for matching
+        entries = []
+        for table, info in state['tables'].items():
+            for col, values in info['columns'].items():
+                for value in values or ():
+                    entries.append((normalize(value), table, col, value))
+        with self._lock:
+            self._state, self._entries = state, entries
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def refresh_now(self, full=False):
+        """Wake the background pass; full=True rescans every row (e.g. after the data was reloaded)."""
+        if full:
+            self._full_requested = True
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            full, self._full_requested = self._full_requested, False
+            try:
+                self.refresh(full)
+            except sqlite3.Error as e:
+                print(f"Warning: Value index refresh failed for {self.db_path}: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self, full=False):
+        """
+        Scan new rows (or everything, when due or asked for) and swap in the result; returns
+        tables scanned. Updates and deletes keep the DDL, so only a full pass sees them.
+        """
+        conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True)
+        try:
+            fingerprint = schema_fingerprint(conn)
+            old = self._state
+            full = (full or old['fingerprint'] != fingerprint
+                    or time.time() - old['built_at'] > FULL_REBUILD_INTERVAL)
+            tables = [r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall()]
+            state = {'fingerprint': fingerprint, 'built_at': time.time() if full else old['built_at'], 'tables': {}}
+            scanned = 0
+            for table in tables:
+                previous = None if full else old['tables'].get(table)
+                if previous is not None:
+                    if previous['last_rowid'] is None:
+                        state['tables'][table] = previous
+                        continue
+                    try:
+                        max_rowid = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0]
+                    except sqlite3.OperationalError:
+                        max_rowid = None
+                    if max_rowid is None or max_rowid <= previous['last_rowid']:
+                        state['tables'][table] = previous
+                        continue
+                    columns, last_rowid = scan_table(conn, table, previous['last_rowid'], previous['columns'])
+                else:
+                    columns, last_rowid = scan_table(conn, table)
+                state['tables'][table] = {'columns': columns, 'last_rowid': last_rowid}
+                scanned += 1
+        finally:
+            conn.close()
+        self._set_state(state)
+        if scanned:
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                with open(self.cache_path, 'wb') as f:
+                    pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except OSError as e:
+                print(f"Warning: Could not write value index {self.cache_path}: {e}")
+        return scanned
+
+    def values(self, table, column):
+        with self._lock:
+            info = self._state['tables'].get(table)
+        return info['columns'].get(column) if info else None
+
+    def match(self, question, allowed_columns, retrieved_columns=()):
+        """
+        Prompt lines naming the stored spelling of values the question refers to, e.g.
+        "txn_hist.txn_type values: 'CREDIT', 'DEBIT'". Only columns in allowed_columns
+        ({table: [columns]}) are used. Phrases of the question are matched fuzzily; retrieved
+        (table, column) pairs with few values list all of them.
+        """
+        allowed = {(t.lower(), c.lower()) for t, cols in allowed_columns.items() for c in cols}
+        words = WORD_PATTERN.findall(question.lower())
+        phrases = {' '.join(words[i:i + n]) for n in (1, 2, 3) for i in range(len(words) - n + 1)}
+        with self._lock:
+            entries = self._entries
+        matched = {}
+        for norm, table, col, value in entries:
+            if (table.lower(), col.lower()) not in allowed or not norm:
+                continue
+            if norm in phrases or (len(norm) > 3 and difflib.get_close_matches(
+                    norm, [p for p in phrases if p.count(' ') == norm.count(' ')], n=1, cutoff=FUZZY_CUTOFF)):
+                matched.setdefault((table, col), []).append(value)
+        lines = [f"{t}.{c} values matching the question: " + ', '.join(f"'{v}'" for v in sorted(vals))
+                 for (t, c), vals in matched.items()]
+        for table, col in retrieved_columns:
+            if (table, col) in matched or (str(table).lower(), str(col).lower()) not in allowed:
+                continue
+            values = self.values(table, col)
+            if values and len(values) <= MAX_LISTED_VALUES:
+                lines.append(f"{table}.{col} values: " + ', '.join(f"'{v}'" for v in sorted(values)))
+        return lines[:MAX_VALUE_LINES]
@@ -0,0 +1,89 @@
+import json
+import math
+import time
+import numpy as np
+import faiss
+
+FLAT_MAX_VECTORS = 50_000       # Exhaustive search is fast enough below this
+MEMORY_BUDGET_MB = 1024         # Largest index we are willing to keep in RAM
+HNSW_M = 32                     # Graph neighbours per node
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 128
+PQ_NBITS = 8
+IVF_TRAIN_POINTS_PER_LIST = 64  # FAISS warns below ~39 training points per centroid
+
+def params_path(index_path):
+    return f"{index_path}.params.json"
+
+def normalize(vectors):
+    """Float32 copy with unit-length rows, so inner product equals cosine similarity."""
+    vectors = np.array(vectors, dtype='float32', copy=True)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def estimate_memory_bytes(kind, n, d, m=None):
+    if kind == 'flat':
+        return n * d * 4
+    if kind == 'hnsw':
+        return n * (d * 4 + HNSW_M * 2 * 4)  # Vectors plus level-0 neighbour lists
+    return n * ((m or d // 8) * PQ_NBITS // 8 + 8)  # Codes plus ids
+
+def _pq_subquantizers(d):
+    """Largest m <= d/4 that divides d, so each subvector covers at least 4 dimensions."""
+    for m in range(max(1, d // 4), 0, -1):
+        if d % m == 0 and m <= 64:
+            return m
+    return 1
+
+def choose_index_type(n, d, memory_budget_mb=MEMORY_BUDGET_MB):
+    """Flat for small corpora, HNSW while full vectors fit the budget, IVF-PQ beyond that."""
+    budget = memory_budget_mb * 1024 * 1024
+    if n <= FLAT_MAX_VECTORS and estimate_memory_bytes('flat', n, d) <= budget:
+        return 'flat'
+    if estimate_memory_bytes('hnsw', n, d) <= budget:
+        return 'hnsw'
+    return 'ivfpq'
+
+def build_index(embeddings, kind=None, memory_budget_mb=MEMORY_BUDGET_MB, seed=0):
+    """
+    Build a cosine-similarity index (normalized vectors, inner product).
+    Returns (index, params); params record the type and query-time knobs (efSearch, nprobe),
+    which faiss.write_index does not always carry, next to the index.
+    """
+    vectors = normalize(embeddings)
+    n, d = vectors.shape
+    kind = kind or choose_index_type(n, d, memory_budget_mb)
+    params = {'type': kind, 'metric': 'inner_product', 'normalized': True, 'dim': d, 'count': n}
+    start = time.perf_counter()
+
+    if kind == 'flat':
+        index = faiss.IndexFlatIP(d)
+    elif kind == 'hnsw':
+        index = faiss.IndexHNSWFlat(d, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        params.update(M=HNSW_M, efConstruction=HNSW_EF_CONSTRUCTION, efSearch=HNSW_EF_SEARCH)
+    elif kind == 'ivfpq':
+        # ~4*sqrt(n) lists, capped so every list gets enough training points
+        nlist = max(1, min(int(4 * math.sqrt(n)), n // IVF_TRAIN_POINTS_PER_LIST))
+        m = _pq_subquantizers(d)
+        quantizer = faiss.IndexFlatIP(d)
+        index = faiss.IndexIVFPQ(quantizer, d, nlist, m, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        train_size = min(n, max(nlist * IVF_TRAIN_POINTS_PER_LIST, 2 ** PQ_NBITS * 64))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, size=train_size, replace=False)] if train_size < n else vectors
+        index.train(sample)
+        index.nprobe = max(1, nlist // 16)
+        params.update(nlist=nlist, m=m, nbits=PQ_NBITS, nprobe=index.nprobe, train_size=int(train_size), seed=seed)
+    else:
+        raise ValueError(f"Unknown index type {kind}")
+
+    index.add(vectors)
+    params['build_seconds'] = round(time.perf_counter() - start, 3)
+    params['memory_estimate_mb'] = round(estimate_memory_bytes(kind, n, d, params.get('m')) / 1024 / 1024, 1)
+    return index, params
+
+def save_index(index, params, index_path):
+    faiss.write_index(index, str(index_path))
+    with open(params_path(index_path), 'w', encoding='utf-8') as f:
+        json.dump(params, f, indent=2)
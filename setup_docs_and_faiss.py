@@ -1,11 +1,15 @@
 # setup_docs_and_faiss.py
+import argparse
 import os
 import sqlite3
 import json
-import pandas as pd
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from sentence_transformers import SentenceTransformer
-import faiss
 from pathlib import Path
+from enhanced_metadata_cache import read_workbook
+from enhanced_vector_index import MEMORY_BUDGET_MB, build_index, save_index
 
 # --- Configuration ---
 DB_PATH = "business.db"  # Path to your SQLite DB created by create_bank_exchange_db.py
@@ -14,146 +18,185 @@ FAISS_INDEX_PATH = Path(FAISS_INDEX_DIR) / "faiss.index"
 META_FILE_PATH = Path(FAISS_INDEX_DIR) / "faiss.index.meta.json"
 EMBED_MODEL = "all-MiniLM-L6-v2"  # Good general-purpose embedding model
 DATA_FOLDER = "data"
+EXTRACT_CHUNKSIZE = 16           # Tables handed to an extraction worker at a time
+EMBED_BATCH_SIZE = 64            # Sentences per forward pass
+MULTI_PROCESS_MIN_CHUNKS = 2000  # Below this, starting an encode pool costs more than it saves
+PROGRESS_EVERY = 10              # Batches per worker between progress lines
 
-def extract_schema_and_metadata_from_db(db_path):
-    """
-    Extracts table schema, column descriptions (from data_dictionary),
-    and relationships from the SQLite database and Excel files.
-    """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    chunks = []
+_conn = None  # Read-only connection held by each extraction worker
+
+def _init_extract_worker(db_path):
+    global _conn
+    if db_path:
+        _conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
 
+def load_data_dictionary_columns():
+    """Return {table: [(column, description)]} from the data dictionary, grouped once."""
     try:
         # Load data dictionary from Excel file
         data_dictionary_path = os.path.join(DATA_FOLDER, "data_dictionary.xlsx")
-        if os.path.exists(data_dictionary_path):
-            data_dictionary_df = pd.read_excel(data_dictionary_path)
-            print(f"✅ Loaded data dictionary from {data_dictionary_path}")
-        else:
+        if not os.path.exists(data_dictionary_path):
             print(f"⚠️ Data dictionary not found at {data_dictionary_path}")
-            data_dictionary_df = pd.DataFrame()
+            return {}
+        data_dictionary_df = read_workbook(data_dictionary_path)
+        print(f"✅ Loaded data dictionary from {data_dictionary_path}")
     except Exception as e:
         print(f"❌ Error loading data dictionary: {e}")
-        data_dictionary_df = pd.DataFrame()
-
-    # Get all table names from the database
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
-
-    for (table_name,) in tables:
-        # 1. Add table description and column definitions from data_dictionary
-        table_info = f"Table: {table_name}\n"
-        
-        # Get column descriptions for this table from data dictionary
-        if not data_dictionary_df.empty and 'TableName' in data_dictionary_df.columns:
-            table_cols_dd = data_dictionary_df[data_dictionary_df['TableName'] == table_name]
-            for _, row in table_cols_dd.iterrows():
-                if 'ColumnName' in row and 'Description' in row:
-                    table_info += f"  Column '{row['ColumnName']}': {row['Description']}\n"
-        
-        # 2. Get actual schema information from the database
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = cursor.fetchall()
-        
-        table_info += "  Schema:\n"
-        for col in columns:
-            cid, name, type_name, not_null, default_val, pk = col
-            constraints = []
-            if pk:
-                constraints.append("PRIMARY KEY")
-            if not_null:
-                constraints.append("NOT NULL")
-            if default_val:
-                constraints.append(f"DEFAULT {default_val}")
-            
-            constraint_str = f" ({', '.join(constraints)})" if constraints else ""
-            table_info += f"    {name} {type_name}{constraint_str}\n"
-        
-        # 3. Get foreign key relationships
-        cursor.execute(f"PRAGMA foreign_key_list({table_name})")
-        foreign_keys = cursor.fetchall()
-        
-        if foreign_keys:
-            table_info += "  Foreign Keys:\n"
-            for fk in foreign_keys:
-                id, seq, table, from_col, to_col, on_update, on_delete, match = fk
-                table_info += f"    {from_col} → {table}.{to_col}\n"
-        
-        # 4. Get sample data (first 3 rows) for context
-        try:
-            cursor.execute(f"SELECT * FROM {table_name} LIMIT 3")
-            sample_data = cursor.fetchall()
-            if sample_data:
-                table_info += "  Sample Data:\n"
-                for row in sample_data:
-                    table_info += f"    {row}\n"
-        except Exception as e:
-            table_info += f"  Sample Data: Error retrieving data - {e}\n"
-        
-        chunks.append(table_info.strip())
+        return {}
+    if not {'TableName', 'ColumnName', 'Description'} <= set(data_dictionary_df.columns):
+        return {}
+    grouped = {}
+    for table, column, description in data_dictionary_df[['TableName', 'ColumnName', 'Description']].itertuples(index=False):
+        grouped.setdefault(table, []).append((column, description))
+    return grouped
+
+def build_table_chunk(table_name, dd_columns, conn):
+    """Context chunk for one table: dictionary descriptions, schema, foreign keys and sample rows."""
+    cursor = conn.cursor()
+    lines = [f"Table: {table_name}"]
+
+    # 1. Add table description and column definitions from data_dictionary
+    lines += [f"  Column '{column}': {description}" for column, description in dd_columns]
+
+    # 2. Get actual schema information from the database
+    lines.append("  Schema:")
+    for cid, name, type_name, not_null, default_val, pk in cursor.execute(f'PRAGMA table_info("{table_name}")'):
+        constraints = []
+        if pk:
+            constraints.append("PRIMARY KEY")
+        if not_null:
+            constraints.append("NOT NULL")
+        if default_val:
+            constraints.append(f"DEFAULT {default_val}")
+        constraint_str = f" ({', '.join(constraints)})" if constraints else ""
+        lines.append(f"    {name} {type_name}{constraint_str}")
+
+    # 3. Get foreign key relationships
+    foreign_keys = cursor.execute(f'PRAGMA foreign_key_list("{table_name}")').fetchall()
+    if foreign_keys:
+        lines.append("  Foreign Keys:")
+        for fk in foreign_keys:
+            lines.append(f"    {fk[3]} → {fk[2]}.{fk[4]}")
+
+    # 4. Get sample data (first 3 rows) for context
+    try:
+        sample_data = cursor.execute(f'SELECT * FROM "{table_name}" LIMIT 3').fetchall()
+        if sample_data:
+            lines.append("  Sample Data:")
+            lines += [f"    {row}" for row in sample_data]
+    except Exception as e:
+        lines.append(f"  Sample Data: Error retrieving data - {e}")
+
+    return "\n".join(lines).strip()
 
+def _table_chunk_task(args):
+    table_name, dd_columns = args
+    return build_table_chunk(table_name, dd_columns, _conn)
+
+def iter_db_chunks(db_path, workers=None):
+    """
+    Yield one chunk per table, built in worker processes (each with its own
+    read-only connection) and returned in table order as they complete.
+    """
+    dd_by_table = load_data_dictionary_columns()
+    conn = sqlite3.connect(db_path)
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")]
     conn.close()
-    return chunks
+    tasks = ((t, dd_by_table.get(t, [])) for t in tables)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_extract_worker, initargs=(db_path,)) as pool:
+        yield from pool.map(_table_chunk_task, tasks, chunksize=EXTRACT_CHUNKSIZE)
 
-def extract_excel_table_info():
+def extract_schema_and_metadata_from_db(db_path, workers=None):
+    """
+    Extracts table schema, column descriptions (from data_dictionary),
+    and relationships from the SQLite database and Excel files.
+    """
+    return list(iter_db_chunks(db_path, workers))
+
+def build_excel_chunk(file):
+    """Context chunk for one table workbook (all sheets)."""
+    table_name = os.path.splitext(file)[0]
+    excel_path = os.path.join(DATA_FOLDER, file)
+    try:
+        # Read all sheets in one pass (served from the metadata cache when unchanged)
+        sheets = read_workbook(excel_path, sheet_name=None)
+    except Exception as e:
+        print(f"❌ Error processing {file}: {e}")
+        return None
+
+    lines = [f"Excel File: {file}", f"Table: {table_name}"]
+    for sheet_name, df in sheets.items():
+        lines += ["", f"Sheet: {sheet_name}", f"Columns: {list(df.columns)}", f"Rows: {len(df)}"]
+        if sheet_name == "Table Structure":
+            lines.append("Structure:")
+            lines += [f"  {record}" for record in df.to_dict('records')]
+        elif sheet_name == "Sample Data" and len(df) > 0:
+            lines.append("Sample Data:")
+            lines += [f"  {record}" for record in df.head(2).to_dict('records')]
+    return "\n".join(lines).strip()
+
+def iter_excel_chunks(workers=None):
+    files = [f for f in sorted(os.listdir(DATA_FOLDER))
+             if f.endswith(".xlsx") and f != "data_dictionary.xlsx" and f != "role_access.xlsx"]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_extract_worker, initargs=(None,)) as pool:
+        for chunk in pool.map(build_excel_chunk, files, chunksize=EXTRACT_CHUNKSIZE):
+            if chunk:
+                yield chunk
+
+def extract_excel_table_info(workers=None):
     """
     Extract additional information from individual table Excel files
     """
-    chunks = []
-    
-    for file in os.listdir(DATA_FOLDER):
-        if file.endswith(".xlsx") and file != "data_dictionary.xlsx" and file != "role_access.xlsx":
-            table_name = os.path.splitext(file)[0]
-            excel_path = os.path.join(DATA_FOLDER, file)
-            
-            try:
-                # Read all sheets from the Excel file
-                excel_file = pd.ExcelFile(excel_path)
-                
-                excel_info = f"Excel File: {file}\nTable: {table_name}\n"
-                
-                for sheet_name in excel_file.sheet_names:
-                    df = pd.read_excel(excel_path, sheet_name=sheet_name)
-                    excel_info += f"\nSheet: {sheet_name}\n"
-                    excel_info += f"Columns: {list(df.columns)}\n"
-                    excel_info += f"Rows: {len(df)}\n"
-                    
-                    if sheet_name == "Table Structure":
-                        excel_info += "Structure:\n"
-                        for _, row in df.iterrows():
-                            excel_info += f"  {row.to_dict()}\n"
-                    elif sheet_name == "Sample Data" and len(df) > 0:
-                        excel_info += "Sample Data:\n"
-                        for _, row in df.head(2).iterrows():
-                            excel_info += f"  {row.to_dict()}\n"
-                
-                chunks.append(excel_info.strip())
-                
-            except Exception as e:
-                print(f"❌ Error processing {file}: {e}")
-    
-    return chunks
+    return list(iter_excel_chunks(workers))
 
-def create_faiss_index(chunks, index_path, meta_path, model_name=EMBED_MODEL):
+def encode_chunks(model, chunks, batch_size=EMBED_BATCH_SIZE, workers=None):
+    """
+    Embed chunks in fixed-size batches with a progress line per slice. Large corpora
+    are spread over one encoding process per core via SentenceTransformer's pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    use_pool = workers > 1 and len(chunks) >= MULTI_PROCESS_MIN_CHUNKS
+    pool = model.start_multi_process_pool(target_devices=['cpu'] * workers) if use_pool else None
+    slice_size = batch_size * PROGRESS_EVERY * (workers if use_pool else 1)
+    parts = []
+    start = time.perf_counter()
+    try:
+        for offset in range(0, len(chunks), slice_size):
+            part = chunks[offset:offset + slice_size]
+            if pool is not None:
+                parts.append(model.encode_multi_process(part, pool, batch_size=batch_size))
+            else:
+                parts.append(model.encode(part, batch_size=batch_size, convert_to_numpy=True))
+            done = min(offset + slice_size, len(chunks))
+            rate = done / max(time.perf_counter() - start, 1e-9)
+            print(f"   ↳ embedded {done:,}/{len(chunks):,} chunks ({rate:,.0f}/s)")
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+    return np.vstack(parts).astype('float32')
+
+def create_faiss_index(chunks, index_path, meta_path, model_name=EMBED_MODEL, batch_size=EMBED_BATCH_SIZE, workers=None,
+                       index_type=None, memory_budget_mb=MEMORY_BUDGET_MB):
     """
     Creates and saves a FAISS index from text chunks.
     Also saves the original chunks to a meta file for retrieval.
     """
     print("🔍 Embedding text using SentenceTransformer...")
     model = SentenceTransformer(model_name)
-    embeddings = model.encode(chunks)
+    embeddings = encode_chunks(model, chunks, batch_size, workers)
 
-    # FAISS index creation
-    # IndexFlatL2 is a simple Euclidean distance index
-    index = faiss.IndexFlatL2(embeddings.shape[1])
-    index.add(embeddings)
+    # FAISS index creation: cosine similarity (normalized inner product); Flat, HNSW or
+    # IVF-PQ picked from corpus size and memory budget unless index_type is given
+    index, params = build_index(embeddings, index_type, memory_budget_mb)
+    params['model'] = model_name
+    print(f"🧭 Built {params['type']} index over {params['count']:,} vectors in {params['build_seconds']:.1f}s "
+          f"(~{params['memory_estimate_mb']} MB)")
 
     # Create directory if it doesn't exist
     index_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Save the FAISS index
-    faiss.write_index(index, str(index_path))
+    # Save the FAISS index and the parameters it was built/trained with
+    save_index(index, params, index_path)
 
     # Save the original chunks (metadata) for later retrieval based on index ID
     with open(meta_path, "w") as f:
@@ -162,7 +205,7 @@ def create_faiss_index(chunks, index_path, meta_path, model_name=EMBED_MODEL):
     print(f"✅ FAISS index created and saved at {index_path}")
     print(f"📦 {len(chunks)} chunks embedded.")
 
-def main():
+def main(batch_size=EMBED_BATCH_SIZE, workers=None, index_type=None, memory_budget_mb=MEMORY_BUDGET_MB):
     print("🗃️ Extracting database schema and metadata for RAG context...")
     
     # Check if database exists
@@ -170,11 +213,12 @@ def main():
         print(f"❌ Database {DB_PATH} not found. Please run create_bank_exchange_db.py first.")
         return
     
-    # Extract database schema and metadata
-    db_context_chunks = extract_schema_and_metadata_from_db(DB_PATH)
+    # Extract database schema and metadata (one worker per core, tables streamed back in order)
+    start = time.perf_counter()
+    db_context_chunks = extract_schema_and_metadata_from_db(DB_PATH, workers)
     
     # Extract Excel file information
-    excel_chunks = extract_excel_table_info()
+    excel_chunks = extract_excel_table_info(workers)
     
     # Combine all chunks
     all_chunks = db_context_chunks + excel_chunks
@@ -183,11 +227,20 @@ def main():
         print("🔴 No context chunks were extracted. FAISS index will not be created.")
         return
 
-    print(f"📊 Extracted {len(db_context_chunks)} database chunks and {len(excel_chunks)} Excel chunks")
+    print(f"📊 Extracted {len(db_context_chunks)} database chunks and {len(excel_chunks)} Excel chunks "
+          f"in {time.perf_counter() - start:.1f}s")
     
-    create_faiss_index(all_chunks, FAISS_INDEX_PATH, META_FILE_PATH, EMBED_MODEL)
+    create_faiss_index(all_chunks, FAISS_INDEX_PATH, META_FILE_PATH, EMBED_MODEL, batch_size, workers,
+                       index_type, memory_budget_mb)
     print("\n✅ FAISS setup complete. You can now run your RAG SQL chatbot app.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Extract schema context and build the FAISS index.')
+    parser.add_argument('--batch-size', type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=None, help='Extraction/encoding processes (default: CPU count)')
+    parser.add_argument('--index-type', choices=['flat', 'hnsw', 'ivfpq'], default=None,
+                        help='Override the size-based choice')
+    parser.add_argument('--memory-budget-mb', type=int, default=MEMORY_BUDGET_MB)
+    args = parser.parse_args()
+    main(args.batch_size, args.workers, args.index_type, args.memory_budget_mb)
 